@@ -0,0 +1,633 @@
+"""Offline load test for the Felix servers.
+
+Starts a stub OpenAI-compatible backend and one of the chat servers on
+localhost, replays a mix of commands, name setup, free chat and resets
+from many simulated IPs, and saves latency/throughput/disk numbers as JSON.
+
+    python felix_bench.py run --server felix_brain_server2 --users 50 --messages 20
+    python felix_bench.py startup --server felix_brain_server2 --runs 5
+    python felix_bench.py batch --users 500 --messages 4 --batch-size 25
+    python felix_bench.py memory --users 10000 100000 1000000
+    python felix_bench.py compare bench_results/old.json bench_results/new.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = ["help", "tell me a joke", "what games can you play", "play arsenal", "play blox fruits", "musicplay"]
+FREE_CHAT = [
+    "what is python", "hi", "hello", "how are you", "what is gravity", "tell me about dinosaurs",
+    "why is the sky blue", "can you help with my math homework", "what is 12 times 12",
+    "who was the first person on the moon", "what should i build in minecraft", "do you like pizza"
+]
+NAMES = ["Amy", "Bob", "Cara", "Dev", "Eli", "Fay", "Gus", "Hana", "Ivan", "Jo"]
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal /v1/chat/completions with configurable latency and token rate."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        stub = self.server
+        stub.calls += 1
+        time.sleep(stub.latency)
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        words = (f"Stub Felix reply to: {prompt}. " + "blah " * stub.reply_tokens).split()[:stub.reply_tokens]
+        created = int(time.time())
+        model = body.get("model", "stub")
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i, word in enumerate(words):
+                if stub.tokens_per_s:
+                    time.sleep(1 / stub.tokens_per_s)
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"},
+                                      "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        if stub.tokens_per_s:
+            time.sleep(len(words) / stub.tokens_per_s)
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+        payload = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                      "total_tokens": prompt_tokens + len(words)}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        # models.retrieve(), used by the servers' readiness probe
+        model = self.path.rstrip("/").rsplit("/", 1)[-1]
+        payload = json.dumps({"id": model, "object": "model", "created": 0, "owned_by": "stub"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(latency_ms, tokens_per_s, reply_tokens):
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    stub.daemon_threads = True
+    stub.latency = latency_ms / 1000.0
+    stub.tokens_per_s = tokens_per_s
+    stub.reply_tokens = reply_tokens
+    stub.calls = 0
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    return stub
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(stub_url, data_dir, port, rate_limits=False):
+    env = dict(os.environ,
+               OPENAI_BASE_URL=stub_url, OPEN_AI_KEY="bench-key", FELIX_UPSTREAM="openai",
+               FELIX_DATA_DIR=data_dir, PYTHONPATH=REPO_DIR, PORT=str(port))
+    if not rate_limits:
+        # Simulated users send as fast as they can; per-IP limits would just measure 429s
+        env.update(FELIX_RATE_CMD_PER_S="0", FELIX_RATE_LLM_PER_MIN="0")
+    return env
+
+
+def start_server(module, port, stub_url, data_dir, workers=0, rate_limits=False):
+    env = server_env(stub_url, data_dir, port, rate_limits)
+    if workers:
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", f"{module}:app"]
+    else:
+        cmd = [sys.executable, os.path.join(REPO_DIR, "felix_bench.py"), "serve", module, str(port)]
+    return subprocess.Popen(cmd, cwd=data_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_up(base_url, timeout_s=60):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            requests.get(base_url, timeout=1)
+            return time.time()
+        except requests.exceptions.RequestException:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout_s}s")
+
+
+def process_tree(pid):
+    pids = [pid]
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def io_counters(pid):
+    """Bytes written (write syscalls and block device) by a process and its children."""
+    totals = {"wchar": 0, "write_bytes": 0}
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/io") as f:
+                for line in f:
+                    field, value = line.split(":")
+                    if field in totals:
+                        totals[field] += int(value)
+        except OSError:
+            pass
+    return totals
+
+
+def build_session(user_index, messages, rng):
+    """One simulated user: introduce themselves, then a mix of commands, chat and the odd reset."""
+    name = NAMES[user_index % len(NAMES)]
+    session = [("name", f"my name is {name}")]
+    while len(session) < messages:
+        roll = rng.random()
+        if roll < 0.3:
+            session.append(("command", rng.choice(COMMANDS)))
+        elif roll < 0.97:
+            session.append(("chat", rng.choice(FREE_CHAT)))
+        else:
+            session.append(("reset", "CrimsonResetConfigData"))
+            session.append(("name", f"my name is {name}"))
+    return name, session[:messages]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize_latencies(latencies):
+    values = sorted(latencies)
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "max": round(values[-1], 2) if values else 0.0,
+    }
+
+
+def run_load(base_url, users, messages, concurrency, seed):
+    rng = random.Random(seed)
+    sessions = [build_session(i, messages, random.Random(rng.random())) for i in range(users)]
+    results = []
+    lock = threading.Lock()
+
+    def run_user(index):
+        name, session = sessions[index]
+        ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        http = requests.Session()
+        for kind, message in session:
+            started = time.perf_counter()
+            try:
+                res = http.post(f"{base_url}/chat", json={"message": message, "name": name},
+                                headers={"X-Forwarded-For": ip}, timeout=60)
+                status = res.status_code
+            except requests.exceptions.RequestException:
+                status = "error"
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                results.append((kind, status, elapsed))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_user, range(users)))
+    return results, time.perf_counter() - started
+
+
+def health_field(base_url, field):
+    """One section of the server's /health report, or None when it has no such section."""
+    try:
+        return requests.get(f"{base_url}/health", timeout=10).json().get(field)
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def run(args):
+    stub = start_stub(args.latency_ms, args.tokens_per_s, args.reply_tokens)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}/v1"
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    data_dir = tempfile.mkdtemp(prefix="felix-bench-")
+
+    launched = time.time()
+    server = start_server(args.server, port, stub_url, data_dir, args.workers, args.rate_limits)
+    try:
+        up_at = wait_until_up(base_url)
+        io_before = io_counters(server.pid)
+        calls_before = stub.calls
+        results, wall = run_load(base_url, args.users, args.messages, args.concurrency, args.seed)
+        time.sleep(0.5)  # let background writers flush before reading I/O counters
+        io_after = io_counters(server.pid)
+        reply_cache = health_field(base_url, "reply_cache")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        stub.shutdown()
+
+    total = len(results)
+    by_kind = {}
+    for kind, status, elapsed in results:
+        by_kind.setdefault(kind, []).append(elapsed)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    report = {
+        "server": args.server,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("func", "out")},
+        "requests": total,
+        "wall_s": round(wall, 3),
+        "rps": round(total / wall, 2) if wall else 0.0,
+        "startup_s": round(up_at - launched, 3),
+        "latency_ms": summarize_latencies([r[2] for r in results]),
+        "latency_ms_by_kind": {kind: summarize_latencies(values) for kind, values in by_kind.items()},
+        "status_counts": statuses,
+        "upstream_calls": stub.calls - calls_before,
+        "reply_cache": reply_cache,
+        "disk_bytes_per_request": {
+            field: round((io_after[field] - io_before[field]) / total, 1) if total else 0.0
+            for field in io_before
+        },
+    }
+    out = args.out or os.path.join(REPO_DIR, "bench_results",
+                                   f"{args.server}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"\n📊 Saved results to {out}")
+
+
+def poll(fn, timeout_s=30):
+    """Call fn until it returns true; returns the time it did, or None on timeout."""
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            if fn():
+                return time.time()
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_import(module, stub_url):
+    data_dir = tempfile.mkdtemp(prefix="felix-bench-")
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=data_dir, env=server_env(stub_url, data_dir, 0),
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def measure_startup(module, stub_url):
+    """Seconds from launch until the server listens, is ready, answers locally, and reaches OpenAI."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    data_dir = tempfile.mkdtemp(prefix="felix-bench-")
+    launched = time.time()
+    server = start_server(module, port, stub_url, data_dir)
+    try:
+        listen_at = wait_until_up(base_url)
+        # /readyz answers 503 until ready; servers without one count as ready once they listen
+        ready_at = poll(lambda: requests.get(f"{base_url}/readyz", timeout=1).status_code != 503)
+        res = requests.post(f"{base_url}/chat", json={"message": "my name is Bench", "name": "Bench"}, timeout=60)
+        reply_at = time.time() if res.ok else None
+        upstream_at = poll(lambda: requests.get(f"{base_url}/health", timeout=1).json().get("openai_connected"),
+                           timeout_s=10)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {
+        "listen_s": listen_at - launched,
+        "ready_s": ready_at - launched if ready_at else None,
+        "first_reply_s": reply_at - launched if reply_at else None,
+        "upstream_ready_s": upstream_at - launched if upstream_at else None,
+    }
+
+
+def startup(args):
+    stub = start_stub(0, 0, 5)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}/v1"
+    try:
+        imports = [measure_import(args.server, stub_url) for _ in range(args.runs)]
+        runs = [measure_startup(args.server, stub_url) for _ in range(args.runs)]
+    finally:
+        stub.shutdown()
+
+    def median(values):
+        values = [v for v in values if v is not None]
+        return round(statistics.median(values), 3) if values else None
+
+    report = {
+        "server": args.server,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"runs": args.runs},
+        "import_s": median(imports),
+        "startup_s": {field: median([run[field] for run in runs]) for field in runs[0]},
+        "upstream_calls": stub.calls,
+    }
+    out = args.out or os.path.join(REPO_DIR, "bench_results",
+                                   f"{args.server}-startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"\n📊 Saved results to {out}")
+
+
+def run_batches(base_url, users, messages, batch_size, concurrency, seed, wire_type):
+    """Replay the same sessions as run_load(), relayed through /chat/batch like a gateway would.
+
+    Round r sends every user's r-th message, split into batches sent
+    concurrently, so each user's messages still arrive in order.
+    """
+    sys.path.insert(0, REPO_DIR)
+    from felix_wire import decode, encode
+
+    rng = random.Random(seed)
+    sessions = [build_session(i, messages, random.Random(rng.random())) for i in range(users)]
+    http = requests.Session()
+    http.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    stats = {"requests": 0, "items": 0, "bytes_sent": 0, "bytes_received": 0, "statuses": {}}
+    lock = threading.Lock()
+
+    def send(batch):
+        body, body_headers = encode({"items": batch}, accept=wire_type, accept_encoding="gzip")
+        headers = {"Content-Type": body_headers["Content-Type"], "Accept": wire_type, "Accept-Encoding": "gzip"}
+        if "Content-Encoding" in body_headers:
+            headers["Content-Encoding"] = body_headers["Content-Encoding"]
+        res = http.post(f"{base_url}/chat/batch", data=body, headers=headers, timeout=120)
+        received = int(res.headers.get("Content-Length") or len(res.content))
+        results = decode(res.content, res.headers.get("Content-Type"))["results"] if res.ok else []
+        with lock:
+            stats["requests"] += 1
+            stats["items"] += len(batch)
+            stats["bytes_sent"] += len(body)
+            stats["bytes_received"] += received
+            for result in results:
+                code = str(result.get("code"))
+                stats["statuses"][code] = stats["statuses"].get(code, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for turn in range(messages):
+            items = [{"user": f"user{i}", "message": session[turn][1]}
+                     for i, (_, session) in enumerate(sessions) if turn < len(session)]
+            list(pool.map(send, [items[i:i + batch_size] for i in range(0, len(items), batch_size)]))
+    return stats, time.perf_counter() - started
+
+
+def batch(args):
+    stub = start_stub(args.latency_ms, args.tokens_per_s, args.reply_tokens)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}/v1"
+    modes = {}
+    try:
+        for mode, wire_type in (("single", None), ("batch_json", "application/json"),
+                                ("batch_msgpack", "application/msgpack")):
+            if wire_type == "application/msgpack":
+                try:
+                    import msgpack  # noqa: F401
+                except ImportError:
+                    print("⚠️ msgpack not installed, skipping the msgpack run")
+                    continue
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(args.server, port, stub_url, tempfile.mkdtemp(prefix="felix-bench-"))
+            try:
+                wait_until_up(base_url)
+                calls_before = stub.calls
+                if wire_type is None:
+                    results, wall = run_load(base_url, args.users, args.messages, args.concurrency, args.seed)
+                    stats = {"requests": len(results), "items": len(results)}
+                else:
+                    stats, wall = run_batches(base_url, args.users, args.messages, args.batch_size,
+                                              args.concurrency, args.seed, wire_type)
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            stats.update(wall_s=round(wall, 3), messages_per_s=round(stats["items"] / wall, 1) if wall else 0.0,
+                         upstream_calls=stub.calls - calls_before)
+            for field in ("bytes_sent", "bytes_received"):
+                if field in stats:
+                    stats[f"{field}_per_message"] = round(stats.pop(field) / stats["items"], 1)
+            modes[mode] = stats
+            print(f"{mode:14} {stats['items']:>6} messages in {wall:6.2f}s  {stats['messages_per_s']:>8} msg/s")
+    finally:
+        stub.shutdown()
+
+    report = {
+        "server": args.server,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("func", "out")},
+        "modes": modes,
+        "speedup": {mode: round(stats["messages_per_s"] / modes["single"]["messages_per_s"], 2)
+                    for mode, stats in modes.items() if mode != "single" and modes["single"]["messages_per_s"]},
+    }
+    out = args.out or os.path.join(REPO_DIR, "bench_results",
+                                   f"{args.server}-batch-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"\n📊 Saved results to {out}")
+
+
+def resident_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def fake_record(user_index, turns, rng):
+    """JSON text of a plausible stored user: a shared first name, an ID and a few chat turns."""
+    history = []
+    for turn in range(turns):
+        if turn % 2 == 0:
+            history.append(["u", f"{rng.choice(FREE_CHAT)} {user_index}"])
+        else:
+            history.append(["a", f"Great question! Here is what I know about that, friend #{user_index} (^_^)"])
+    return json.dumps({"name": NAMES[user_index % len(NAMES)], "id": user_index, "history": history})
+
+
+def memory_sample(args):
+    """Child process: load ``users`` records the way the store cache does and print resident bytes used."""
+    import gc
+    sys.path.insert(0, REPO_DIR)
+    from felix_records import compact
+
+    rng = random.Random(args.seed)
+    gc.collect()
+    before = resident_bytes()
+    records = {}
+    for i in range(args.users):
+        record = json.loads(fake_record(i, args.turns, rng))
+        records[f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"] = compact(record, enabled=args.compact)
+    gc.collect()
+    print(resident_bytes() - before)
+
+
+def memory(args):
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"turns": args.turns, "seed": args.seed},
+        "bytes_per_user": {},
+    }
+    print(f"{'users':>9} {'dict B/user':>12} {'compact B/user':>15} {'saved':>7}")
+    for users in args.users:
+        sizes = {}
+        for kind in ("dict", "compact"):
+            cmd = [sys.executable, __file__, "memory-sample", str(users), "--turns", str(args.turns),
+                   "--seed", str(args.seed)] + (["--compact"] if kind == "compact" else [])
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            sizes[kind] = round(int(out.strip().splitlines()[-1]) / users, 1)
+        report["bytes_per_user"][str(users)] = sizes
+        saved = (1 - sizes["compact"] / sizes["dict"]) * 100 if sizes["dict"] else 0
+        print(f"{users:>9} {sizes['dict']:>12} {sizes['compact']:>15} {saved:>6.1f}%")
+    out = args.out or os.path.join(REPO_DIR, "bench_results",
+                                   f"memory-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📊 Saved results to {out}")
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = flatten(json.load(f))
+    with open(args.new, encoding="utf-8") as f:
+        new = flatten(json.load(f))
+    print(f"{'metric':45} {'old':>12} {'new':>12} {'change':>9}")
+    for key in sorted(set(old) & set(new)):
+        if key.startswith("config."):
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        print(f"{key:45} {old[key]:>12} {new[key]:>12} {change:>9}")
+
+
+def serve(args):
+    sys.path.insert(0, REPO_DIR)
+    module = __import__(args.module)
+    app = module.create_app() if hasattr(module, "create_app") else module.app
+    app.run(host="127.0.0.1", port=args.port, threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Felix chat servers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Start a server against the stub backend and replay traffic")
+    p_run.add_argument("--server", default="felix_brain_server2", help="Module name of the Flask app")
+    p_run.add_argument("--users", type=int, default=50, help="Number of simulated IPs")
+    p_run.add_argument("--messages", type=int, default=20, help="Messages per simulated user")
+    p_run.add_argument("--concurrency", type=int, default=25, help="Users sending at the same time")
+    p_run.add_argument("--latency-ms", type=float, default=300, help="Stub time to first token")
+    p_run.add_argument("--tokens-per-s", type=float, default=200, help="Stub token rate (0 = instant)")
+    p_run.add_argument("--reply-tokens", type=int, default=40, help="Tokens per stub reply")
+    p_run.add_argument("--workers", type=int, default=0, help="Run under gunicorn with N workers")
+    p_run.add_argument("--rate-limits", action="store_true", help="Keep the servers' per-IP rate limits on")
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--out", help="Where to write the JSON report")
+    p_run.set_defaults(func=run)
+
+    p_startup = sub.add_parser("startup", help="Time import, readiness and first replies of a cold server")
+    p_startup.add_argument("--server", default="felix_brain_server2", help="Module name of the Flask app")
+    p_startup.add_argument("--runs", type=int, default=5, help="Cold starts to take the median of")
+    p_startup.add_argument("--out", help="Where to write the JSON report")
+    p_startup.set_defaults(func=startup)
+
+    p_batch = sub.add_parser("batch", help="Throughput of single /chat posts vs /chat/batch (JSON+gzip, msgpack)")
+    p_batch.add_argument("--server", default="felix_brain_server2", help="Module name of the Flask app")
+    p_batch.add_argument("--users", type=int, default=500, help="Number of simulated users")
+    p_batch.add_argument("--messages", type=int, default=4, help="Messages per simulated user")
+    p_batch.add_argument("--batch-size", type=int, default=25, help="Items per /chat/batch request")
+    p_batch.add_argument("--concurrency", type=int, default=25, help="Requests in flight at once")
+    p_batch.add_argument("--latency-ms", type=float, default=300, help="Stub time to first token")
+    p_batch.add_argument("--tokens-per-s", type=float, default=0, help="Stub token rate (0 = instant)")
+    p_batch.add_argument("--reply-tokens", type=int, default=40, help="Tokens per stub reply")
+    p_batch.add_argument("--seed", type=int, default=42)
+    p_batch.add_argument("--out", help="Where to write the JSON report")
+    p_batch.set_defaults(func=batch)
+
+    p_memory = sub.add_parser("memory", help="Resident bytes per user record, dicts vs compact records")
+    p_memory.add_argument("--users", type=int, nargs="+", default=[10000, 100000, 1000000])
+    p_memory.add_argument("--turns", type=int, default=6, help="Chat turns kept per user")
+    p_memory.add_argument("--seed", type=int, default=42)
+    p_memory.add_argument("--out", help="Where to write the JSON report")
+    p_memory.set_defaults(func=memory)
+
+    p_sample = sub.add_parser("memory-sample", help=argparse.SUPPRESS)
+    p_sample.add_argument("users", type=int)
+    p_sample.add_argument("--turns", type=int, default=6)
+    p_sample.add_argument("--seed", type=int, default=42)
+    p_sample.add_argument("--compact", action="store_true")
+    p_sample.set_defaults(func=memory_sample)
+
+    p_compare = sub.add_parser("compare", help="Diff two JSON reports")
+    p_compare.add_argument("old")
+    p_compare.add_argument("new")
+    p_compare.set_defaults(func=compare)
+
+    p_serve = sub.add_parser("serve", help=argparse.SUPPRESS)
+    p_serve.add_argument("module")
+    p_serve.add_argument("port", type=int)
+    p_serve.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
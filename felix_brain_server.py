@@ -1,50 +1,74 @@
 import os
-import json
+import math
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import openai
+from felix_store import open_store
+from felix_context import ConversationContext
+from felix_upstream import create_upstream
+from felix_model_router import ModelRouter
+from felix_ratelimit import create_limiter, LLM_BURST, LLM_RATE_PER_MIN
+from felix_maintenance import (MaintenanceScheduler, COMPACT_BUDGET_S, COMPACT_INTERVAL_S, EVICT_INTERVAL_S,
+                               PREWARM_USERS, USER_IDLE_TTL_S)
 
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests if needed
 
-openai.api_key = os.getenv("OPEN_AI_KEY")
+upstream = create_upstream(os.getenv("OPEN_AI_KEY"))
+
+# Every message here goes to OpenAI, so one per-IP bucket covers it
+limiter = create_limiter("llm", LLM_RATE_PER_MIN / 60.0, LLM_BURST)
+model_router = ModelRouter(default_model="gpt-4o-mini")
 
 MEMORY_FILE = "memory.json"
-memory = {}
+STORE_FILE = "memory.db"
+
+# Open memory store (migrates memory.json on first run)
+memory = open_store(STORE_FILE, legacy_json=MEMORY_FILE)
 
-# Load memory from file if exists
-def load_memory():
-    global memory
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r") as f:
-            memory = json.load(f)
-    else:
-        memory = {}
+# Keep resident memory to recently active users and the store file compact
+maintenance = MaintenanceScheduler("memory.lock")
+maintenance.add("prewarm", lambda deadline: memory.prewarm(PREWARM_USERS, deadline), at_start=True)
+maintenance.add("evict_idle_users", lambda deadline: memory.evict_idle(USER_IDLE_TTL_S, deadline),
+                every_s=EVICT_INTERVAL_S)
+maintenance.add("compact_store", lambda deadline: memory.compact(deadline=deadline), every_s=COMPACT_INTERVAL_S,
+                budget_s=COMPACT_BUDGET_S, shared=True)
+maintenance.start()
 
-def save_memory():
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
+@app.before_request
+def start_maintenance():
+    maintenance.start()  # no-op unless this is a worker forked after import (gunicorn --preload)
 
-load_memory()
+def save_memory(user_ip, change):
+    # Atomic read-modify-write, so gunicorn workers sharing the store don't overwrite each other
+    return memory.update(user_ip, change, default={"name": "", "history": []})
+
+# Chat history trimmed to a token budget; older turns are summarized in the background
+context = ConversationContext(
+    on_update=lambda ip, user_mem: memory.update(ip, lambda record: record.update(summary=user_mem["summary"]))
+)
 
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.get_json(force=True)
-    user_ip = request.remote_addr
+    # Behind Render's proxy remote_addr is the proxy; the client is first in X-Forwarded-For
+    user_ip = request.headers.get('X-Forwarded-For', request.remote_addr or "unknown").split(',')[0].strip()
+
+    allowed, retry_after = limiter.allow(user_ip)
+    if not allowed:
+        retry = max(1, math.ceil(retry_after))
+        return jsonify({"reply": f"Slow down a little! Try again in {retry}s."}), 429, {"Retry-After": str(retry)}
 
     user_message = data.get("message", "").strip()
     password = data.get("password", "")
     user_name = data.get("name", "").strip().title()  # New optional field
 
     # Initialize user memory if needed
-    user_mem = memory.get(user_ip, {"name": "", "chat_history": []})
+    user_mem = memory.get(user_ip, {"name": "", "history": []})
 
     # If user name not set yet, check if client sent it now
     if not user_mem["name"]:
         if user_name:
-            user_mem["name"] = user_name
-            memory[user_ip] = user_mem
-            save_memory()
+            user_mem = save_memory(user_ip, lambda record: record.update(name=user_name))
             return jsonify({"reply": f"Nice to meet you, {user_mem['name']}! (^_^)"})
         else:
             return jsonify({"reply": "Hello! I don't know your name yet. Please send your name with your message like {\"message\": \"hi\", \"name\": \"YourName\"}."})
@@ -54,31 +78,23 @@ def chat():
         # Password wrong or not given, disallow memory editing or commands that need password
         pass
 
-    # Add user message to chat history
-    user_mem["chat_history"].append({"role": "user", "content": user_message})
-
-    # Limit chat history length to prevent huge context
-    if len(user_mem["chat_history"]) > 20:
-        user_mem["chat_history"] = user_mem["chat_history"][-20:]
-
-    # Prepare messages for OpenAI API
-    messages = [{"role": "system", "content": "You are Felix, a friendly chatbot."}] + user_mem["chat_history"]
+    # Prepare messages for OpenAI API (history trimmed to the token budget)
+    messages, _ = context.build_messages(user_mem, "You are Felix, a friendly chatbot.", user_message)
 
     try:
-        # Call OpenAI ChatCompletion API
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
+        # Call OpenAI ChatCompletion API with the model and reply length picked for this message
+        route = model_router.route(user_message)
+        response = upstream.complete(
+            user_key=user_ip,
+            model=route.model,
             messages=messages,
-            temperature=0.7,
+            temperature=route.temperature,
+            max_tokens=route.max_tokens,
         )
         reply = response.choices[0].message.content.strip()
 
-        # Append assistant reply to chat history
-        user_mem["chat_history"].append({"role": "assistant", "content": reply})
-
-        # Save updated memory
-        memory[user_ip] = user_mem
-        save_memory()
+        # Append this exchange to chat history and save it
+        save_memory(user_ip, lambda record: context.record_turn(user_ip, record, user_message, reply))
 
         return jsonify({"reply": reply})
 
@@ -1,14 +1,32 @@
 import os
 import json
+import math
 import logging
-import re
 import random
-from flask import Flask, request, jsonify
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime
-from tinydb import TinyDB, Query
+from felix_store import install_shutdown_flush, open_store
+from felix_users import UserRegistry
+from felix_cache import ReplyCache, is_self_contained
+from felix_context import ConversationContext
+from felix_router import CommandRouter
+from felix_logging import BatchedFileWriter, RegistryLog, timestamp
+from felix_upstream import UPSTREAM_BACKEND, UpstreamUnavailable, UserInflightLimit, create_upstream, is_retryable
+from felix_singleflight import SingleFlight, SingleFlightTimeout
+from felix_metrics import Registry, SamplingProfiler, StageTimer
+from felix_startup import Lazy, ReadinessProbe
+from felix_faq import FaqIndex
+from felix_wire import WireError, decode, encode
+from felix_model_router import ModelRouter
+from felix_maintenance import (MaintenanceScheduler, CACHE_PURGE_INTERVAL_S, COMPACT_BUDGET_S, COMPACT_INTERVAL_S,
+                               EVICT_INTERVAL_S, FLIGHT_SWEEP_INTERVAL_S, LOG_ROTATE_INTERVAL_S, PREWARM_USERS,
+                               USER_IDLE_TTL_S)
+from felix_ratelimit import (AdmissionControl, Overloaded, create_limiter, COMMAND_BURST, COMMAND_RATE_PER_S,
+                             LLM_BURST, LLM_RATE_PER_MIN)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -17,93 +35,129 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Metrics (served on /metrics in Prometheus text format)
+metrics = Registry()
+stage = StageTimer(metrics.histogram("felix_chat_stage_seconds", "Time spent in each stage of a chat request"))
+request_seconds = metrics.histogram("felix_request_seconds", "Request latency by endpoint")
+inflight_requests = metrics.gauge("felix_inflight_requests", "Requests being handled right now")
+branch_total = metrics.counter("felix_chat_branch_total", "Chat requests by the branch that answered them")
+upstream_errors = metrics.counter("felix_upstream_errors_total", "Failed upstream calls by error type")
+tokens_total = metrics.counter("felix_tokens_total", "OpenAI tokens used")
+upstream_seconds = metrics.histogram("felix_upstream_seconds", "OpenAI call latency by model tier")
+rate_limited_total = metrics.counter("felix_rate_limited_total", "Requests refused with 429 by rate limit bucket")
+overloaded_total = metrics.counter("felix_overloaded_total", "Requests refused with 503 by admission control")
+batch_items_total = metrics.counter("felix_batch_items_total", "/chat/batch items by result status")
+metrics.gauge("felix_upstream_inflight", "OpenAI calls in flight", fn=lambda: client.stats()["inflight"] if client.loaded else 0)
+metrics.gauge("felix_reply_cache_entries", "Replies held in the in-memory cache", fn=lambda: len(reply_cache.entries))
+metrics.gauge("felix_log_queue_depth", "Log lines waiting to be written", fn=lambda: event_log.queue.qsize() if event_log.loaded else 0)
+profiler = SamplingProfiler()
+ADMIN_TOKEN = os.getenv("FELIX_ADMIN_TOKEN", "")
+
+# Admission control: per-IP buckets (every chat message, plus a tighter one for OpenAI calls)
+# and a global cap on chat requests in progress
+command_limiter = create_limiter("command", COMMAND_RATE_PER_S, COMMAND_BURST)
+llm_limiter = create_limiter("llm", LLM_RATE_PER_MIN / 60.0, LLM_BURST)
+admission = AdmissionControl()
+CHAT_ENDPOINTS = {"chat", "chat_stream", "chat_batch"}
+
+# /chat/batch: many (user, message) items in one request, e.g. from a gateway relaying many users.
+# Item users are namespaced under the caller's IP unless it sends X-Gateway-Token.
+BATCH_MAX_ITEMS = int(os.getenv("FELIX_BATCH_MAX_ITEMS", "100"))
+BATCH_WORKERS = int(os.getenv("FELIX_BATCH_WORKERS", "32"))
+GATEWAY_TOKEN = os.getenv("FELIX_GATEWAY_TOKEN", "")
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="felix-batch")
+
 app = Flask(__name__)
 CORS(app, origins="*")  # Allow all origins for testing
 
-# Initialize OpenAI client
+STARTED_AT = time.time()
+
+# OpenAI client (pooled, rate-capped, with retries and a circuit breaker).
+# Nothing here talks to OpenAI at import time: the client is built on first use
+# and a background probe checks the key without spending tokens.
 api_key = os.getenv("OPEN_AI_KEY") or os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and UPSTREAM_BACKEND != "fake":
     raise RuntimeError("❌ No OpenAI API key found in environment variables.")
 
-try:
-    client = OpenAI(api_key=api_key)
-    logger.info("✅ OpenAI client initialized successfully.")
-    # Optional test request
-    test_response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": "Hi"}],
-        max_tokens=5
-    )
-    logger.info("✅ OpenAI API test successful - Felix brain is connected!")
-except Exception as e:
-    logger.error(f"❌ OpenAI initialization failed: {e}")
-    client = None
+client = Lazy(lambda: create_upstream(api_key), "OpenAI client")
+upstream_probe = ReadinessProbe(lambda: client.ping("gpt-3.5-turbo"), "OpenAI", retryable=is_retryable)
 
 # Paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.getenv("FELIX_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))
 MEMORY_FILE = os.path.join(BASE_DIR, "felix_user_memory.json")
+STORE_FILE = os.path.join(BASE_DIR, "felix_user_memory.db")
 LOG_FILE = os.path.join(BASE_DIR, "server_log.txt")
 USER_REGISTRY_FILE = os.path.join(BASE_DIR, "user_registry.txt")
 
-# Load user memory
-try:
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            user_data = json.load(f)
-        logger.info("User memory loaded successfully")
-    else:
-        user_data = {}
-        logger.info("No existing user memory found, starting fresh")
-except Exception as e:
-    logger.error(f"Error loading user memory: {e}")
-    user_data = {}
+# User memory opens on first use (records load lazily; the legacy JSON file is migrated on first run)
+user_data = Lazy(lambda: open_store(STORE_FILE, legacy_json=MEMORY_FILE), "User memory store")
+users = Lazy(lambda: UserRegistry(user_data.get()), "User registry")
+# The store opens on a request thread, so hook SIGTERM here: queued writes get flushed on shutdown
+install_shutdown_flush()
+
+# Log files are written by background threads; requests only enqueue lines
+event_log = Lazy(lambda: BatchedFileWriter(LOG_FILE), "Event log")
+user_registry = Lazy(lambda: RegistryLog(USER_REGISTRY_FILE), "User registry log")
+# Curated FAQ answered locally when a message matches a known question closely enough
+faq = Lazy(FaqIndex.load, "FAQ index")
+LAZY_RESOURCES = [client, user_data, users, event_log, user_registry, faq]
 
 # Helper functions
 def log_event(text):
-    timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"{timestamp} {text}\n")
-        logger.info(f"Logged: {text}")
-    except Exception as e:
-        logger.error(f"Failed to write to log file: {e}")
+    with stage("logging"):
+        if event_log.write(f"{timestamp()} {text}"):
+            logger.info(f"Logged: {text}")
+        else:
+            logger.warning(f"Log queue full, dropped: {text}")
 
 def log_user_registry(ip, name, uid):
-    try:
-        if not os.path.exists(USER_REGISTRY_FILE):
-            with open(USER_REGISTRY_FILE, "w", encoding="utf-8") as f:
-                f.write("=== Felix User Registry ===\n")
-
-        entry = f"{ip} | ID {uid} | {name}"
-        if os.path.exists(USER_REGISTRY_FILE):
-            with open(USER_REGISTRY_FILE, "r", encoding="utf-8") as f:
-                if entry in f.read():
-                    return
-        timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-        with open(USER_REGISTRY_FILE, "a", encoding="utf-8") as f:
-            f.write(f"{timestamp} {entry}\n")
-    except Exception as e:
-        logger.error(f"Failed to log user registry: {e}")
-
-def save_memory():
-    try:
-        with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
-        logger.info("User memory saved successfully")
-    except Exception as e:
-        logger.error(f"Failed to save user memory: {e}")
-
-def get_next_id():
-    try:
-        ids = [info.get("id", 0) for info in user_data.values() if isinstance(info, dict)]
-        return max(ids, default=0) + 1
-    except Exception as e:
-        logger.error(f"Error getting next ID: {e}")
-        return 1
+    with stage("logging"):
+        try:
+            user_registry.record(ip, name, uid)
+        except Exception as e:
+            logger.error(f"Failed to log user registry: {e}")
+
+def save_memory(ip, change):
+    """Apply change(record) to the stored user atomically (safe across workers)."""
+    with stage("persistence"):
+        try:
+            return users.update(ip, change)
+        except Exception as e:
+            logger.error(f"Failed to save user memory: {e}")
+
+# LLM settings
+MODEL = "gpt-3.5-turbo"
+model_router = ModelRouter(default_model=MODEL)
+SYSTEM_PROMPT = "You are Felix, a fun and friendly chatbot. The user's name is {name}. Always be helpful, creative, and cheerful."
+# Prompt for replies that get cached and shared: nothing in it is specific to the user
+SHARED_PROMPT = "You are Felix, a fun and friendly chatbot. Always be helpful, creative, and cheerful."
+
+BUSY_REPLY = "My brain is a bit overloaded right now 😵 Please try again in a few seconds!"
+
+# Shared reply cache (keyed on the shared prompt, so users share entries)
+reply_cache = ReplyCache()
+
+# Identical shareable prompts that are in flight at the same time share one OpenAI call
+inflight = SingleFlight(local_errors=(UserInflightLimit,))
+
+def summarize_turns(summary, turns):
+    transcript = "\n".join(f"{'User' if role == 'u' else 'Felix'}: {text}" for role, text in turns)
+    response = client.complete(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "Summarize this chat in at most three short sentences. Keep names, facts and open questions."},
+            {"role": "user", "content": f"Summary so far: {summary or 'none'}\n\nNew messages:\n{transcript}"}
+        ],
+        temperature=0.3,
+        max_tokens=120
+    )
+    return response.choices[0].message.content.strip()
 
-# TinyDB setup
-db = TinyDB("user_memory.json")
-User = Query()
+# Conversation history, trimmed to a token budget; old turns are summarized in the background
+context = ConversationContext(
+    summarizer=summarize_turns,
+    on_update=lambda ip, user_mem: user_data.update(ip, lambda record: record.update(summary=user_mem["summary"]))
+)
 
 # Supported games & jokes
 GAMES = [
@@ -120,20 +174,260 @@ JOKES = [
     "Why was the JavaScript developer sad? Because he didn’t know how to ‘null’ his feelings."
 ]
 
+# Command router: one compiled scan finds every trigger, game name and name intro.
+# Handlers run in the order they are registered here.
+commands = CommandRouter()
+commands.add("reset", "crimsonresetconfigdata")
+commands.add("name", ["my name is", "i'm", "im", "this is"], capture=r"\s+([A-Za-z]+)")
+commands.add("game", GAMES)
+commands.add("play_request", "play", capture=r"\s+(\S+)", anchored=True)  # "play <something>" opening a message
+
+@commands.command("help", "help")
+def help_command(hits, user_mem):
+    return {"reply": (
+        "🆘 Felix Help Menu:\n"
+        "- Say 'play [game name]' to launch a Roblox game\n"
+        "- Say 'musicplay' to listen to music\n"
+        "- Ask me anything, I answer over 200+ topics\n"
+        "- Say 'tell me a joke' for a funny moment\n"
+        "- Type 'CrimsonResetConfigData' to reset your memory\n"
+        "- Say 'what games can you play' to see supported games\n"
+        "- Or just chat with me like a buddy! 💬"
+    ), "status": "success"}
+
+@commands.command("musicplay", "musicplay")
+def music_command(hits, user_mem):
+    return {"reply": "🎵 Opening YouTube Music! Type the song name next or say 'open music website'.", "status": "success"}
+
+@commands.command("game_list", "what games can you play")
+def game_list_command(hits, user_mem):
+    return {"reply": f"🎮 I can play these Roblox games: {', '.join(GAMES)}", "status": "success"}
+
+@commands.command("play", "play")
+def play_command(hits, user_mem):
+    if "game" in hits:
+        return {"reply": f"🕹️ Launching {hits['game'][0]} now... (or simulating it!)", "status": "success"}
+    if "play_request" in hits:
+        return {"reply": "❌ Sorry, I don't know that game. Try saying 'what games can you play'!", "status": "info"}
+    return None  # "let's play" without a known game is small talk for the LLM
+
+@commands.command("joke", "joke", "jokes")
+def joke_command(hits, user_mem):
+    return {"reply": f"😂 {random.choice(JOKES)}", "status": "success"}
+
 # User helpers
 def get_or_create_user(ip):
-    user = db.get(User.ip == ip)
-    if not user:
-        user = {"ip": ip, "name": None, "id": len(db) + 1}
-        db.insert(user)
+    with stage("user_resolve"):
+        user, created = users.get_or_create(ip)
     return user
 
-def update_user(ip, field, value):
-    db.update({field: value}, User.ip == ip)
+def extract_name(text, hits=None):
+    hits = commands.scan(text) if hits is None else hits
+    names = hits.get("name")
+    return names[0].title() if names else None
+
+def get_user_ip():
+    return request.headers.get('X-Forwarded-For', request.remote_addr or "unknown").split(',')[0].strip()
 
-def extract_name(text):
-    match = re.search(r"(?:my name is|i'?m|this is)\s+([A-Za-z]+)", text, re.I)
-    return match.group(1).title() if match else None
+def build_messages(user_mem, user_input, shared=False):
+    if shared:
+        # Cached replies are handed to other users as-is, so their prompt leaves out the name and history
+        messages, prompt_tokens = context.build_messages({}, SHARED_PROMPT, user_input)
+    else:
+        messages, prompt_tokens = context.build_messages(user_mem, SYSTEM_PROMPT.format(name=user_mem["name"]),
+                                                         user_input)
+    logger.info(f"Prompt for user #{user_mem['id']}: {len(messages)} messages, ~{prompt_tokens} tokens")
+    return messages
+
+def cached_reply(user_mem, user_input, route):
+    """Return (cache_key, reply); only self-contained messages get a key, and they are asked without history."""
+    if not is_self_contained(user_input):
+        return None, None
+    with stage("cache"):
+        cache_key = reply_cache.make_key(route.model, SHARED_PROMPT, user_input, route.tier, route.max_tokens,
+                                         route.temperature)
+        return cache_key, reply_cache.get(cache_key)
+
+def ask_llm(user_ip, user_mem, user_input, route, cache_key=None):
+    def complete():
+        messages = build_messages(user_mem, user_input, shared=cache_key is not None)
+        started = time.perf_counter()
+        try:
+            with stage("upstream"):
+                response = client.complete(
+                    user_key=user_ip,
+                    model=route.model,
+                    messages=messages,
+                    temperature=route.temperature,
+                    max_tokens=route.max_tokens
+                )
+        except Exception as e:
+            upstream_errors.inc(type=type(e).__name__)
+            raise
+        latency = time.perf_counter() - started
+        upstream_seconds.observe(latency, tier=route.tier)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            tokens_total.inc(usage.prompt_tokens or 0, type="prompt")
+            tokens_total.inc(usage.completion_tokens or 0, type="completion")
+            model_router.record(route.tier, latency, usage.prompt_tokens, usage.completion_tokens)
+        else:
+            model_router.record(route.tier, latency)
+        return response.choices[0].message.content.strip()
+
+    if cache_key is None:
+        return complete()
+    return inflight.do(cache_key, complete)
+
+def remember_reply(user_ip, user_mem, user_input, reply, cache_key=None):
+    if cache_key:
+        reply_cache.put(cache_key, reply)
+    save_memory(user_ip, lambda record: context.record_turn(user_ip, record, user_input, reply))
+
+def answer_locally(user_ip, user_input):
+    """Everything chat() does before the OpenAI call.
+
+    Returns (payload, status_code, user_mem). payload is None when the
+    message has to go to OpenAI.
+    """
+    with stage("routing"):
+        hits = commands.scan(user_input)
+
+    # Reset commands
+    if "reset" in hits:
+        branch_total.inc(branch="reset")
+        def reset(record):
+            record["name"] = None
+            context.reset(record)
+        save_memory(user_ip, reset)
+        return {"reply": "🧼 Memory reset. Please say 'My name is ...' to begin again!", "status": "success"}, 200, None
+
+    # Initialize user if new
+    user_mem = get_or_create_user(user_ip)
+    user_id = user_mem["id"]
+    user_name = user_mem["name"]
+
+    # Name handling
+    name = extract_name(user_input, hits)
+    if name and not user_name:
+        user_mem = save_memory(user_ip, lambda record: record.update(name=name)) or user_mem
+        log_user_registry(user_ip, name, user_id)
+        log_event(f"📝 <{user_ip}> set name to: {name} (ID #{user_id})")
+        branch_total.inc(branch="name_set")
+        return {"reply": f"Oh, nice to meet you, {name}! You're user #{user_id} (^_^)", "status": "success"}, 200, user_mem
+
+    if not user_name:
+        branch_total.inc(branch="name_required")
+        return {"reply": "👀 Please tell me your name first by saying 'My name is ...' (^_^)", "status": "info"}, 200, user_mem
+
+    # Check OpenAI client (a failed probe means a bad key or config, not a blip)
+    if upstream_probe.failed:
+        branch_total.inc(branch="no_client")
+        return {"reply": "Sorry, I'm having trouble connecting to my brain right now 😅 Check the API key!", "status": "error"}, 500, user_mem
+
+    log_event(f"📨 <{user_name} #{user_id}> said: {user_input}")
+
+    # Commands
+    with stage("routing"):
+        command, payload = commands.route(hits, user_mem)
+    if payload is not None:
+        branch_total.inc(branch=command)
+        return payload, 200, user_mem
+
+    # FAQ
+    with stage("faq"):
+        answer = faq.answer(user_input)
+    if answer is not None:
+        branch_total.inc(branch="faq")
+        return {"reply": answer, "status": "success"}, 200, user_mem
+
+    return None, 200, user_mem
+
+def rate_limited(limiter, user_ip):
+    """A 429 response with Retry-After if user_ip is over this limiter's rate, else None."""
+    allowed, retry_after = limiter.allow(user_ip)
+    if allowed:
+        return None
+    rate_limited_total.inc(bucket=limiter.name)
+    retry = max(1, math.ceil(retry_after))
+    logger.warning(f"Rate limited <{user_ip}> on {limiter.name}, retry in {retry}s")
+    response = jsonify({"reply": f"Whoa, slow down a little! 🐢 Try again in {retry}s.", "status": "error"})
+    response.headers["Retry-After"] = str(retry)
+    return response, 429
+
+def sse_event(payload, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# Background maintenance (per worker: idle-user eviction, cache prewarm and expiry;
+# one worker at a time: store compaction, log rotation and the single-flight directory)
+maintenance = MaintenanceScheduler(os.path.join(BASE_DIR, "felix_maintenance.lock"))
+
+def prewarm_caches(deadline):
+    """Open storage and load the most recently active users and cached replies before traffic asks."""
+    users.get()
+    faq.get()
+    return {"users": user_data.prewarm(PREWARM_USERS, deadline), "replies": reply_cache.prewarm()}
+
+def evict_idle_users(deadline):
+    return user_data.evict_idle(USER_IDLE_TTL_S, deadline) if user_data.loaded else 0
+
+def compact_store(deadline):
+    pages_freed = user_data.compact(deadline=deadline)
+    return {"pages_freed": pages_freed, "store_bytes": os.path.getsize(STORE_FILE) if os.path.exists(STORE_FILE) else None}
+
+def rotate_logs(deadline):
+    # Only past the size limit: rolling over on a timer would just scatter small files for the log index to follow
+    if not event_log.max_bytes:
+        return {"event_log": False}
+    return {"event_log": event_log.rotate(min_bytes=event_log.max_bytes)}
+
+maintenance.add("prewarm", prewarm_caches, at_start=True)
+maintenance.add("evict_idle_users", evict_idle_users, every_s=EVICT_INTERVAL_S)
+maintenance.add("expire_replies", lambda deadline: reply_cache.purge_expired(), every_s=CACHE_PURGE_INTERVAL_S)
+maintenance.add("compact_store", compact_store, every_s=COMPACT_INTERVAL_S, budget_s=COMPACT_BUDGET_S, shared=True)
+maintenance.add("rotate_logs", rotate_logs, every_s=LOG_ROTATE_INTERVAL_S, shared=True)
+maintenance.add("sweep_singleflight", inflight.sweep, every_s=FLIGHT_SWEEP_INTERVAL_S, shared=True)
+
+def create_app():
+    """App factory: returns the app and starts the upstream probe and maintenance threads.
+
+    Use ``gunicorn 'felix_brain_server2:create_app()'``; with plain
+    ``felix_brain_server2:app`` they start on the first request instead.
+    """
+    upstream_probe.start()
+    maintenance.start()
+    return app
+
+# Request timing
+@app.before_request
+def start_timer():
+    upstream_probe.start()
+    maintenance.start()
+    g.started = time.perf_counter()
+    inflight_requests.inc(endpoint=request.endpoint or "unknown")
+    if request.endpoint in CHAT_ENDPOINTS:
+        # /chat/batch charges the command bucket once per item instead
+        limited = rate_limited(command_limiter, get_user_ip()) if request.endpoint != "chat_batch" else None
+        if limited:
+            return limited
+        try:
+            admission.acquire()
+        except Overloaded as e:
+            overloaded_total.inc()
+            response = jsonify({"reply": BUSY_REPLY, "status": "error"})
+            response.headers["Retry-After"] = str(math.ceil(e.retry_after))
+            return response, 503
+        g.admitted = True
+
+@app.teardown_request
+def stop_timer(error=None):
+    if g.pop("admitted", False):
+        admission.release()
+    if "started" in g:
+        endpoint = request.endpoint or "unknown"
+        inflight_requests.dec(endpoint=endpoint)
+        request_seconds.observe(time.perf_counter() - g.started, endpoint=endpoint)
 
 # Routes
 @app.route("/")
@@ -141,115 +435,319 @@ def home():
     return jsonify({
         "status": "Felix Brain Server is running",
         "version": "2.5",
-        "openai_status": "connected" if client else "disconnected",
-        "endpoints": ["/", "/chat", "/health", "/ask"]
+        "openai_status": "connected" if upstream_probe.ready else upstream_probe.state,
+        "endpoints": ["/", "/chat", "/chat/stream", "/chat/batch", "/health", "/livez", "/readyz", "/metrics", "/ask"]
     })
 
+@app.route("/livez")
+def livez():
+    """Liveness: the process is up and serving HTTP. Touches nothing else."""
+    return jsonify({"status": "alive", "uptime_s": round(time.time() - STARTED_AT, 1)}), 200
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: storage is open, so command and local replies work.
+
+    OpenAI is not required (chat falls back to the busy reply) unless the
+    caller asks for it with ``?upstream=1``.
+    """
+    try:
+        users.get()
+    except Exception as e:
+        logger.error(f"❌ Storage not ready: {e}")
+        return jsonify({"ready": False, "storage": "error", "error": str(e)}), 503
+    ready = upstream_probe.ready or request.args.get("upstream") not in ("1", "true")
+    return jsonify({"ready": ready, "storage": "ok", "upstream": upstream_probe.state}), 200 if ready else 503
+
 @app.route("/health")
 def health():
     return jsonify({
         "status": "healthy",
-        "openai_connected": client is not None,
+        "openai_connected": upstream_probe.ready,
+        "upstream_probe": upstream_probe.status(),
+        "upstream": client.stats() if client.loaded else None,
+        "startup": {
+            "uptime_s": round(time.time() - STARTED_AT, 1),
+            "resources": {resource.name: resource.status() for resource in LAZY_RESOURCES}
+        },
+        "singleflight": inflight.stats,
+        "reply_cache": reply_cache.stats(),
+        "context": context.stats,
+        "event_log": event_log.stats if event_log.loaded else None,
+        "faq": faq.stats if faq.loaded else None,
+        "rate_limits": {"command": command_limiter.stats, "llm": llm_limiter.stats},
+        "admission": admission.stats,
+        "model_routing": model_router.stats(),
+        "maintenance": maintenance.status(),
         "timestamp": datetime.now().isoformat()
     }), 200
 
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/profile", methods=["GET", "POST"])
+def profile():
+    """Switch the sampling profiler on/off (POST {"enabled": true}) or fetch its collapsed stacks (GET)."""
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden", "status": "error"}), 403
+    if request.method == "POST":
+        enabled = bool((request.get_json(silent=True) or {}).get("enabled"))
+        if enabled:
+            profiler.start()
+        else:
+            profiler.stop()
+        return jsonify({"profiling": profiler.running, "status": "success"}), 200
+    return Response(profiler.report(), mimetype="text/plain")
+
 @app.route("/ask", methods=["POST"])
 @app.route("/chat", methods=["POST"])
 def chat():
     try:
         # Get user IP
-        user_ip = request.headers.get('X-Forwarded-For', request.remote_addr or "unknown").split(',')[0].strip()
+        user_ip = get_user_ip()
         logger.info(f"Chat request from IP: {user_ip}")
 
-        data = request.get_json(force=True)
-        user_input = data.get("message", "").strip().lower()
+        with stage("parse"):
+            data = request.get_json(force=True)
+            user_input = data.get("message", "").strip().lower()
         if not user_input:
             return jsonify({"reply": "No input received 😵", "status": "error"}), 400
 
-        # Reset commands
-        if "crimsonresetconfigdata" in user_input:
-            if user_ip in user_data:
-                user_mem = user_data[user_ip]
-                user_mem["name"] = None
-                save_memory()
-            db.remove(User.ip == user_ip)
-            return jsonify({"reply": "🧼 Memory reset. Please say 'My name is ...' to begin again!", "status": "success"}), 200
-
-        # Initialize user if new
-        if user_ip not in user_data:
-            user_data[user_ip] = {"name": None, "id": get_next_id()}
-            save_memory()
-        user = get_or_create_user(user_ip)
-        user_mem = user_data[user_ip]
-        user_id = user_mem["id"]
-        user_name = user_mem["name"]
-
-        # Name handling
-        name = extract_name(user_input)
-        if name and not user_name:
-            user_mem["name"] = name
-            save_memory()
-            log_user_registry(user_ip, name, user_id)
-            log_event(f"📝 <{user_ip}> set name to: {name} (ID #{user_id})")
-            return jsonify({"reply": f"Oh, nice to meet you, {name}! You're user #{user_id} (^_^)", "status": "success"}), 200
-
-        if not user_name:
-            return jsonify({"reply": "👀 Please tell me your name first by saying 'My name is ...' (^_^)", "status": "info"}), 200
-
-        # Check OpenAI client
-        if client is None:
-            return jsonify({"reply": "Sorry, I'm having trouble connecting to my brain right now 😅 Check the API key!", "status": "error"}), 500
-
-        log_event(f"📨 <{user_name} #{user_id}> said: {user_input}")
-
-        # Commands
-        if "help" in user_input:
-            return jsonify({"reply": (
-                "🆘 Felix Help Menu:\n"
-                "- Say 'play [game name]' to launch a Roblox game\n"
-                "- Say 'musicplay' to listen to music\n"
-                "- Ask me anything, I answer over 200+ topics\n"
-                "- Say 'tell me a joke' for a funny moment\n"
-                "- Type 'CrimsonResetConfigData' to reset your memory\n"
-                "- Say 'what games can you play' to see supported games\n"
-                "- Or just chat with me like a buddy! 💬"
-            ), "status": "success"}), 200
-
-        if "musicplay" in user_input:
-            return jsonify({"reply": "🎵 Opening YouTube Music! Type the song name next or say 'open music website'.", "status": "success"}), 200
-
-        if "what games can you play" in user_input:
-            return jsonify({"reply": f"🎮 I can play these Roblox games: {', '.join(GAMES)}", "status": "success"}), 200
-
-        if "play " in user_input:
-            for game in GAMES:
-                if game.lower() in user_input:
-                    return jsonify({"reply": f"🕹️ Launching {game} now... (or simulating it!)", "status": "success"}), 200
-            return jsonify({"reply": "❌ Sorry, I don't know that game. Try saying 'what games can you play'!", "status": "info"}), 200
-
-        if "joke" in user_input:
-            return jsonify({"reply": f"😂 {random.choice(JOKES)}", "status": "success"}), 200
+        payload, status_code, user_mem = answer_locally(user_ip, user_input)
+        if payload is not None:
+            return jsonify(payload), status_code
+
+        # Reply cache (keyed on the model settings this message is routed to)
+        route = model_router.route(user_input)
+        cache_key, reply = cached_reply(user_mem, user_input, route)
+        if reply is not None:
+            branch_total.inc(branch="cached")
+            remember_reply(user_ip, user_mem, user_input, reply)
+            log_event(f"🤖 Felix replied to #{user_mem['id']} (cached): {reply}")
+            return jsonify({"reply": f"{reply} 💬", "status": "success"}), 200
 
         # OpenAI Chat
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"You are Felix, a fun and friendly chatbot. The user's name is {user_name}. Always be helpful, creative, and cheerful."},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.7,
-            max_tokens=200
-        )
-        reply = response.choices[0].message.content.strip()
-        log_event(f"🤖 Felix replied: {reply}")
+        limited = rate_limited(llm_limiter, user_ip)
+        if limited:
+            return limited
+        branch_total.inc(branch="llm")
+        reply = ask_llm(user_ip, user_mem, user_input, route, cache_key)
+        remember_reply(user_ip, user_mem, user_input, reply, cache_key)
+        log_event(f"🤖 Felix replied to #{user_mem['id']}: {reply}")
         return jsonify({"reply": f"{reply} 💬", "status": "success"}), 200
 
+    except (UpstreamUnavailable, SingleFlightTimeout) as e:
+        logger.warning(f"Upstream unavailable: {e}")
+        return jsonify({"reply": BUSY_REPLY, "status": "error"}), 503
+
     except Exception as e:
         error_msg = f"❌ GENERAL ERROR: {str(e)}"
         logger.error(error_msg)
         log_event(error_msg)
         return jsonify({"reply": "Sorry, I encountered an error. Please try again! 😅", "status": "error"}), 500
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Same as /chat, but streams the OpenAI reply as Server-Sent Events.
+
+    Each token arrives as ``data: {"delta": ...}``; the stream always ends with
+    an ``event: done`` carrying the full reply and status, exactly like /chat.
+    Command replies skip the deltas and send only the done event.
+    """
+    try:
+        user_ip = get_user_ip()
+        logger.info(f"Stream request from IP: {user_ip}")
+
+        data = request.get_json(force=True)
+        user_input = data.get("message", "").strip().lower()
+        if not user_input:
+            return jsonify({"reply": "No input received 😵", "status": "error"}), 400
+
+        payload, status_code, user_mem = answer_locally(user_ip, user_input)
+    except Exception as e:
+        error_msg = f"❌ GENERAL ERROR: {str(e)}"
+        logger.error(error_msg)
+        log_event(error_msg)
+        payload = {"reply": "Sorry, I encountered an error. Please try again! 😅", "status": "error"}
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if payload is not None:
+        return Response(sse_event(payload, "done"), mimetype="text/event-stream", headers=headers)
+
+    route = model_router.route(user_input)
+    cache_key, reply = cached_reply(user_mem, user_input, route)
+    if reply is not None:
+        branch_total.inc(branch="cached")
+        remember_reply(user_ip, user_mem, user_input, reply)
+        log_event(f"🤖 Felix replied to #{user_mem['id']} (cached): {reply}")
+        body = sse_event({"delta": reply}) + sse_event({"reply": f"{reply} 💬", "status": "success"}, "done")
+        return Response(body, mimetype="text/event-stream", headers=headers)
+
+    limited = rate_limited(llm_limiter, user_ip)
+    if limited:
+        return limited
+    branch_total.inc(branch="llm_stream")
+
+    def generate():
+        parts = []
+        started = time.perf_counter()
+        try:
+            stream = client.complete(
+                user_key=user_ip,
+                model=route.model,
+                messages=build_messages(user_mem, user_input, shared=cache_key is not None),
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
+                stream=True
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            latency = time.perf_counter() - started
+            upstream_seconds.observe(latency, tier=route.tier)
+            # Streams carry no usage; one content chunk is roughly one token
+            model_router.record(route.tier, latency, completion_tokens=len(parts))
+            reply = "".join(parts).strip()
+            remember_reply(user_ip, user_mem, user_input, reply, cache_key)
+            log_event(f"🤖 Felix replied to #{user_mem['id']}: {reply}")
+            yield sse_event({"reply": f"{reply} 💬", "status": "success"}, "done")
+        except UpstreamUnavailable as e:
+            logger.warning(f"Upstream unavailable: {e}")
+            upstream_errors.inc(type=type(e).__name__)
+            yield sse_event({"reply": BUSY_REPLY, "status": "error"}, "done")
+        except Exception as e:
+            upstream_errors.inc(type=type(e).__name__)
+            error_msg = f"❌ STREAM ERROR: {str(e)}"
+            logger.error(error_msg)
+            log_event(error_msg)
+            yield sse_event({"reply": "Sorry, I encountered an error. Please try again! 😅", "status": "error"}, "done")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+def item_limited(limiter, user_key):
+    """Per-item version of rate_limited(): a 429 result payload, or None if allowed."""
+    allowed, retry_after = limiter.allow(user_key)
+    if allowed:
+        return None
+    rate_limited_total.inc(bucket=limiter.name)
+    retry = max(1, math.ceil(retry_after))
+    return {"reply": f"Whoa, slow down a little! 🐢 Try again in {retry}s.", "status": "error", "retry_after": retry}
+
+def answer_item(user_key, user_input, user_mem=None):
+    """One /chat/batch item, start to finish; returns (payload, status_code).
+
+    Pass user_mem when answer_locally() already ran for this item.
+    """
+    try:
+        if user_mem is None:
+            limited = item_limited(command_limiter, user_key)
+            if limited:
+                return limited, 429
+            payload, status_code, user_mem = answer_locally(user_key, user_input)
+            if payload is not None:
+                return payload, status_code
+
+        route = model_router.route(user_input)
+        cache_key, reply = cached_reply(user_mem, user_input, route)
+        if reply is not None:
+            branch_total.inc(branch="cached")
+            remember_reply(user_key, user_mem, user_input, reply)
+            log_event(f"🤖 Felix replied to #{user_mem['id']} (cached): {reply}")
+            return {"reply": f"{reply} 💬", "status": "success"}, 200
+
+        limited = item_limited(llm_limiter, user_key)
+        if limited:
+            return limited, 429
+        branch_total.inc(branch="llm_batch")
+        reply = ask_llm(user_key, user_mem, user_input, route, cache_key)
+        remember_reply(user_key, user_mem, user_input, reply, cache_key)
+        log_event(f"🤖 Felix replied to #{user_mem['id']}: {reply}")
+        return {"reply": f"{reply} 💬", "status": "success"}, 200
+
+    except (UpstreamUnavailable, SingleFlightTimeout) as e:
+        logger.warning(f"Upstream unavailable: {e}")
+        return {"reply": BUSY_REPLY, "status": "error"}, 503
+
+    except Exception as e:
+        error_msg = f"❌ BATCH ERROR: {str(e)}"
+        logger.error(error_msg)
+        log_event(error_msg)
+        return {"reply": "Sorry, I encountered an error. Please try again! 😅", "status": "error"}, 500
+
+def answer_user_items(items):
+    """Answer one user's batch items in order: [(index, message, user_mem or None)] -> [(index, result)]."""
+    results = []
+    for index, (user_key, user_input), user_mem in items:
+        payload, status_code = answer_item(user_key, user_input, user_mem)
+        results.append((index, dict(payload, code=status_code)))
+    return results
+
+def batch_response(payload, status_code=200):
+    body, headers = encode(payload, request.headers.get("Accept"), request.headers.get("Accept-Encoding"))
+    return Response(body, status=status_code, headers=headers)
+
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    """Answer many messages in one request.
+
+    Body: ``{"items": [{"user": "...", "message": "..."}, ...]}`` as JSON or
+    msgpack, optionally gzipped. Command and FAQ items are answered inline;
+    items that need OpenAI run concurrently, one task per user so each
+    user's messages stay in order. The response has one result per item,
+    in request order: ``{"results": [{"reply", "status", "code"}, ...]}``,
+    encoded as msgpack or JSON (gzipped if accepted) to match Accept.
+    """
+    gateway_ip = get_user_ip()
+    try:
+        data = decode(request.get_data(), request.content_type, request.headers.get("Content-Encoding"))
+        raw_items = data.get("items") if isinstance(data, dict) else None
+        if not isinstance(raw_items, list):
+            raise WireError('Expected {"items": [...]}')
+    except WireError as e:
+        return batch_response({"error": str(e), "status": "error"}, e.status)
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return batch_response({"error": f"At most {BATCH_MAX_ITEMS} items per batch", "status": "error"}, 413)
+
+    trusted = bool(GATEWAY_TOKEN) and request.headers.get("X-Gateway-Token") == GATEWAY_TOKEN
+    logger.info(f"Batch request from IP: {gateway_ip} ({len(raw_items)} items)")
+    results = [None] * len(raw_items)
+    deferred = {}  # user key -> that user's items waiting on an OpenAI reply, in order
+    for index, item in enumerate(raw_items):
+        user_input = str(item.get("message", "") if isinstance(item, dict) else "").strip().lower()
+        if not user_input:
+            results[index] = {"reply": "No input received 😵", "status": "error", "code": 400}
+            continue
+        user = str(item.get("user") or "").strip()
+        user_key = (user if trusted else f"{gateway_ip}/{user}") if user else gateway_ip
+        if user_key in deferred:
+            deferred[user_key].append((index, (user_key, user_input), None))
+            continue
+        limited = item_limited(command_limiter, user_key)
+        if limited:
+            results[index] = dict(limited, code=429)
+            continue
+        try:
+            payload, status_code, user_mem = answer_locally(user_key, user_input)
+        except Exception as e:
+            error_msg = f"❌ BATCH ERROR: {str(e)}"
+            logger.error(error_msg)
+            log_event(error_msg)
+            payload, status_code = {"reply": "Sorry, I encountered an error. Please try again! 😅", "status": "error"}, 500
+        if payload is not None:
+            results[index] = dict(payload, code=status_code)
+        else:
+            deferred[user_key] = [(index, (user_key, user_input), user_mem)]
+
+    for future in [batch_pool.submit(answer_user_items, items) for items in deferred.values()]:
+        for index, result in future.result():
+            results[index] = result
+    for result in results:
+        batch_items_total.inc(status=result["status"])
+    return batch_response({"results": results, "status": "success"})
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Internal server error", "status": "error"}), 500
@@ -259,4 +757,4 @@ if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     debug = os.getenv("FLASK_DEBUG", "false").lower() == "true"
     logger.info(f"🚀 Felix Brain running on port {port} | Debug: {debug}")
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    create_app().run(host="0.0.0.0", port=port, debug=debug)
@@ -0,0 +1,168 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Cache settings (override with environment variables)
+CACHE_SIZE = int(os.getenv("FELIX_CACHE_SIZE", "2048"))
+CACHE_TTL_S = int(os.getenv("FELIX_CACHE_TTL_S", "86400"))
+CACHE_MAX_ENTRY_BYTES = int(os.getenv("FELIX_CACHE_MAX_BYTES", "4096"))
+CACHE_DB = os.getenv("FELIX_CACHE_DB", "")  # empty = memory only
+
+# Words that make a message depend on earlier turns ("tell me more about it")
+FOLLOW_UP_WORDS = {"it", "its", "that", "this", "those", "these", "they", "them", "he", "she", "him", "her",
+                   "more", "again", "also", "yes", "no", "yeah", "nope", "ok", "okay", "why", "continue"}
+# Words that make the answer depend on who is asking ("what is my password")
+PERSONAL_WORDS = {"i", "i'm", "i've", "i'd", "i'll", "me", "my", "mine", "myself", "we", "we're", "us", "our",
+                  "ours"}
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and squash whitespace so 'What is Python?!' == 'what is python'."""
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return " ".join(text.split())
+
+
+def is_self_contained(text):
+    """True when a message makes sense without the chat history and says nothing about the sender.
+
+    Only these messages are cached and coalesced. Their prompt carries no
+    history or summary, so the reply is the same for every user.
+    """
+    words = set(normalize(text).split())
+    return not (FOLLOW_UP_WORDS & words or PERSONAL_WORDS & words)
+
+
+class ReplyCache:
+    """LRU + TTL cache of LLM replies with an optional SQLite disk tier.
+
+    Keys are built from the model and completion settings, the system
+    prompt and the normalized message, so users share entries. Replies are
+    stored exactly as generated: callers only cache replies to prompts that
+    carry nothing about the user (no name, no history), so the answer
+    generated for Bob is already right for Amy.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl_s=CACHE_TTL_S, max_entry_bytes=CACHE_MAX_ENTRY_BYTES,
+                 disk_path=CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl_s
+        self.max_entry_bytes = max_entry_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, reply)
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "expired": 0, "too_large": 0}
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self.disk.execute("PRAGMA journal_mode=WAL")
+                self.disk.execute("CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, expires REAL, reply TEXT)")
+            except Exception as e:
+                logger.error(f"Reply cache disk tier disabled: {e}")
+                self.disk = None
+
+    @staticmethod
+    def make_key(model, system_prompt, user_input, *settings):
+        """Key for a reply; ``settings`` are anything else that shapes it (tier, max_tokens, ...)."""
+        raw = "\x00".join(str(part) for part in (model, system_prompt, *settings, normalize(user_input)))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] < now:
+                del self.entries[key]
+                self.counters["expired"] += 1
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            if self.disk is not None:
+                row = self.disk.execute("SELECT expires, reply FROM replies WHERE key = ?", (key,)).fetchone()
+                if row and row[0] >= now:
+                    self._insert(key, row[0], row[1])
+                    self.counters["disk_hits"] += 1
+                    return row[1]
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, reply):
+        if len(reply.encode("utf-8")) > self.max_entry_bytes:
+            self.counters["too_large"] += 1
+            return
+        expires = time.time() + self.ttl
+        with self.lock:
+            self._insert(key, expires, reply)
+            self.counters["stores"] += 1
+            if self.disk is not None:
+                try:
+                    self.disk.execute("INSERT OR REPLACE INTO replies (key, expires, reply) VALUES (?, ?, ?)",
+                                      (key, expires, reply))
+                    self.disk.commit()
+                except Exception as e:
+                    logger.error(f"Reply cache disk write failed: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.disk is not None:
+                self.disk.execute("DELETE FROM replies")
+                self.disk.commit()
+
+    def purge_expired(self):
+        """Drop expired entries from memory and disk; returns how many left memory.
+
+        get() only notices an expired entry when it is asked for again, so
+        one-off questions would otherwise sit in the cache until LRU pushes
+        them out.
+        """
+        now = time.time()
+        with self.lock:
+            expired = [key for key, (expires, _) in self.entries.items() if expires < now]
+            for key in expired:
+                del self.entries[key]
+            self.counters["expired"] += len(expired)
+            if self.disk is not None:
+                try:
+                    self.disk.execute("DELETE FROM replies WHERE expires < ?", (now,))
+                    self.disk.commit()
+                except Exception as e:
+                    logger.error(f"Reply cache disk purge failed: {e}")
+        return len(expired)
+
+    def prewarm(self, limit=None):
+        """Fill memory from the disk tier with the newest live entries; returns how many."""
+        if self.disk is None:
+            return 0
+        limit = self.max_entries if limit is None else min(limit, self.max_entries)
+        with self.lock:
+            rows = self.disk.execute("SELECT key, expires, reply FROM replies WHERE expires >= ? "
+                                     "ORDER BY expires DESC LIMIT ?", (time.time(), limit)).fetchall()
+            loaded = 0
+            for key, expires, reply in reversed(rows):  # oldest first, so the newest end up most recent
+                if key not in self.entries:
+                    self._insert(key, expires, reply)
+                    loaded += 1
+        return loaded
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hit_rate = (self.counters["hits"] + self.counters["disk_hits"]) / lookups if lookups else 0.0
+            return dict(self.counters, size=len(self.entries), hit_rate=round(hit_rate, 4))
+
+    def _insert(self, key, expires, reply):
+        self.entries[key] = (expires, reply)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
@@ -1,24 +1,58 @@
 import requests
-import pyttsx3
 import webbrowser
 import time
+import json
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from felix_router import CommandRouter
+from felix_faq import FaqIndex
+from felix_tts import SpeechWorker, split_sentences
+from felix_wire import JSON_TYPE, MSGPACK_TYPE, decode, encode, msgpack
 
-# Initialize text-to-speech
-engine = pyttsx3.init()
-engine.setProperty('rate', 175)
+# Fixed lines Felix says often; their audio is rendered once and replayed
+BYE_LINE = "Bye bye~"
+NAME_PROMPT_LINE = "Hey! I don't know your name yet. Please say 'My name is ...' so I can remember you!"
+FORGET_LINE = "Okay! I forgot your name. Please tell me your name again."
+
+# Text-to-speech runs on a background thread (FELIX_TTS=null to silence it)
+tts = SpeechWorker(cached_phrases=[BYE_LINE, NAME_PROMPT_LINE, FORGET_LINE])
 
 # Server URLs
 SERVER_URL = "https://felix-brain-server.onrender.com/chat"
 HEALTH_URL = "https://felix-brain-server.onrender.com/health"
+STREAM_URL = "https://felix-brain-server.onrender.com/chat/stream"
+WARMUP_URL = "https://felix-brain-server.onrender.com/livez"
+BATCH_URL = "https://felix-brain-server.onrender.com/chat/batch"
+
+# Stream replies token by token instead of waiting for the whole answer
+STREAM_REPLIES = True
+
+# Let the next message be typed while the previous reply is still on its way
+ASYNC_REPLIES = False
+
+# Print client-side round-trip times (toggle at runtime with 'debug')
+DEBUG_TIMING = False
+
+# Retries back off exponentially with full jitter: 0-0.5s, 0-1s, 0-2s, ... capped at 8s
+RETRY_BASE_S = 0.5
+RETRY_MAX_S = 8.0
+RETRY_STATUS = {429, 502, 503, 504}
 
-offline_qa = {
-    "what is your name": "I'm Felix! Your fluffy little digital friend! (^_^)",
-    "who made you": "Crimson did! The best creator ever! (^_^)",
-    "what time is it": f"The current time is {time.strftime('%I:%M %p')}",
-    "tell me a joke": "Why did the computer sneeze? It had a virus! 🤧",
-    "what is my name": "I can't remember your name offline. Connect me to the brain server! (^_^)",
-    "bye": "Bye bye~ (^_^)"
-}
+# One pooled keep-alive session: after the first request, messages skip the TCP+TLS handshake
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+session.headers.update({
+    'Content-Type': 'application/json',
+    'User-Agent': 'Felix-Client/1.0'
+})
+
+# Well-known questions are answered locally (felix_faq.json); when the server is down
+# a looser match is better than no answer at all
+faq = FaqIndex.load()
+OFFLINE_THRESHOLD = 0.5
 
 game_list = [
     "Pet Simulator X", "Brookhaven 🏡", "Blox Fruits", "Doors 👁️",
@@ -29,12 +63,15 @@ game_list = [
     "Nico's Nextbots"
 ]
 
+# One compiled matcher for the game names
+offline_router = CommandRouter()
+for game in game_list:
+    # Match "Brookhaven 🏡" whether or not the emoji is typed
+    offline_router.add("game", [game, re.sub(r"[^\w\s']", "", game)], value=game)
+
 def speak(text):
-    try:
-        engine.say(text)
-        engine.runAndWait()
-    except:
-        pass
+    """Queue text to be spoken; returns immediately"""
+    tts.speak(text)
 
 def help_section():
     print("\n🔍 Felix Help - Commands:")
@@ -44,6 +81,7 @@ def help_section():
     print("play(<game name>) - Launch specified Roblox game")
     print("forgetname - Forget stored name and ask again")
     print("serverstatus - Check if server is online")
+    print("debug - Show/hide round-trip times")
     print("help - Show this help")
     print("exit or bye - Exit Felix")
     print("------------------------------------------------\n")
@@ -52,7 +90,9 @@ def check_server_status():
     """Check if the server is online and working"""
     try:
         print("🔍 Checking server status...")
-        res = requests.get(HEALTH_URL, timeout=10)
+        started = time.perf_counter()
+        res = session.get(HEALTH_URL, timeout=10)
+        log_timing("health check", started)
         if res.status_code == 200:
             data = res.json()
             print(f"✅ Server is online: {data.get('status', 'Unknown')}")
@@ -71,49 +111,114 @@ def check_server_status():
         print(f"❌ Error checking server: {e}")
         return False
 
+def log_timing(label, started):
+    if DEBUG_TIMING:
+        print(f"⏱️ {label}: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def retry_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never sooner than the server's Retry-After"""
+    delay = random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * (2 ** attempt)))
+    try:
+        return max(delay, min(float(retry_after), RETRY_MAX_S)) if retry_after else delay
+    except ValueError:
+        return delay
+
+def warm_up():
+    """Open pooled connections (and wake a sleeping server) before the first message"""
+    def ping():
+        try:
+            session.get(WARMUP_URL, timeout=10)
+        except requests.exceptions.RequestException:
+            pass
+    # Two connections: one for the reply in flight, one spare for the next message
+    threads = [threading.Thread(target=ping, daemon=True) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    return threads
+
 def play_game():
     print("\n🎮 Available Games:")
     for game in game_list:
         print("-", game)
-    game = input("\nType the game name to launch: ").strip()
-    if game in game_list:
+    game = offline_router.first(input("\nType the game name to launch: ").strip(), "game")
+    if game:
         print(f"Launching {game} on Roblox...")
         webbrowser.open(f"https://www.roblox.com/games/search?Keyword={game.replace(' ', '%20')}")
     else:
         print("⚠️ Game not found in list.")
 
 def fallback_offline_answer(msg):
-    for q in offline_qa:
-        if q in msg.lower():
-            return offline_qa[q]
+    answer = faq.answer(msg, threshold=OFFLINE_THRESHOLD, include_offline=True)
+    if answer:
+        return answer
     return "Sorry, I'm offline and don't know how to answer that. 😥"
 
-def send_to_server(message, retries=2):
+def read_stream(res):
+    """Print and speak a /chat/stream reply sentence by sentence as it arrives"""
+    res.encoding = "utf-8"
+    buffer = ""
+    event = None
+    started = False
+    for line in res.iter_lines(decode_unicode=True):
+        if not line:
+            event = None
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            payload = json.loads(line[5:].strip())
+            if event == "done":
+                if started:
+                    print()
+                    speak(buffer.replace("💬", "").replace("(^_^)", "").strip())
+                payload["streamed"] = started
+                return payload
+            if not started:
+                print("Felix: ", end="", flush=True)
+                started = True
+            print(payload["delta"], end="", flush=True)
+            sentences, buffer = split_sentences(buffer + payload["delta"])
+            for sentence in sentences:
+                speak(sentence)
+    raise ValueError("Stream ended without a reply")
+
+def send_to_server(message, retries=2, stream=False):
     """Send message to server with retry logic"""
+    retry_after = None
     for attempt in range(retries + 1):
         try:
             if attempt > 0:
-                print(f"🔄 Retrying... (attempt {attempt + 1})")
-                time.sleep(2)  # Wait 2 seconds between retries
+                delay = retry_delay(attempt - 1, retry_after)
+                print(f"🔄 Retrying in {delay:.1f}s... (attempt {attempt + 1})")
+                time.sleep(delay)
+                retry_after = None
             
             print("Felix: Sending information to server... 🚀")
             
-            # Add headers to help with debugging
-            headers = {
-                'Content-Type': 'application/json',
-                'User-Agent': 'Felix-Client/1.0'
-            }
+            started = time.perf_counter()
+            res = session.post(STREAM_URL if stream else SERVER_URL, 
+                               json={"message": message}, 
+                               timeout=30,
+                               stream=stream)
             
-            res = requests.post(SERVER_URL, 
-                              json={"message": message}, 
-                              headers=headers,
-                              timeout=30)
+            # Overloaded or restarting: back off and try again
+            if res.status_code in RETRY_STATUS and attempt < retries:
+                print(f"⏳ Server busy ({res.status_code})")
+                retry_after = res.headers.get("Retry-After")
+                res.close()
+                continue
             
             # Check if request was successful
             res.raise_for_status()
             
+            if stream:
+                log_timing("first byte", started)
+                response_data = read_stream(res)
+                log_timing("round trip", started)
+                return response_data
+            
             print("Felix: Server giving response... 🤖")
             response_data = res.json()
+            log_timing("round trip", started)
             
             # Check if response has the expected format
             if 'reply' not in response_data:
@@ -143,30 +248,97 @@ def send_to_server(message, retries=2):
             
     return None
 
+def send_batch(items, retries=2, gateway_token=None, url=None):
+    """Send many messages in one request; returns one result dict per item, in order.
+
+    items are (user, message) pairs or {"user", "message"} dicts. The body
+    goes out as msgpack when it is installed (JSON otherwise), gzipped when
+    large, and each result has "reply", "status" and the item's HTTP "code".
+    """
+    payload = {"items": [item if isinstance(item, dict) else {"user": item[0], "message": item[1]}
+                         for item in items]}
+    wire_type = MSGPACK_TYPE if msgpack is not None else JSON_TYPE
+    body, body_headers = encode(payload, accept=wire_type, accept_encoding="gzip")
+    headers = {"Content-Type": body_headers["Content-Type"], "Accept": wire_type, "Accept-Encoding": "gzip"}
+    if "Content-Encoding" in body_headers:
+        headers["Content-Encoding"] = body_headers["Content-Encoding"]
+    if gateway_token:
+        headers["X-Gateway-Token"] = gateway_token
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        res = session.post(url or BATCH_URL, data=body, headers=headers, timeout=60)
+        if res.status_code in RETRY_STATUS and attempt < retries:
+            time.sleep(retry_delay(attempt, res.headers.get("Retry-After")))
+            continue
+        res.raise_for_status()
+        # requests already undid any gzip Content-Encoding
+        results = decode(res.content, res.headers.get("Content-Type"))["results"]
+        log_timing(f"batch of {len(results)}", started)
+        return results
+
+def ask_server(user, state, stream=STREAM_REPLIES):
+    """Send a chat message and print/speak the reply (falls back to offline answers)"""
+    try:
+        response_data = send_to_server(user, stream=stream)
+        reply = response_data.get("reply", "🤖 No response from Felix.")
+        status = response_data.get("status", "unknown")
+
+        # Update name tracking
+        if (not state["name_known"]) and ("my name is" in user.lower() or "nice to meet you" in reply.lower()):
+            state["name_known"] = True
+
+        if (not state["name_known"]) and ("please tell me your name" in reply.lower()):
+            print("Felix: Hey! I don't know your name yet. Please say 'My name is ...' so I can remember you! (^_^)")
+            speak(NAME_PROMPT_LINE)
+        elif response_data.get("streamed"):
+            pass  # Already printed and spoken while streaming
+        else:
+            print("Felix:", reply)
+            # Only speak if it's not an error
+            if status != "error":
+                speak(reply.replace("💬", "").replace("(^_^)", "").strip())
+
+    except Exception as e:
+        print("Felix: The server might be sleeping or having issues. Let me try to help offline!")
+        print(f"⚠️ Error: {e}")
+        reply = fallback_offline_answer(user)
+        print("Felix:", reply)
+        speak(reply)
+
 def main():
+    global DEBUG_TIMING
     print("Felix Client started. Type 'help' for commands. (Felix Early Version, Expect Bugs)")
     print("Type 'serverstatus' to check if the server is online.\n")
     
-    name_known = False
+    state = {"name_known": False}
+    # Async mode: one background worker sends messages in order while you keep typing
+    replies = ThreadPoolExecutor(max_workers=1) if ASYNC_REPLIES else None
     
-    # Check server status on startup
+    # Warm up the connection pool while the status check runs
+    warm_up()
     if not check_server_status():
         print("⚠️ Warning: Server appears to be offline. You can still use offline features.\n")
 
     while True:
         user = input("You: ").strip()
+        tts.cancel()  # barge-in: stop talking once the user has typed something new
 
         if user.lower() == "serverstatus":
             check_server_status()
             continue
 
+        if user.lower() == "debug":
+            DEBUG_TIMING = not DEBUG_TIMING
+            print(f"⏱️ Round-trip timing {'on' if DEBUG_TIMING else 'off'}")
+            continue
+
         if user.lower() == "forgetname":
             try:
                 response_data = send_to_server("CrimsonResetConfigData")
                 reply = response_data.get("reply", "Memory reset confirmed")
                 print(f"Felix: {reply}")
-                speak("Okay! I forgot your name. Please tell me your name again.")
-                name_known = False
+                speak(FORGET_LINE)
+                state["name_known"] = False
             except Exception as e:
                 print(f"⚠️ Error contacting server: {e}")
                 print("Felix: I can't reset your memory right now, but you can try again later.")
@@ -174,7 +346,7 @@ def main():
 
         if user.lower() in ["exit", "quit", "bye"]:
             print("Felix: Bye bye~ (^_^)")
-            speak("Bye bye~")
+            speak(BYE_LINE)
             break
 
         if user.lower() == "help":
@@ -198,31 +370,24 @@ def main():
             webbrowser.open(f"https://music.youtube.com/search?q={search.replace(' ', '+')}")
             continue
 
+        # Answer well-known questions without a round trip to the server
+        answer = faq.answer(user)
+        if answer:
+            print("Felix:", answer)
+            speak(answer.replace("(^_^)", "").strip())
+            continue
+
         # Try to send message to server
-        try:
-            response_data = send_to_server(user)
-            reply = response_data.get("reply", "🤖 No response from Felix.")
-            status = response_data.get("status", "unknown")
-
-            # Update name tracking
-            if (not name_known) and ("my name is" in user.lower() or "nice to meet you" in reply.lower()):
-                name_known = True
-
-            if (not name_known) and ("please tell me your name" in reply.lower()):
-                print("Felix: Hey! I don't know your name yet. Please say 'My name is ...' so I can remember you! (^_^)")
-                speak("Hey! I don't know your name yet. Please say 'My name is ...' so I can remember you!")
-            else:
-                print("Felix:", reply)
-                # Only speak if it's not an error
-                if status != "error":
-                    speak(reply.replace("💬", "").replace("(^_^)", "").strip())
-
-        except Exception as e:
-            print("Felix: The server might be sleeping or having issues. Let me try to help offline!")
-            print(f"⚠️ Error: {e}")
-            reply = fallback_offline_answer(user)
-            print("Felix:", reply)
-            speak(reply)
+        if replies:
+            # Streaming would interleave with typing, so async replies arrive whole
+            replies.submit(ask_server, user, state, False)
+        else:
+            ask_server(user, state)
+
+    if replies:
+        replies.shutdown(wait=True)  # let replies still in flight finish printing
+    tts.wait(timeout=10)  # finish saying goodbye
+    tts.close()
 
     input("\nPress Enter to exit...")  # Prevent immediate console close
 
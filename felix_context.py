@@ -0,0 +1,151 @@
+import os
+import re
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Context settings (override with environment variables)
+CONTEXT_TOKENS = int(os.getenv("FELIX_CONTEXT_TOKENS", "1000"))
+SUMMARY_TOKENS = int(os.getenv("FELIX_SUMMARY_TOKENS", "200"))
+SUMMARY_WORKERS = int(os.getenv("FELIX_SUMMARY_WORKERS", "2"))
+
+# Rough local stand-in for a BPE tokenizer: short word pieces and punctuation
+TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+MESSAGE_OVERHEAD = 4  # role + separators per chat message
+
+ROLES = {"u": "user", "a": "assistant"}
+
+
+def estimate_tokens(text):
+    return len(TOKEN_RE.findall(text or ""))
+
+
+def trim_to_tokens(text, max_tokens):
+    """Keep the end of text so it fits in max_tokens."""
+    pieces = list(TOKEN_RE.finditer(text))
+    if len(pieces) <= max_tokens:
+        return text
+    return text[pieces[-max_tokens].start():]
+
+
+def local_summary(summary, turns):
+    """Cheap summarizer used when no LLM summarizer is configured."""
+    lines = [f"{'User' if role == 'u' else 'Felix'}: {text}" for role, text in turns]
+    return " ".join(filter(None, [summary] + lines))
+
+
+class ConversationContext:
+    """Per-user chat history kept under a token budget.
+
+    History lives in the user record as compact ``[role, text]`` pairs
+    (role "u" or "a"). When it grows past ``token_budget`` the oldest turns
+    are cut off right away and folded into ``record["summary"]`` on a
+    background thread, so a long conversation never grows the prompt and
+    the request never waits for the summary.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKENS, summary_tokens=SUMMARY_TOKENS, summarizer=None,
+                 on_update=None, workers=SUMMARY_WORKERS):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or local_summary
+        self.on_update = on_update  # called as on_update(key, record) after a summary changes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="felix-summary")
+        self.lock = threading.Lock()
+        self.pending_folds = {}
+        self.stats = {"requests": 0, "prompt_tokens": 0, "max_prompt_tokens": 0, "folds": 0, "fold_errors": 0}
+
+    @staticmethod
+    def history(record):
+        if "chat_history" in record:
+            # Old server1 format: list of {"role": ..., "content": ...}
+            legacy = record.pop("chat_history")
+            record["history"] = [["u" if m["role"] == "user" else "a", m["content"]] for m in legacy]
+        return record.setdefault("history", [])
+
+    def build_messages(self, record, system_prompt, user_input):
+        """Return (messages, prompt_tokens) for the next completion call."""
+        messages = [{"role": "system", "content": system_prompt}]
+        summary = record.get("summary")
+        if summary:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {summary}"})
+
+        used = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+        used += estimate_tokens(user_input) + MESSAGE_OVERHEAD
+        kept = []
+        budget = self.token_budget
+        for role, text in reversed(self.history(record)):
+            cost = estimate_tokens(text) + MESSAGE_OVERHEAD
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append({"role": ROLES[role], "content": text})
+        messages.extend(reversed(kept))
+        messages.append({"role": "user", "content": user_input})
+
+        prompt_tokens = used + (self.token_budget - budget)
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["max_prompt_tokens"] = max(self.stats["max_prompt_tokens"], prompt_tokens)
+        return messages, prompt_tokens
+
+    def record_turn(self, key, record, user_input, reply):
+        """Append a user/assistant exchange and fold overflow into the summary."""
+        history = self.history(record)
+        history.append(["u", user_input])
+        history.append(["a", reply])
+
+        total = 0
+        cut = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            total += estimate_tokens(history[i][1]) + MESSAGE_OVERHEAD
+            if total > self.token_budget:
+                break
+            cut = i
+        if cut < len(history) and history[cut][0] == "a":
+            cut += 1  # keep whole exchanges: never start the window on a reply
+        if cut > 0:
+            overflow = history[:cut]
+            del history[:cut]
+            self._schedule_fold(key, record, overflow)
+        record["history"] = history  # compact records hand out a copy of their history
+
+    def reset(self, record):
+        record.pop("history", None)
+        record.pop("chat_history", None)
+        record.pop("summary", None)
+
+    def _schedule_fold(self, key, record, turns):
+        with self.lock:
+            pending = self.pending_folds.get(key)
+            if pending is not None:
+                # A fold for this user is already queued/running; it picks these up
+                pending.extend(turns)
+                return
+            self.pending_folds[key] = list(turns)
+        self.executor.submit(self._fold, key, record)
+
+    def _fold(self, key, record):
+        while True:
+            with self.lock:
+                turns = self.pending_folds.get(key)
+                if not turns:
+                    self.pending_folds.pop(key, None)
+                    return
+                self.pending_folds[key] = []
+            try:
+                summary = self.summarizer(record.get("summary") or "", turns)
+                self.stats["folds"] += 1
+            except Exception as e:
+                logger.error(f"Summary for {key} failed, using local fallback: {e}")
+                self.stats["fold_errors"] += 1
+                summary = local_summary(record.get("summary") or "", turns)
+            record["summary"] = trim_to_tokens(summary, self.summary_tokens)
+            if self.on_update:
+                try:
+                    self.on_update(key, record)
+                except Exception as e:
+                    logger.error(f"Failed to save summary for {key}: {e}")
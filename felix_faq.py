@@ -0,0 +1,195 @@
+"""Local FAQ answer engine: TF-IDF over word unigrams and bigrams of a curated corpus.
+
+Answers that match a known question closely enough come straight from the
+corpus in microseconds, with no HTTP request and no OpenAI call; anything
+below the score threshold goes to the LLM as before.
+
+    python felix_faq.py build [felix_faq.json] [felix_faq_index.json]
+    python felix_faq.py ask "whats your name?"
+    python felix_faq.py report server_log.txt
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import logging
+
+from felix_cache import normalize
+
+logger = logging.getLogger(__name__)
+
+# FAQ settings (override with environment variables)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_FILE = os.getenv("FELIX_FAQ_CORPUS", os.path.join(BASE_DIR, "felix_faq.json"))
+INDEX_FILE = os.getenv("FELIX_FAQ_INDEX", os.path.join(BASE_DIR, "felix_faq_index.json"))
+FAQ_THRESHOLD = float(os.getenv("FELIX_FAQ_THRESHOLD", "0.8"))
+INDEX_VERSION = 1
+
+
+def terms(text):
+    """Word unigrams plus bigrams, so 'who made you' and 'you made who' differ."""
+    words = normalize(text).split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def fill_answer(answer):
+    if "{" not in answer:
+        return answer
+    return answer.format(time=time.strftime("%I:%M %p"), date=time.strftime("%A, %B %d"))
+
+
+class FaqIndex:
+    """Inverted index of L2-normalized TF-IDF vectors, one per question variant.
+
+    match() scores a message against every question sharing a term with it
+    (cosine similarity) and returns the best entry. Words the corpus has
+    never seen still count towards the message's length, so a long message
+    that merely contains a known question scores low and goes to the LLM.
+    """
+
+    def __init__(self, entries, doc_entries, idf, postings):
+        self.entries = entries
+        self.doc_entries = doc_entries  # question variant -> index into entries
+        self.idf = idf
+        self.postings = postings  # term -> [(question variant, weight)]
+        self.unknown_idf = max(idf.values(), default=1.0)
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def build(cls, entries):
+        docs = [(i, terms(question)) for i, entry in enumerate(entries) for question in entry["questions"]]
+        df = {}
+        for _, doc_terms in docs:
+            for term in set(doc_terms):
+                df[term] = df.get(term, 0) + 1
+        idf = {term: math.log((1 + len(docs)) / (1 + count)) + 1 for term, count in df.items()}
+        postings = {}
+        for doc, (_, doc_terms) in enumerate(docs):
+            for term, weight in cls._vector(doc_terms, idf, 0).items():
+                postings.setdefault(term, []).append((doc, weight))
+        return cls(entries, [entry_index for entry_index, _ in docs], idf, postings)
+
+    @classmethod
+    def load(cls, corpus_path=CORPUS_FILE, index_path=INDEX_FILE):
+        """Load the prebuilt index, or build one from the corpus if it is missing or stale."""
+        try:
+            if os.path.getmtime(index_path) >= os.path.getmtime(corpus_path):
+                with open(index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+                    return cls(data["entries"], data["doc_entries"], data["idf"], postings)
+        except FileNotFoundError:
+            pass  # no prebuilt index; building from the corpus takes a few ms
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"FAQ index not usable, rebuilding: {e}")
+        with open(corpus_path, "r", encoding="utf-8") as f:
+            return cls.build(json.load(f)["entries"])
+
+    def save(self, index_path=INDEX_FILE):
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "entries": self.entries,
+                       "doc_entries": self.doc_entries, "idf": self.idf,
+                       "postings": self.postings}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+
+    @staticmethod
+    def _vector(doc_terms, idf, unknown_idf):
+        counts = {}
+        for term in doc_terms:
+            counts[term] = counts.get(term, 0) + 1
+        weights = {term: count * idf.get(term, unknown_idf) for term, count in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {term: w / norm for term, w in weights.items()}
+
+    def match(self, text, include_offline=False):
+        """Return (entry, score) of the closest question, or (None, 0.0)."""
+        scores = {}
+        for term, weight in self._vector(terms(text), self.idf, self.unknown_idf).items():
+            for doc, doc_weight in self.postings.get(term, ()):
+                scores[doc] = scores.get(doc, 0.0) + weight * doc_weight
+        best, best_score = None, 0.0
+        for doc, score in scores.items():
+            entry = self.entries[self.doc_entries[doc]]
+            if score > best_score and (include_offline or not entry.get("offline")):
+                best, best_score = entry, score
+        return best, best_score
+
+    def answer(self, text, threshold=FAQ_THRESHOLD, include_offline=False):
+        """The corpus answer when the best match scores at least threshold, else None."""
+        entry, score = self.match(text, include_offline)
+        if entry is None or score < threshold:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return fill_answer(entry["answer"])
+
+
+def read_messages(path):
+    """User messages from a plain text file (one per line) or a server log ('... said: <message>')."""
+    messages = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if " said: " in line:
+                line = line.split(" said: ", 1)[1]
+            elif "] " in line and line.startswith("["):
+                continue  # some other log line
+            line = line.strip()
+            if line:
+                messages.append(line)
+    return messages
+
+
+def report(index, messages, threshold):
+    started = time.perf_counter()
+    results = [(message,) + index.match(message) for message in messages]
+    elapsed = time.perf_counter() - started
+    hits = [r for r in results if r[1] is not None and r[2] >= threshold]
+    by_entry = {}
+    for _, entry, _ in hits:
+        by_entry[entry["id"]] = by_entry.get(entry["id"], 0) + 1
+    near = sorted((r for r in results if r[1] is not None and threshold * 0.6 <= r[2] < threshold),
+                  key=lambda r: r[2], reverse=True)
+    total = len(results)
+    print(f"Messages:      {total}")
+    print(f"Local answers: {len(hits)} ({len(hits) / total * 100 if total else 0:.1f}%) at threshold {threshold}")
+    print(f"Match time:    {elapsed / total * 1e6 if total else 0:.1f} µs per message")
+    print("\nTop entries:")
+    for entry_id, count in sorted(by_entry.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {count:6}  {entry_id}")
+    print("\nNear misses (candidates for new question variants):")
+    for message, entry, score in near[:20]:
+        print(f"  {score:.2f}  {entry['id']:16} {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Felix local FAQ engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="Precompute the index from the corpus")
+    p_build.add_argument("corpus", nargs="?", default=CORPUS_FILE)
+    p_build.add_argument("index", nargs="?", default=INDEX_FILE)
+    p_ask = sub.add_parser("ask", help="Show the best match for a message")
+    p_ask.add_argument("message")
+    p_report = sub.add_parser("report", help="Hit rate over a message file or server log")
+    p_report.add_argument("messages")
+    p_report.add_argument("--threshold", type=float, default=FAQ_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            index = FaqIndex.build(json.load(f)["entries"])
+        index.save(args.index)
+        print(f"✅ Indexed {len(index.entries)} entries, {len(index.idf)} terms into {args.index}")
+    elif args.command == "ask":
+        entry, score = FaqIndex.load().match(args.message, include_offline=True)
+        print(f"{score:.3f}  {entry['id'] if entry else '-'}  {fill_answer(entry['answer']) if entry else ''}")
+    else:
+        report(FaqIndex.load(), read_messages(args.messages), args.threshold)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
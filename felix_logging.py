@@ -0,0 +1,190 @@
+import os
+import queue
+import atexit
+import threading
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Log writer settings (override with environment variables)
+LOG_QUEUE_SIZE = int(os.getenv("FELIX_LOG_QUEUE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("FELIX_LOG_BATCH", "256"))
+LOG_FLUSH_MS = int(os.getenv("FELIX_LOG_FLUSH_MS", "200"))
+LOG_MAX_BYTES = int(os.getenv("FELIX_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("FELIX_LOG_BACKUPS", "5"))
+LOG_DROP_POLICY = os.getenv("FELIX_LOG_DROP_POLICY", "drop_oldest")  # drop_oldest | drop_new | block
+
+
+def timestamp():
+    return datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
+
+
+class BatchedFileWriter:
+    """Appends lines to a file from a background thread.
+
+    write() only puts the line on a bounded queue. The writer thread drains
+    it in batches and flushes when ``batch_size`` lines are waiting or
+    every ``flush_interval_ms``. When the queue is full the drop policy
+    decides: drop the oldest queued line, drop the new one, or block the
+    caller (backpressure). Files roll over to path.1 .. path.N once they
+    pass ``max_bytes``; set max_bytes=0 to never rotate.
+    """
+
+    def __init__(self, path, header=None, max_queue=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                 flush_interval_ms=LOG_FLUSH_MS, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                 drop_policy=LOG_DROP_POLICY):
+        self.path = path
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.drop_policy = drop_policy
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {"written": 0, "dropped": 0, "rotations": 0, "errors": 0}
+        self._flushed = threading.Condition()
+        self._file_lock = threading.Lock()  # the writer thread vs. rotate()
+        self._enqueued = 0
+        self._done = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"felix-log-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line):
+        """Queue one line; returns False if it was dropped."""
+        if self._closed:
+            return False
+        try:
+            if self.drop_policy == "block":
+                self.queue.put(line, timeout=1.0)
+            else:
+                self.queue.put_nowait(line)
+        except queue.Full:
+            if self.drop_policy != "drop_oldest":
+                self.stats["dropped"] += 1
+                return False
+            try:
+                self.queue.get_nowait()
+                self._mark_done(1)
+                self.stats["dropped"] += 1
+                self.queue.put_nowait(line)
+            except (queue.Empty, queue.Full):
+                self.stats["dropped"] += 1
+                return False
+        with self._flushed:
+            self._enqueued += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is on disk."""
+        with self._flushed:
+            target = self._enqueued
+            self._flushed.wait_for(lambda: self._done >= target, timeout)
+
+    def rotate(self, min_bytes=0):
+        """Roll the file over now (e.g. on a schedule); False if it is missing, empty or under min_bytes."""
+        with self._file_lock:
+            try:
+                size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                if size == 0 or size < min_bytes:
+                    return False
+                self._rotate()
+                return True
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Failed to rotate {self.path}: {e}")
+                return False
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._thread.join(timeout=2)
+
+    def _mark_done(self, count):
+        with self._flushed:
+            self._done += count
+            self._flushed.notify_all()
+
+    def _run(self):
+        while not self._closed:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            self._mark_done(len(batch))
+
+    def _write_batch(self, batch):
+        with self._file_lock:
+            self._append(batch)
+
+    def _append(self, batch):
+        try:
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            is_new = not os.path.exists(self.path)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if is_new and self.header:
+                    f.write(f"{self.header}\n")
+                f.write("".join(f"{line}\n" for line in batch))
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to write to {self.path}: {e}")
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.stats["rotations"] += 1
+
+
+class RegistryLog:
+    """user_registry.txt writer that de-duplicates entries with an in-memory set.
+
+    The existing file is read once at startup instead of on every new name.
+    """
+
+    HEADER = "=== Felix User Registry ==="
+
+    def __init__(self, path, **writer_options):
+        self.seen = set()
+        self.lock = threading.Lock()
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.startswith("["):
+                            self.seen.add(line.split("] ", 1)[-1].rstrip("\n"))
+        except Exception as e:
+            logger.error(f"Failed to read user registry: {e}")
+        writer_options.setdefault("max_bytes", 0)
+        self.writer = BatchedFileWriter(path, header=self.HEADER, **writer_options)
+
+    def record(self, ip, name, uid):
+        entry = f"{ip} | ID {uid} | {name}"
+        with self.lock:
+            if entry in self.seen:
+                return False
+            self.seen.add(entry)
+        return self.writer.write(f"{timestamp()} {entry}")
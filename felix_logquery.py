@@ -0,0 +1,433 @@
+"""Indexed queries over server_log.txt and user_registry.txt.
+
+Each log gets a SQLite sidecar (``<log>.idx``) holding one row per line
+(timestamp, byte offset, user ID, event type) plus per-user and per-hour
+aggregates. Timestamps are stored as YYYYMMDDhhmmss integers. Indexing
+is incremental: only bytes appended since the last run are read, in one
+streaming pass over an mmap of the log. Queries look up offsets in the
+sidecar and slice the matching lines out of the mmap, so the log itself
+is never loaded.
+
+Rotated backups (``<log>.1`` .. ``<log>.N``) stay in the index: every
+file is a segment recognised by a hash of its first bytes, so a rotation
+only renames segments and queries keep reaching the days before it.
+Per-user and per-hour totals keep counting backups that have since been
+deleted; their lines drop out of event queries.
+
+    python felix_logquery.py index server_log.txt user_registry.txt
+    python felix_logquery.py user 12 --since "2024-05-01 10:00" --until "2024-05-01 12"
+    python felix_logquery.py users --top 20
+    python felix_logquery.py hours --since 2024-05-01
+"""
+import os
+import re
+import sys
+import mmap
+import time
+import sqlite3
+import hashlib
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Query tool settings (override with environment variables)
+BASE_DIR = os.getenv("FELIX_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))
+LOG_FILE = os.path.join(BASE_DIR, "server_log.txt")
+USER_REGISTRY_FILE = os.path.join(BASE_DIR, "user_registry.txt")
+INDEX_BATCH = int(os.getenv("FELIX_LOG_INDEX_BATCH", "50000"))
+INDEX_VERSION = 3
+HEAD_BYTES = 4096  # a log whose first bytes changed was rotated or rewritten; index it again
+
+LINE = re.compile(rb"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ?(.*)", re.S)
+SAID = re.compile(rb"\xf0\x9f\x93\xa8 <(.*) #(\d+)> said: ")                        # 📨 <name #12> said: ...
+REPLIED = re.compile(rb"\xf0\x9f\xa4\x96 Felix replied(?: to #(\d+))?(?: \(cached\))?: ")  # 🤖 Felix replied to #12: ...
+SET_NAME = re.compile(rb"\xf0\x9f\x93\x9d <(.*?)> set name to: (.*) \(ID #(\d+)\)$")  # 📝 <ip> set name to: x (ID #12)
+ERROR = b"\xe2\x9d\x8c"                                                               # ❌ ...
+REGISTERED = re.compile(rb"(.*?) \| ID (\d+) \| (.*)$")                             # ip | ID 12 | name
+
+EVENT_TYPES = ("said", "replied", "set_name", "registered", "error", "other")
+TYPE_CODES = {kind: code for code, kind in enumerate(EVENT_TYPES)}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, path TEXT, head TEXT, head_len INTEGER,
+    offset INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS events (ts INTEGER, seg INTEGER, offset INTEGER, length INTEGER, uid INTEGER,
+    type INTEGER);
+CREATE TABLE IF NOT EXISTS users (uid INTEGER PRIMARY KEY, name TEXT, ip TEXT, said INTEGER DEFAULT 0,
+    replied INTEGER DEFAULT 0, reply_chars INTEGER DEFAULT 0, first_ts TEXT, last_ts TEXT);
+CREATE TABLE IF NOT EXISTS hours (hour TEXT PRIMARY KEY, said INTEGER DEFAULT 0, replied INTEGER DEFAULT 0,
+    errors INTEGER DEFAULT 0, reply_chars INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS hour_users (hour TEXT, uid INTEGER, PRIMARY KEY (hour, uid));
+"""
+# Created after a full build rather than maintained row by row, which is several times faster
+EVENT_INDEXES = """
+CREATE INDEX IF NOT EXISTS events_uid_ts ON events (uid, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+"""
+
+
+def parse_line(line):
+    """(ts, type, uid, name, ip, text) for one log line, or None for a line without a timestamp."""
+    m = LINE.match(line.rstrip(b"\r\n"))
+    if m is None:
+        return None
+    ts, body = m.group(1).decode(), m.group(2)
+    said = SAID.match(body)
+    if said:
+        return ts, "said", int(said.group(2)), said.group(1).decode("utf-8", "replace"), None, body[said.end():]
+    replied = REPLIED.match(body)
+    if replied:
+        uid = int(replied.group(1)) if replied.group(1) else None
+        return ts, "replied", uid, None, None, body[replied.end():]
+    set_name = SET_NAME.match(body)
+    if set_name:
+        return (ts, "set_name", int(set_name.group(3)), set_name.group(2).decode("utf-8", "replace"),
+                set_name.group(1).decode("utf-8", "replace"), b"")
+    if body.startswith(ERROR):
+        return ts, "error", None, None, None, body
+    registered = REGISTERED.match(body)
+    if registered:
+        return (ts, "registered", int(registered.group(2)), registered.group(3).decode("utf-8", "replace"),
+                registered.group(1).decode("utf-8", "replace"), b"")
+    return ts, "other", None, None, None, body
+
+
+def ts_key(ts):
+    """'2024-05-01 10:30:00' -> 20240501103000"""
+    return int(ts.replace("-", "").replace(" ", "").replace(":", ""))
+
+
+def window(since=None, until=None):
+    """Pad partial timestamps ('2024-05-01 10') into an inclusive [since, until] range."""
+    low, high = "0000-01-01 00:00:00", "9999-12-31 23:59:59"
+    return (since or "") + low[len(since or ""):], (until or "") + high[len(until or ""):]
+
+
+def head_hash(mm, length):
+    return hashlib.sha1(mm[:length]).hexdigest()
+
+
+def open_mmap(path):
+    """Read-only mmap of path, or None when the file is missing or empty."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+class LogIndex:
+    """SQLite sidecar index for one append-only log file."""
+
+    def __init__(self, log_path, index_path=None):
+        self.log_path = log_path
+        self.index_path = index_path or f"{log_path}.idx"
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.executescript(SCHEMA + EVENT_INDEXES)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def close(self):
+        self.conn.close()
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                              [(key, str(value)) for key, value in values.items()])
+
+    def _clear(self):
+        self.conn.executescript("DROP TABLE events; DROP TABLE segments; DROP TABLE users; DROP TABLE hours; "
+                                "DROP TABLE hour_users; DROP TABLE meta;" + SCHEMA + EVENT_INDEXES)
+
+    def files(self):
+        """The log and its rotated backups, oldest first."""
+        backups = []
+        while os.path.exists(f"{self.log_path}.{len(backups) + 1}"):
+            backups.append(f"{self.log_path}.{len(backups) + 1}")
+        return backups[::-1] + [self.log_path]
+
+    def update(self):
+        """Index lines appended since the last run, following rotations; returns the number of new events."""
+        if int(self._meta("version", INDEX_VERSION)) != INDEX_VERSION:
+            self._clear()
+        segments = self.conn.execute("SELECT id, head, head_len, offset FROM segments ORDER BY id").fetchall()
+        maps, found = [], {}
+        try:
+            for path in self.files():
+                mm = open_mmap(path)
+                if mm is None:
+                    continue
+                seg = next((s for s in segments if s[0] not in found.values() and s[3] <= len(mm)
+                            and head_hash(mm, s[2]) == s[1]), None)
+                found[path] = seg[0] if seg else None
+                maps.append((path, mm, seg))
+
+            lost = [s[0] for s in segments if s[0] not in found.values()]
+            if segments and segments[-1][0] in lost:
+                # The newest file we indexed is nowhere to be found: the log was rewritten, not rotated
+                logger.info(f"🔄 {self.log_path} was rewritten, indexing it again")
+                self._clear()
+                maps = [(path, mm, None) for path, mm, _ in maps]
+            elif lost:
+                # Backups that rotated out of existence take their events with them
+                with self.conn:
+                    self.conn.executemany("DELETE FROM events WHERE seg = ?", [(seg,) for seg in lost])
+                    self.conn.executemany("DELETE FROM segments WHERE id = ?", [(seg,) for seg in lost])
+
+            full_build = self.conn.execute("SELECT 1 FROM events LIMIT 1").fetchone() is None
+            if full_build:
+                self.conn.executescript("DROP INDEX IF EXISTS events_uid_ts; DROP INDEX IF EXISTS events_ts;")
+            total = 0
+            for path, mm, seg in maps:
+                if seg is None:
+                    with self.conn:
+                        seg = (self.conn.execute("INSERT INTO segments (path, head, head_len) VALUES (?, '', 0)",
+                                                 (path,)).lastrowid, "", 0, 0)
+                with self.conn:
+                    self.conn.execute("UPDATE segments SET path = ? WHERE id = ?", (path, seg[0]))
+                if seg[3] < len(mm):
+                    total += self._index(mm, path, seg[0], seg[3])
+            with self.conn:
+                self.conn.execute("DELETE FROM segments WHERE head_len = 0")  # nothing whole to index yet
+            if full_build:
+                self.conn.executescript(EVENT_INDEXES)
+            return total
+        finally:
+            for _, mm, _ in maps:
+                mm.close()
+
+    def _index(self, mm, path, seg, offset):
+        started = time.perf_counter()
+        last_uid = self._meta("last_said_uid")
+        last_uid = int(last_uid) if last_uid else None
+        rows, users, hours, hour_users = [], {}, {}, set()
+        total = 0
+        last_ts, last_key = None, 0  # most lines share their second with the previous one
+        mm.seek(offset)
+        for line in iter(mm.readline, b""):
+            if not line.endswith(b"\n"):
+                break  # half-written last line; picked up on the next run
+            start, offset = offset, offset + len(line)
+            parsed = parse_line(line)
+            if parsed is None:
+                # Continuation of a multi-line message: extend the previous event
+                if rows:
+                    rows[-1][3] = offset - rows[-1][2]
+                else:
+                    self.conn.execute("UPDATE events SET length = ? - offset "
+                                      "WHERE rowid = (SELECT max(rowid) FROM events WHERE seg = ?)", (offset, seg))
+                continue
+            ts, kind, uid, name, ip, text = parsed
+            if kind == "said":
+                last_uid = uid
+            elif kind == "replied" and uid is None:
+                uid = last_uid  # older logs: a reply follows the message it answers
+            if ts != last_ts:
+                last_ts, last_key = ts, ts_key(ts)
+            rows.append([last_key, seg, start, offset - start, uid, TYPE_CODES[kind]])
+            self._aggregate(users, hours, hour_users, ts, kind, uid, name, ip, text)
+            if len(rows) >= INDEX_BATCH:
+                total += self._commit(mm, seg, rows, users, hours, hour_users, offset, last_uid)
+                rows, users, hours, hour_users = [], {}, {}, set()
+        total += self._commit(mm, seg, rows, users, hours, hour_users, offset, last_uid)
+        elapsed = time.perf_counter() - started
+        logger.info(f"📇 Indexed {total} events from {path} in {elapsed:.2f}s")
+        return total
+
+    @staticmethod
+    def _aggregate(users, hours, hour_users, ts, kind, uid, name, ip, text):
+        hour = hours.setdefault(ts[:13], {"said": 0, "replied": 0, "errors": 0, "reply_chars": 0})
+        if kind == "error":
+            hour["errors"] += 1
+            return
+        if uid is None:
+            return
+        user = users.setdefault(uid, {"name": None, "ip": None, "said": 0, "replied": 0, "reply_chars": 0,
+                                      "first_ts": ts, "last_ts": ts})
+        user["last_ts"] = ts
+        if name:
+            user["name"] = name
+        if ip:
+            user["ip"] = ip
+        if kind == "said":
+            user["said"] += 1
+            hour["said"] += 1
+            hour_users.add((ts[:13], uid))
+        elif kind == "replied":
+            chars = len(text.decode("utf-8", "replace").strip())
+            user["replied"] += 1
+            user["reply_chars"] += chars
+            hour["replied"] += 1
+            hour["reply_chars"] += chars
+
+    def _commit(self, mm, seg, rows, users, hours, hour_users, offset, last_uid):
+        head_len = min(HEAD_BYTES, offset)
+        with self.conn:
+            self.conn.executemany("INSERT INTO events (ts, seg, offset, length, uid, type) VALUES (?, ?, ?, ?, ?, ?)",
+                                  rows)
+            self.conn.executemany(
+                "INSERT INTO users (uid, name, ip, said, replied, reply_chars, first_ts, last_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (uid) DO UPDATE SET "
+                "name = coalesce(excluded.name, name), ip = coalesce(excluded.ip, ip), "
+                "said = said + excluded.said, replied = replied + excluded.replied, "
+                "reply_chars = reply_chars + excluded.reply_chars, last_ts = excluded.last_ts",
+                [(uid, u["name"], u["ip"], u["said"], u["replied"], u["reply_chars"], u["first_ts"], u["last_ts"])
+                 for uid, u in users.items()])
+            self.conn.executemany(
+                "INSERT INTO hours (hour, said, replied, errors, reply_chars) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (hour) DO UPDATE SET said = said + excluded.said, replied = replied + excluded.replied, "
+                "errors = errors + excluded.errors, reply_chars = reply_chars + excluded.reply_chars",
+                [(hour, h["said"], h["replied"], h["errors"], h["reply_chars"]) for hour, h in hours.items()])
+            self.conn.executemany("INSERT OR IGNORE INTO hour_users (hour, uid) VALUES (?, ?)", list(hour_users))
+            self.conn.execute("UPDATE segments SET head = ?, head_len = ?, offset = ? WHERE id = ?",
+                              (head_hash(mm, head_len), head_len, offset, seg))
+            self._set_meta(version=INDEX_VERSION, last_said_uid=last_uid if last_uid is not None else "")
+        return len(rows)
+
+    def events(self, uid=None, since=None, until=None, kinds=None, limit=None):
+        """Yield (ts, type, uid, line) for matching events, oldest first, reading lines through mmap.
+
+        Files are looked up as of the last update(); a segment whose file has
+        rotated since is skipped until update() runs again.
+        """
+        low, high = window(since, until)
+        sql = "SELECT ts, type, uid, seg, offset, length FROM events WHERE ts BETWEEN ? AND ?"
+        params = [ts_key(low), ts_key(high)]
+        if uid is not None:
+            sql += " AND uid = ?"
+            params.append(uid)
+        if kinds:
+            sql += f" AND type IN ({', '.join('?' for _ in kinds)})"
+            params.extend(TYPE_CODES[kind] for kind in kinds)
+        sql += " ORDER BY ts, seg, offset"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        maps = {}
+        try:
+            for ts, kind, event_uid, seg, offset, length in self.conn.execute(sql, params):
+                if seg not in maps:
+                    maps[seg] = self._open_segment(seg)
+                if maps[seg] is None:
+                    continue
+                line = maps[seg][offset:offset + length].decode("utf-8", "replace").rstrip("\r\n")
+                yield ts, EVENT_TYPES[kind], event_uid, line
+        finally:
+            for mm in maps.values():
+                if mm is not None:
+                    mm.close()
+
+    def _open_segment(self, seg):
+        """mmap of the file holding segment seg, or None if that file has moved on."""
+        path, head, head_len = self.conn.execute("SELECT path, head, head_len FROM segments WHERE id = ?",
+                                                 (seg,)).fetchone()
+        mm = open_mmap(path)
+        if mm is not None and head_hash(mm, head_len) != head:
+            logger.warning(f"{path} changed since it was indexed; run update() to follow the rotation")
+            mm.close()
+            return None
+        return mm
+
+    def user(self, uid):
+        row = self.conn.execute("SELECT uid, name, ip, said, replied, reply_chars, first_ts, last_ts FROM users "
+                                "WHERE uid = ?", (uid,)).fetchone()
+        return self._user_dict(row) if row else None
+
+    def users(self, top=20, order="said"):
+        order = order if order in ("said", "replied", "reply_chars", "last_ts") else "said"
+        rows = self.conn.execute("SELECT uid, name, ip, said, replied, reply_chars, first_ts, last_ts FROM users "
+                                 f"ORDER BY {order} DESC LIMIT ?", (top,))
+        return [self._user_dict(row) for row in rows]
+
+    @staticmethod
+    def _user_dict(row):
+        uid, name, ip, said, replied, reply_chars, first_ts, last_ts = row
+        return {"uid": uid, "name": name, "ip": ip, "said": said, "replied": replied,
+                "avg_reply_chars": round(reply_chars / replied, 1) if replied else 0.0,
+                "first_ts": first_ts, "last_ts": last_ts}
+
+    def hours(self, since=None, until=None):
+        low, high = window(since, until)
+        rows = self.conn.execute(
+            "SELECT h.hour, h.said, h.replied, h.errors, h.reply_chars, "
+            "(SELECT count(*) FROM hour_users u WHERE u.hour = h.hour) FROM hours h "
+            "WHERE h.hour BETWEEN ? AND ? ORDER BY h.hour", (low[:13], high[:13]))
+        return [{"hour": hour, "said": said, "replied": replied, "errors": errors, "users": active,
+                 "error_rate": round(errors / said, 4) if said else 0.0,
+                 "avg_reply_chars": round(reply_chars / replied, 1) if replied else 0.0}
+                for hour, said, replied, errors, reply_chars, active in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Felix log index and queries")
+    parser.add_argument("--log", default=LOG_FILE, help="Server log to query (default: %(default)s)")
+    parser.add_argument("--registry", default=USER_REGISTRY_FILE)
+    parser.add_argument("--no-update", action="store_true", help="Query the index as is, without indexing new lines")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_index = sub.add_parser("index", help="Build or update the sidecar index of one or more logs")
+    p_index.add_argument("logs", nargs="*")
+    p_user = sub.add_parser("user", help="What did user #N do between --since and --until")
+    p_user.add_argument("uid", type=int)
+    p_user.add_argument("--since")
+    p_user.add_argument("--until")
+    p_user.add_argument("--type", action="append", choices=EVENT_TYPES, help="Only these event types (repeatable)")
+    p_user.add_argument("--limit", type=int, default=1000)
+    p_users = sub.add_parser("users", help="Per-user message counts and reply lengths")
+    p_users.add_argument("--top", type=int, default=20)
+    p_users.add_argument("--order", default="said", choices=("said", "replied", "reply_chars", "last_ts"))
+    p_hours = sub.add_parser("hours", help="Per-hour messages, active users, error rate and reply lengths")
+    p_hours.add_argument("--since")
+    p_hours.add_argument("--until")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        for path in args.logs or [args.log, args.registry]:
+            index = LogIndex(path)
+            started = time.perf_counter()
+            count = index.update()
+            print(f"✅ {path}: {count} new events in {time.perf_counter() - started:.2f}s -> {index.index_path}")
+            index.close()
+        return 0
+
+    index = LogIndex(args.log)
+    if not args.no_update:
+        index.update()
+    started = time.perf_counter()
+    if args.command == "user":
+        registry = LogIndex(args.registry)
+        if not args.no_update:
+            registry.update()
+        profile, registered = index.user(args.uid), registry.user(args.uid)
+        if profile and registered:
+            profile.update(name=profile["name"] or registered["name"], ip=profile["ip"] or registered["ip"])
+        profile = profile or registered
+        print(f"👤 User #{args.uid}: {profile or 'not in the logs'}")
+        events = list(index.events(args.uid, args.since, args.until, args.type, args.limit))
+        for _, _, _, line in events:
+            print(line)
+        print(f"\n{len(events)} events in {(time.perf_counter() - started) * 1000:.1f} ms")
+        registry.close()
+    elif args.command == "users":
+        print(f"{'uid':>6} {'name':16} {'ip':16} {'said':>7} {'replied':>7} {'avg reply':>9}  last seen")
+        for u in index.users(args.top, args.order):
+            print(f"{u['uid']:>6} {(u['name'] or '-')[:16]:16} {(u['ip'] or '-')[:16]:16} {u['said']:>7} "
+                  f"{u['replied']:>7} {u['avg_reply_chars']:>9}  {u['last_ts']}")
+    else:
+        print(f"{'hour':13} {'said':>7} {'replied':>7} {'users':>6} {'errors':>6} {'err rate':>8} {'avg reply':>9}")
+        for h in index.hours(args.since, args.until):
+            print(f"{h['hour']:13} {h['said']:>7} {h['replied']:>7} {h['users']:>6} {h['errors']:>6} "
+                  f"{h['error_rate'] * 100:>7.2f}% {h['avg_reply_chars']:>9}")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Background maintenance: one daemon thread per process runs small housekeeping jobs on a timer.
+
+A job is a function taking ``deadline`` (a time.monotonic() value) that
+should wrap up once it passes; whatever it returns is shown in /health.
+Jobs marked ``shared`` work on files every worker uses (store compaction,
+log rotation) and only run in the process holding the maintenance lock
+file, so with ``gunicorn -w N`` exactly one worker does them and another
+takes over if it exits. Per-process jobs (evicting idle users, prewarming
+caches) run in every worker.
+"""
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+
+try:
+    import schedule
+except ImportError:  # a plain interval loop does the same job
+    schedule = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+# Maintenance settings (override with environment variables)
+MAINTENANCE_ENABLED = os.getenv("FELIX_MAINTENANCE", "true").lower() == "true"
+JOB_BUDGET_S = float(os.getenv("FELIX_MAINTENANCE_BUDGET_S", "5"))
+USER_IDLE_TTL_S = int(os.getenv("FELIX_USER_IDLE_TTL_S", "3600"))
+EVICT_INTERVAL_S = int(os.getenv("FELIX_EVICT_INTERVAL_S", "300"))
+CACHE_PURGE_INTERVAL_S = int(os.getenv("FELIX_CACHE_PURGE_INTERVAL_S", "600"))
+COMPACT_INTERVAL_S = int(os.getenv("FELIX_COMPACT_INTERVAL_S", str(6 * 3600)))
+COMPACT_BUDGET_S = float(os.getenv("FELIX_COMPACT_BUDGET_S", "30"))
+LOG_ROTATE_INTERVAL_S = int(os.getenv("FELIX_LOG_ROTATE_INTERVAL_S", "600"))
+PREWARM_USERS = int(os.getenv("FELIX_PREWARM_USERS", "1000"))
+FLIGHT_SWEEP_INTERVAL_S = int(os.getenv("FELIX_SINGLEFLIGHT_SWEEP_S", "60"))
+TICK_S = 1.0
+
+
+class LeaderLock:
+    """A non-blocking exclusive lock on a file, kept until the process exits or forks."""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    @property
+    def held(self):
+        return self.handle is not None
+
+    def acquire(self):
+        """True if this process holds the lock (taking it if it is free)."""
+        if self.handle is not None:
+            return True
+        try:
+            handle = open(self.path, "a+")
+        except OSError as e:
+            logger.error(f"Cannot open maintenance lock {self.path}: {e}")
+            return False
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{os.getpid()}\n")
+        handle.flush()
+        self.handle = handle
+        logger.info(f"🔒 Process {os.getpid()} runs the shared maintenance jobs")
+        return True
+
+    def release(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+class Job:
+    def __init__(self, name, fn, every_s, budget_s, shared, at_start):
+        self.name = name
+        self.fn = fn
+        self.every_s = every_s
+        self.budget_s = budget_s
+        self.shared = shared
+        self.at_start = at_start
+        self.handle = None  # schedule.Job when the schedule package drives the timer
+        self.next_run = time.time() + every_s if every_s > 0 else None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.overruns = 0
+        self.last_run = None
+        self.last_duration_ms = None
+        self.last_result = None
+        self.last_error = None
+
+    def status(self):
+        if self.handle is not None:
+            next_run = self.handle.next_run
+        else:
+            next_run = datetime.fromtimestamp(self.next_run) if self.next_run else None
+        return {"every_s": self.every_s, "budget_s": self.budget_s, "shared": self.shared, "runs": self.runs,
+                "skipped": self.skipped, "failures": self.failures, "overruns": self.overruns,
+                "last_run": self.last_run, "last_duration_ms": self.last_duration_ms,
+                "last_result": self.last_result, "last_error": self.last_error,
+                "next_run": next_run.isoformat(timespec="seconds") if next_run else None}
+
+
+class MaintenanceScheduler:
+    """Runs registered jobs one at a time on a ``felix-maintenance`` thread.
+
+    Jobs run in sequence, so the budget of each one bounds how late the
+    next can start; a job that runs past its budget is counted as an
+    overrun. start() is idempotent and cheap, so it can be called from a
+    request hook; after a fork (gunicorn --preload) it starts a fresh
+    thread in the child, and the parent gives up the shared jobs.
+    """
+
+    def __init__(self, lock_path, enabled=MAINTENANCE_ENABLED, tick_s=TICK_S):
+        self.leader = LeaderLock(lock_path)
+        self.enabled = enabled
+        self.tick = tick_s
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self._scheduler = schedule.Scheduler() if schedule is not None else None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._forked = False
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(before=self._before_fork, after_in_child=self._after_fork_in_child)
+
+    def add(self, name, fn, every_s=0, budget_s=JOB_BUDGET_S, shared=False, at_start=False):
+        """Register fn(deadline) to run every ``every_s`` seconds (0 = only at start, if at_start)."""
+        job = Job(name, fn, every_s, budget_s, shared, at_start)
+        if every_s > 0 and self._scheduler is not None:
+            job.handle = self._scheduler.every(every_s).seconds.do(self.run_job, job)
+        self.jobs[name] = job
+        return job
+
+    def start(self):
+        if not self.enabled or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self.lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="felix-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run_job(self, job):
+        """Run one job now and record how it went; returns its result (None if skipped or failed)."""
+        if job.every_s > 0:
+            job.next_run = time.time() + job.every_s
+        if job.shared and (self._forked or not self.leader.acquire()):
+            job.skipped += 1
+            return None
+        started = time.monotonic()
+        job.last_run = datetime.now().isoformat(timespec="seconds")
+        result = None
+        try:
+            result = job.fn(deadline=started + job.budget_s)
+            job.last_result = result
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ Maintenance job {job.name} failed: {job.last_error}")
+        elapsed = time.monotonic() - started
+        job.runs += 1
+        job.last_duration_ms = round(elapsed * 1000, 1)
+        if elapsed > job.budget_s:
+            job.overruns += 1
+            logger.warning(f"⚠️ Maintenance job {job.name} took {elapsed:.1f}s (budget {job.budget_s:g}s)")
+        return result
+
+    def status(self):
+        return {"enabled": self.enabled,
+                "running": self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+                "leader": self.leader.held, "timer": "schedule" if self._scheduler is not None else "builtin",
+                "jobs": {name: job.status() for name, job in self.jobs.items()}}
+
+    def _run(self):
+        logger.info(f"🧹 Maintenance running {len(self.jobs)} jobs in process {os.getpid()}")
+        for job in list(self.jobs.values()):
+            if job.at_start:
+                self.run_job(job)
+        while not self._stop.wait(self.tick):
+            if self._scheduler is not None:
+                self._scheduler.run_pending()
+                continue
+            now = time.time()
+            for job in list(self.jobs.values()):
+                if job.next_run is not None and now >= job.next_run:
+                    self.run_job(job)
+
+    def _before_fork(self):
+        # A process that forks workers is a supervisor: the children take over the shared jobs
+        self.leader.release()
+        self._forked = True
+
+    def _after_fork_in_child(self):
+        self._forked = False
+        self._thread = None
+        self.lock = threading.Lock()
@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILE_INTERVAL_MS = float(os.getenv("FELIX_PROFILE_INTERVAL_MS", "10"))
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.kind = "counter"
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value that goes up and down; pass fn to read it lazily at scrape time."""
+
+    def __init__(self, name, help_text, fn=None):
+        super().__init__(name, help_text)
+        self.kind = "gauge"
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                return [(self.name, (), self.fn())]
+            except Exception as e:
+                logger.error(f"Gauge {self.name} failed: {e}")
+                return []
+        return super().samples()
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.kind = "histogram"
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, series in self.series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    out.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series[-1]))
+                out.append((f"{self.name}_sum", key, series[-2]))
+                out.append((f"{self.name}_count", key, series[-1]))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name, help_text, fn=None):
+        return self._add(Gauge(name, help_text, fn))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+
+class StageTimer:
+    """Times named stages of a request into one histogram."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    @contextmanager
+    def __call__(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram.observe(time.perf_counter() - started, stage=stage)
+
+
+class SamplingProfiler:
+    """Low-overhead sampling profiler that can be switched on and off at runtime.
+
+    While running it snapshots every thread's stack each ``interval_ms``
+    and counts identical stacks. report() returns them in collapsed-stack
+    format ("outer;inner;leaf count"), ready for flamegraph tools.
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS, max_depth=40):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+        self.stacks = {}
+        self.samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, reset=True):
+        if self.running:
+            return
+        if reset:
+            with self.lock:
+                self.stacks = {}
+                self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="felix-profiler", daemon=True)
+        self._thread.start()
+        logger.info("Sampling profiler started")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        logger.info("Sampling profiler stopped")
+
+    def report(self, limit=200):
+        with self.lock:
+            top = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return "\n".join(f"{stack} {count}" for stack, count in top) + "\n"
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                self.samples += 1
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    names = []
+                    while frame is not None and len(names) < self.max_depth:
+                        code = frame.f_code
+                        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    stack = ";".join(reversed(names))
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
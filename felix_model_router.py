@@ -0,0 +1,179 @@
+"""Pick the model, max_tokens and temperature for each message before the OpenAI call.
+
+Messages are classified locally (length, question shape and weighted
+keyword/bigram scores) into a tier from a config table, so small talk gets a
+short, quick reply and real questions get room to answer.
+
+    python felix_model_router.py route "can you explain photosynthesis step by step"
+    python felix_model_router.py eval felix_routing_labels.tsv
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+import logging
+from collections import namedtuple
+
+from felix_faq import terms
+
+logger = logging.getLogger(__name__)
+
+# Tier table; a model of None means the server's default model.
+# Override with FELIX_MODEL_TIERS=path/to/tiers.json (same shape).
+DEFAULT_TIERS = {
+    "small_talk": {"model": None, "max_tokens": 60, "temperature": 0.9},
+    "standard": {"model": None, "max_tokens": 200, "temperature": 0.7},
+    "detailed": {"model": "gpt-4o-mini", "max_tokens": 400, "temperature": 0.5},
+}
+TIERS_FILE = os.getenv("FELIX_MODEL_TIERS", "")
+
+# Keyword, bigram and trigram weights; a message's score is the sum over its terms
+SMALL_TALK_TERMS = {
+    "hi": 2, "hello": 2, "hey": 2, "yo": 2, "sup": 2, "lol": 2, "lmao": 2, "haha": 2, "ok": 1.5, "okay": 1.5,
+    "cool": 1.5, "nice": 1.5, "thanks": 2, "thank you": 2, "bye": 2, "good night": 2, "good morning": 2,
+    "bored": 1.5, "love you": 2, "you are": 1, "are you": 1, "do you like": 2, "how are": 2, "wow": 1.5,
+    "yes": 1, "no": 1, "same": 1, "funny": 1,
+}
+DETAILED_TERMS = {
+    "explain": 2.5, "why": 2.5, "how does": 2.5, "how do": 1.5, "difference between": 2.5, "compare": 2.5,
+    "step by step": 3, "steps": 1.5, "homework": 2, "essay": 3, "write": 2, "story": 2, "poem": 2,
+    "code": 2.5, "python": 1.5, "program": 2, "solve": 2, "calculate": 2, "equation": 2, "math": 1.5,
+    "history": 1.5, "science": 1.5, "describe": 2, "summarize": 2, "list": 1.5, "examples": 1.5,
+    "in detail": 3, "tell me about": 2.5, "what happened": 1.5, "how to": 1.5,
+}
+QUESTION_WORDS = {"what", "who", "when", "where", "which", "why", "how", "can", "could", "should", "is", "are", "do",
+                  "does"}
+DETAILED_SCORE = 2.5   # at or above: detailed tier
+LONG_MESSAGE_WORDS = 25  # longer than this: detailed tier
+SHORT_MESSAGE_WORDS = 6  # this short, with small-talk signals and no real question: small_talk tier
+
+Route = namedtuple("Route", "tier model max_tokens temperature")
+
+
+def features(text):
+    words = text.lower().split()
+    message_terms = terms(text)
+    normalized = [term for term in message_terms if " " not in term]
+    message_terms += [" ".join(normalized[i:i + 3]) for i in range(len(normalized) - 2)]  # "step by step"
+    return {
+        "words": len(words),
+        "question": text.rstrip().endswith("?") or (bool(words) and words[0].strip("?,.!") in QUESTION_WORDS),
+        "small_talk": sum(SMALL_TALK_TERMS.get(term, 0) for term in message_terms),
+        "detailed": sum(DETAILED_TERMS.get(term, 0) for term in message_terms),
+    }
+
+
+def classify(text):
+    """Return the tier name for a message."""
+    f = features(text)
+    if f["detailed"] >= DETAILED_SCORE or f["words"] > LONG_MESSAGE_WORDS:
+        return "detailed"
+    if f["words"] <= SHORT_MESSAGE_WORDS and f["small_talk"] > f["detailed"] and \
+            (f["small_talk"] >= 2 or not f["question"]):
+        return "small_talk"
+    return "standard"
+
+
+def load_tiers(path=TIERS_FILE):
+    if not path:
+        return DEFAULT_TIERS
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load model tiers from {path}, using defaults: {e}")
+        return DEFAULT_TIERS
+
+
+class ModelRouter:
+    """Maps messages to a Route and keeps per-tier latency and token counts for tuning the table."""
+
+    def __init__(self, default_model, tiers=None):
+        self.default_model = default_model
+        self.tiers = tiers or load_tiers()
+        self.lock = threading.Lock()
+        self.tier_stats = {tier: {"calls": 0, "latency_s": 0.0, "max_latency_s": 0.0, "prompt_tokens": 0,
+                                  "completion_tokens": 0} for tier in self.tiers}
+
+    def route(self, text):
+        tier = classify(text)
+        config = self.tiers.get(tier) or self.tiers["standard"]
+        return Route(tier, config.get("model") or self.default_model, config["max_tokens"], config["temperature"])
+
+    def record(self, tier, latency_s, prompt_tokens=0, completion_tokens=0):
+        with self.lock:
+            stats = self.tier_stats.setdefault(tier, {"calls": 0, "latency_s": 0.0, "max_latency_s": 0.0,
+                                                      "prompt_tokens": 0, "completion_tokens": 0})
+            stats["calls"] += 1
+            stats["latency_s"] += latency_s
+            stats["max_latency_s"] = max(stats["max_latency_s"], latency_s)
+            stats["prompt_tokens"] += prompt_tokens or 0
+            stats["completion_tokens"] += completion_tokens or 0
+
+    def stats(self):
+        with self.lock:
+            out = {}
+            for tier, s in self.tier_stats.items():
+                calls = s["calls"] or 1
+                out[tier] = dict(s, mean_latency_ms=round(s["latency_s"] / calls * 1000, 1),
+                                 mean_completion_tokens=round(s["completion_tokens"] / calls, 1))
+            return out
+
+
+def read_labeled(path):
+    """(tier, message) pairs from a file of 'tier<TAB>message' lines; '#' starts a comment."""
+    pairs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            tier, message = line.split("\t", 1)
+            pairs.append((tier.strip(), message.strip()))
+    return pairs
+
+
+def evaluate(pairs):
+    """Print accuracy, a confusion matrix and the misrouted messages; returns accuracy."""
+    tiers = sorted({tier for tier, _ in pairs} | set(DEFAULT_TIERS))
+    confusion = {(expected, got): 0 for expected in tiers for got in tiers}
+    misses = []
+    for expected, message in pairs:
+        got = classify(message)
+        confusion[(expected, got)] = confusion.get((expected, got), 0) + 1
+        if got != expected:
+            misses.append((expected, got, message))
+    accuracy = (len(pairs) - len(misses)) / len(pairs) if pairs else 0.0
+    print(f"Messages: {len(pairs)}   accuracy: {accuracy * 100:.1f}%\n")
+    print("expected / routed".ljust(20) + "".join(f"{tier:>12}" for tier in tiers))
+    for expected in tiers:
+        print(f"{expected:20}" + "".join(f"{confusion[(expected, got)]:>12}" for got in tiers))
+    if misses:
+        print("\nMisrouted:")
+        for expected, got, message in misses:
+            print(f"  {expected:>10} -> {got:<10} {message}")
+    return accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Felix model routing")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_route = sub.add_parser("route", help="Show the tier and features for one message")
+    p_route.add_argument("message")
+    p_eval = sub.add_parser("eval", help="Check routing against a labeled 'tier<TAB>message' file")
+    p_eval.add_argument("labels")
+    p_eval.add_argument("--min-accuracy", type=float, default=0.0, help="Exit non-zero below this (0-1)")
+    args = parser.parse_args()
+
+    if args.command == "route":
+        route = ModelRouter(default_model="default").route(args.message)
+        print(json.dumps({"route": route._asdict(), "features": features(args.message)}, indent=2))
+        return 0
+    accuracy = evaluate(read_labeled(args.labels))
+    return 1 if accuracy < args.min_accuracy else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Rate limit settings (override with environment variables; a rate of 0 turns that limit off)
+COMMAND_RATE_PER_S = float(os.getenv("FELIX_RATE_CMD_PER_S", "2"))
+COMMAND_BURST = int(os.getenv("FELIX_RATE_CMD_BURST", "20"))
+LLM_RATE_PER_MIN = float(os.getenv("FELIX_RATE_LLM_PER_MIN", "20"))
+LLM_BURST = int(os.getenv("FELIX_RATE_LLM_BURST", "8"))
+MAX_KEYS = int(os.getenv("FELIX_RATE_MAX_KEYS", "100000"))
+SHARED_DB = os.getenv("FELIX_RATE_DB", "")  # e.g. /dev/shm/felix-ratelimit.db to share across workers
+MAX_CONCURRENT = int(os.getenv("FELIX_MAX_CONCURRENT", "64"))
+MAX_QUEUE = int(os.getenv("FELIX_MAX_QUEUE", "128"))
+QUEUE_TIMEOUT_S = float(os.getenv("FELIX_QUEUE_TIMEOUT_S", "2"))
+
+
+class Overloaded(Exception):
+    """No request slot came free in time; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server overloaded, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """GCRA (a token bucket that stores one timestamp per key).
+
+    Each key may send ``burst`` requests at once and then one every
+    ``1 / rate_per_s`` seconds. allow() returns (allowed, retry_after_s).
+    State is one float per key in an LRU dict capped at ``max_keys``;
+    evicting an idle key loses nothing, since its bucket has refilled.
+    """
+
+    def __init__(self, name, rate_per_s, burst, max_keys=MAX_KEYS):
+        self.name = name
+        self.enabled = rate_per_s > 0
+        self.interval = 1.0 / rate_per_s if self.enabled else 0.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.tats = OrderedDict()  # key -> theoretical arrival time
+        self.stats = {"allowed": 0, "limited": 0, "evicted": 0}
+
+    def allow(self, key, cost=1, now=None):
+        if not self.enabled:
+            return True, 0.0
+        now = time.time() if now is None else now
+        with self.lock:
+            allowed, retry_after, tat = self._decide(self._tat(key, now), now, cost)
+            if allowed:
+                self._set_tat(key, tat)
+                self.stats["allowed"] += 1
+            else:
+                self.stats["limited"] += 1
+        return allowed, retry_after
+
+    def _decide(self, tat, now, cost):
+        new_tat = max(tat, now) + self.interval * cost
+        allow_at = new_tat - self.interval * self.burst
+        if now < allow_at:
+            return False, allow_at - now, tat
+        return True, 0.0, new_tat
+
+    def _tat(self, key, now):
+        tat = self.tats.get(key)
+        if tat is None:
+            return now
+        self.tats.move_to_end(key)
+        return tat
+
+    def _set_tat(self, key, tat):
+        self.tats[key] = tat
+        self.tats.move_to_end(key)
+        while len(self.tats) > self.max_keys:
+            self.tats.popitem(last=False)
+            self.stats["evicted"] += 1
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose buckets live in a SQLite file shared by every worker process.
+
+    Put the file on tmpfs (/dev/shm); each decision is one short
+    ``BEGIN IMMEDIATE`` transaction, and buckets that have fully
+    refilled are swept out every ``sweep_every`` decisions.
+    """
+
+    def __init__(self, name, rate_per_s, burst, path, max_keys=MAX_KEYS, sweep_every=1000):
+        super().__init__(name, rate_per_s, burst, max_keys)
+        self.sweep_every = sweep_every
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT, key TEXT, tat REAL, PRIMARY KEY (name, key))")
+
+    def allow(self, key, cost=1, now=None):
+        if not self.enabled:
+            return True, 0.0
+        now = time.time() if now is None else now
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT tat FROM buckets WHERE name = ? AND key = ?",
+                                        (self.name, key)).fetchone()
+                allowed, retry_after, tat = self._decide(row[0] if row else now, now, cost)
+                if allowed:
+                    self.conn.execute("INSERT OR REPLACE INTO buckets (name, key, tat) VALUES (?, ?, ?)",
+                                      (self.name, key, tat))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.stats["allowed" if allowed else "limited"] += 1
+            if (self.stats["allowed"] + self.stats["limited"]) % self.sweep_every == 0:
+                cursor = self.conn.execute("DELETE FROM buckets WHERE name = ? AND tat < ?", (self.name, now))
+                self.stats["evicted"] += cursor.rowcount
+        return allowed, retry_after
+
+
+def create_limiter(name, rate_per_s, burst, shared_db=SHARED_DB):
+    if shared_db:
+        try:
+            return SharedRateLimiter(name, rate_per_s, burst, shared_db)
+        except sqlite3.Error as e:
+            logger.error(f"Shared rate limiter unavailable, using per-process buckets: {e}")
+    return RateLimiter(name, rate_per_s, burst)
+
+
+class AdmissionControl:
+    """Global cap on requests in progress, with a bounded wait queue.
+
+    Up to ``max_concurrent`` requests run at once; up to ``max_queue``
+    more wait at most ``queue_timeout_s`` for a slot. Anything beyond that
+    is turned away immediately with Overloaded, instead of piling up.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, queue_timeout_s=QUEUE_TIMEOUT_S):
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_s
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0, "inflight": 0}
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            self._admitted()
+            return
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                self.stats["rejected_full"] += 1
+                raise Overloaded(max(1.0, self.queue_timeout))
+            self.waiting += 1
+            self.stats["queued"] += 1
+        try:
+            acquired = self.slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        if not acquired:
+            with self.lock:
+                self.stats["rejected_timeout"] += 1
+            raise Overloaded(max(1.0, self.queue_timeout))
+        self._admitted()
+
+    def release(self):
+        with self.lock:
+            self.stats["inflight"] -= 1
+        self.slots.release()
+
+    def _admitted(self):
+        with self.lock:
+            self.stats["admitted"] += 1
+            self.stats["inflight"] += 1
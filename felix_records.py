@@ -0,0 +1,144 @@
+import os
+import sys
+
+# Keep resident user records as UserRecord instead of dicts (FELIX_COMPACT_RECORDS=false to turn off)
+COMPACT_RECORDS = os.getenv("FELIX_COMPACT_RECORDS", "true").lower() == "true"
+
+TURN_SEP = "\x1e"  # ASCII record separator between packed history turns
+_MISSING = object()
+
+
+class UserRecord:
+    """A user record in under a third of the memory of the equivalent dict.
+
+    Behaves like the ``{"name", "id", "summary", "history"}`` dict the
+    servers use (get, [], in, pop, setdefault, update), but keeps the
+    fields in ``__slots__``, interns names (many users share one), and
+    packs the chat history into a single string ("u" or "a" + text per
+    turn). ``record["history"]`` unpacks a fresh list of ``[role, text]``
+    pairs, so code that changes it has to assign it back. Unknown keys go
+    to a small ``extra`` dict that only exists when needed.
+    """
+
+    __slots__ = ("name", "id", "summary", "_history", "extra")
+
+    def __init__(self, name=None, id=None, summary=None, history=None, extra=None):
+        self.name = sys.intern(name) if isinstance(name, str) else name
+        self.id = id
+        self.summary = summary
+        self._history = None if history is None else pack_history(history)
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in ("name", "id", "summary", "history")}
+        return cls(data.get("name"), data.get("id"), data.get("summary"), data.get("history"), extra)
+
+    def to_dict(self):
+        data = {"name": self.name}
+        if self.id is not None:
+            data["id"] = self.id
+        if self.summary is not None:
+            data["summary"] = self.summary
+        if self._history is not None:
+            data["history"] = unpack_history(self._history)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key == "name":
+            return self.name
+        if key == "id":
+            return default if self.id is None else self.id
+        if key == "summary":
+            return default if self.summary is None else self.summary
+        if key == "history":
+            return default if self._history is None else unpack_history(self._history)
+        return self.extra.get(key, default) if self.extra else default
+
+    def __setitem__(self, key, value):
+        if key == "name":
+            self.name = sys.intern(value) if isinstance(value, str) else value
+        elif key == "id":
+            self.id = value
+        elif key == "summary":
+            self.summary = value
+        elif key == "history":
+            self._history = None if value is None else pack_history(value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        if key in ("name", "id"):
+            setattr(self, key, None)
+        elif key == "summary":
+            self.summary = None
+        elif key == "history":
+            self._history = None
+        elif self.extra:
+            self.extra.pop(key, None)
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **fields):
+        for key, value in dict(*args, **fields).items():
+            self[key] = value
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, UserRecord):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()!r})"
+
+
+def pack_history(history):
+    return TURN_SEP.join(role + text.replace(TURN_SEP, " ") for role, text in history)
+
+
+def unpack_history(packed):
+    return [[turn[:1], turn[1:]] for turn in packed.split(TURN_SEP)] if packed else []
+
+
+def compact(record, enabled=COMPACT_RECORDS):
+    """Turn a record dict into a UserRecord (anything else is returned as is)."""
+    if enabled and type(record) is dict and "name" in record:
+        return UserRecord.from_dict(record)
+    return record
+
+
+def to_json(record):
+    """``default=`` hook for json.dumps, so stores can serialize UserRecords."""
+    if isinstance(record, UserRecord):
+        return record.to_dict()
+    raise TypeError(f"Object of type {type(record).__name__} is not JSON serializable")
@@ -0,0 +1,86 @@
+import re
+
+
+def phrase_key(text):
+    return " ".join(text.lower().split())
+
+
+class CommandRouter:
+    """Finds every registered trigger phrase in one pass of a single compiled regex.
+
+    Triggers only match on word boundaries ("help" does not fire on
+    "helpful"), and when several start at the same spot the longest wins.
+    Handlers run in registration order, so register higher-priority
+    commands first.
+    """
+
+    def __init__(self):
+        self.entries = {}  # phrase key -> list of (command, value, capture regex, anchored)
+        self.handlers = []  # (command, handler) in priority order
+        self._pattern = None
+
+    def add(self, command, phrases, value=None, capture=None, anchored=False):
+        """Register trigger phrases for a command.
+
+        value is reported back on a match (defaults to the phrase itself).
+        capture is a regex applied right after the phrase; its first group
+        becomes the value and the trigger only counts if it matches.
+        anchored triggers only count at the start of the message.
+        """
+        if isinstance(phrases, str):
+            phrases = [phrases]
+        capture_re = re.compile(capture, re.I) if capture else None
+        for phrase in phrases:
+            key = phrase_key(phrase)
+            self.entries.setdefault(key, []).append((command, phrase if value is None else value, capture_re, anchored))
+        self._pattern = None
+
+    def command(self, name, *phrases):
+        """Decorator: register phrases and a handler(hits, *args) for a command."""
+        def decorator(handler):
+            if phrases:
+                self.add(name, phrases)
+            self.handlers.append((name, handler))
+            return handler
+        return decorator
+
+    def compile(self):
+        alternatives = sorted(self.entries, key=len, reverse=True)
+        body = "|".join(r"\s+".join(re.escape(word) for word in key.split()) for key in alternatives)
+        self._pattern = re.compile(rf"(?<!\w)(?:{body})(?!\w)", re.I)
+        return self._pattern
+
+    def scan(self, text):
+        """Return {command: [value, ...]} for every trigger in text, in order of appearance."""
+        hits = {}
+        if not self.entries:
+            return hits
+        pattern = self._pattern or self.compile()
+        for match in pattern.finditer(text):
+            for command, value, capture_re, anchored in self.entries[phrase_key(match.group())]:
+                if anchored and text[:match.start()].strip():
+                    continue
+                if capture_re:
+                    captured = capture_re.match(text, match.end())
+                    if not captured:
+                        continue
+                    value = captured.group(1)
+                hits.setdefault(command, []).append(value)
+        return hits
+
+    def first(self, text, command):
+        values = self.scan(text).get(command)
+        return values[0] if values else None
+
+    def route(self, hits, *args):
+        """Like dispatch, but returns (command, result) so callers can see which branch answered."""
+        for command, handler in self.handlers:
+            if command in hits:
+                result = handler(hits, *args)
+                if result is not None:
+                    return command, result
+        return None, None
+
+    def dispatch(self, hits, *args):
+        """Run the first handler whose command was hit and that returns a result."""
+        return self.route(hits, *args)[1]
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process coalescing only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Single-flight settings (override with environment variables)
+FLIGHT_TIMEOUT_S = float(os.getenv("FELIX_SINGLEFLIGHT_TIMEOUT_S", "30"))
+FLIGHT_DIR = os.getenv("FELIX_SINGLEFLIGHT_DIR", "")  # e.g. /dev/shm/felix-flight to share across workers
+POLL_INTERVAL_S = 0.02
+
+
+class SingleFlightTimeout(Exception):
+    """A follower gave up waiting for the leader's result."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class FileCoordinator:
+    """Cross-process single flight through flock'd files in a shared directory.
+
+    The worker holding ``<key>.lock`` runs the call and writes ``<key>.json``;
+    workers that find the lock taken wait for it to be released and reuse
+    that result. Results must be JSON-serializable. Files stay behind after
+    the call; sweep() removes the ones too old to be of use.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def run(self, key, fn, timeout_s):
+        lock_path = os.path.join(self.directory, f"{key}.lock")
+        result_path = os.path.join(self.directory, f"{key}.json")
+        started = time.time()
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                result = self._wait_for_result(lock_file, result_path, started, timeout_s)
+                if result is not None:
+                    return result[0], True
+                # Leader failed or timed out; do the work ourselves
+                return fn(), False
+            try:
+                result = fn()
+                tmp_path = f"{result_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"at": time.time(), "result": result}, f)
+                os.replace(tmp_path, result_path)
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def sweep(self, max_age_s, deadline=None):
+        """Delete lock, result and temp files older than max_age_s; returns how many.
+
+        A lock that some worker still holds is left alone. Stops early at
+        ``deadline`` (time.monotonic()).
+        """
+        cutoff = time.time() - max_age_s
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                try:
+                    if entry.stat().st_mtime >= cutoff:
+                        continue
+                    if entry.name.endswith(".lock") and self._in_use(entry.path):
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass  # a worker removed or recreated it meanwhile
+        return removed
+
+    @staticmethod
+    def _in_use(lock_path):
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+
+    @staticmethod
+    def _wait_for_result(lock_file, result_path, started, timeout_s):
+        deadline = started + timeout_s
+        while time.time() < deadline:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                break
+            except BlockingIOError:
+                time.sleep(POLL_INTERVAL_S)
+        else:
+            return None
+        try:
+            with open(result_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["at"] >= started:
+                return (data["result"],)
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one call.
+
+    The first caller (the leader) runs fn; callers that arrive while it is
+    running wait up to ``timeout_s`` and get the same result or exception.
+    Exceptions listed in ``local_errors`` are about the leader's caller
+    (e.g. its own in-flight cap), not the call: followers don't inherit
+    them and retry, one of them as the new leader. With
+    ``coordinator_dir`` set, leaders in different worker processes also
+    coalesce through a FileCoordinator.
+    """
+
+    def __init__(self, timeout_s=FLIGHT_TIMEOUT_S, coordinator_dir=FLIGHT_DIR, local_errors=()):
+        self.timeout = timeout_s
+        self.local_errors = tuple(local_errors)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.coordinator = None
+        if coordinator_dir and fcntl is not None:
+            try:
+                self.coordinator = FileCoordinator(coordinator_dir)
+            except OSError as e:
+                logger.error(f"Cross-worker single flight disabled: {e}")
+        self.stats = {"leaders": 0, "coalesced": 0, "cross_worker_coalesced": 0, "timeouts": 0, "retried": 0}
+
+    def sweep(self, deadline=None):
+        """Remove coordinator files no follower can use any more (older than twice the timeout)."""
+        if self.coordinator is None:
+            return 0
+        return self.coordinator.sweep(2 * self.timeout, deadline)
+
+    def do(self, key, fn):
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.calls[key] = _Call()
+                    self.stats["leaders"] += 1
+                else:
+                    self.stats["coalesced"] += 1
+            if leader:
+                return self._lead(key, fn, call)
+
+            if not call.done.wait(self.timeout):
+                self.stats["timeouts"] += 1
+                raise SingleFlightTimeout(f"Timed out waiting for in-flight call {key}")
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, self.local_errors):
+                raise call.error
+            self.stats["retried"] += 1  # the leader's own limit; try again, maybe as the new leader
+
+    def _lead(self, key, fn, call):
+        try:
+            if self.coordinator:
+                call.result, shared = self.coordinator.run(key, fn, self.timeout)
+                if shared:
+                    self.stats["cross_worker_coalesced"] += 1
+            else:
+                call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
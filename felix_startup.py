@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Readiness probe settings (override with environment variables)
+PROBE_INTERVAL_S = float(os.getenv("FELIX_PROBE_INTERVAL_S", "2"))
+PROBE_MAX_INTERVAL_S = float(os.getenv("FELIX_PROBE_MAX_INTERVAL_S", "60"))
+
+
+class Lazy:
+    """Builds a resource on first use, then forwards attribute access to it.
+
+    Lets module-level globals such as the store or the upstream client stay
+    as they are while their construction moves out of import time. The
+    factory runs once, under a lock, in whichever thread needs it first.
+    """
+
+    def __init__(self, factory, name):
+        self.factory = factory
+        self.name = name
+        self.lock = threading.Lock()
+        self.value = None
+        self.loaded = False
+        self.init_s = None
+
+    def get(self):
+        if self.loaded:
+            return self.value
+        with self.lock:
+            if not self.loaded:
+                started = time.perf_counter()
+                self.value = self.factory()
+                self.init_s = time.perf_counter() - started
+                self.loaded = True
+                logger.info(f"⚡ {self.name} initialized in {self.init_s * 1000:.0f} ms")
+        return self.value
+
+    def status(self):
+        return {"loaded": self.loaded,
+                "init_ms": round(self.init_s * 1000, 1) if self.init_s is not None else None}
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+class ReadinessProbe:
+    """Runs a dependency check in a background thread until it passes.
+
+    States: "pending" (not run yet), "ready", "retrying" (last check failed
+    with an error worth retrying; tried again with exponential backoff) and
+    "failed" (``retryable(error)`` said no, e.g. a bad API key; not retried).
+    """
+
+    def __init__(self, check, name, retryable=None, interval_s=PROBE_INTERVAL_S,
+                 max_interval_s=PROBE_MAX_INTERVAL_S):
+        self.check = check
+        self.name = name
+        self.retryable = retryable or (lambda error: True)
+        self.interval = interval_s
+        self.max_interval = max_interval_s
+        self.lock = threading.Lock()
+        self.state = "pending"
+        self.attempts = 0
+        self.last_error = None
+        self.latency_ms = None
+        self.ready_at = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    @property
+    def failed(self):
+        return self.state == "failed"
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"felix-probe-{self.name}", daemon=True)
+                self._thread.start()
+
+    def status(self):
+        return {"state": self.state, "attempts": self.attempts, "last_error": self.last_error,
+                "latency_ms": self.latency_ms, "ready_at": self.ready_at}
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            self.attempts += 1
+            started = time.perf_counter()
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if not self.retryable(e):
+                    self.state = "failed"
+                    logger.error(f"❌ {self.name} probe failed: {self.last_error}")
+                    return
+                self.state = "retrying"
+                logger.warning(f"⚠️ {self.name} probe failed ({self.last_error}), retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_interval)
+                continue
+            self.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.last_error = None
+            self.ready_at = time.time()
+            self.state = "ready"
+            logger.info(f"✅ {self.name} ready after {self.attempts} attempt(s)")
+            return
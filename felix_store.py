@@ -0,0 +1,811 @@
+import os
+import sys
+import json
+import shlex
+import atexit
+import signal
+import sqlite3
+import threading
+import time
+import weakref
+import logging
+
+try:
+    import redis
+except ImportError:  # only needed for FELIX_STORE=redis
+    redis = None
+
+from felix_records import compact as compact_record, to_json
+
+logger = logging.getLogger(__name__)
+
+# Store settings (override with environment variables)
+STORE_BACKEND = os.getenv("FELIX_STORE", "sqlite").lower()
+# "batched": writes are queued and flushed in the background every FELIX_STORE_COMMIT_MS
+# (FELIX_STORE_JSON_FLUSH_MS for the JSON file) or FELIX_STORE_BATCH changes, so a crash
+# can lose that window. "strict": every write is on disk before the request returns.
+STORE_DURABILITY = os.getenv("FELIX_STORE_DURABILITY", "batched").lower()
+STRICT = STORE_DURABILITY == "strict"
+COMMIT_INTERVAL_MS = 0 if STRICT else int(os.getenv("FELIX_STORE_COMMIT_MS", "50"))
+JSON_FLUSH_INTERVAL_MS = 0 if STRICT else int(os.getenv("FELIX_STORE_JSON_FLUSH_MS", "1000"))
+COMMIT_BATCH_SIZE = int(os.getenv("FELIX_STORE_BATCH", "64"))
+CHECKPOINT_INTERVAL_S = int(os.getenv("FELIX_STORE_CHECKPOINT_S", "300"))
+# Several worker processes on one store file (gunicorn -w N) need shared mode; "auto" turns it on
+# whenever more than one worker is configured
+STORE_SHARED_SETTING = os.getenv("FELIX_STORE_SHARED", "auto").lower()
+REDIS_URL = os.getenv("FELIX_REDIS_URL", "redis://localhost:6379/0")
+EVICT_SLICE = 500  # idle records dropped per lock hold
+VACUUM_STEP_PAGES = 256  # free pages returned per compaction step (one short write transaction)
+
+# Every open store, so queued writes can be flushed at exit or on SIGTERM
+_open_stores = weakref.WeakSet()
+
+
+def configured_workers(argv=None, environ=None):
+    """How many gunicorn workers this process was started with (1 when not under gunicorn).
+
+    Reads -w/--workers from the gunicorn command line and GUNICORN_CMD_ARGS,
+    falling back to WEB_CONCURRENCY, which gunicorn uses as its default.
+    """
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    args = shlex.split(environ.get("GUNICORN_CMD_ARGS", ""))
+    if argv and "gunicorn" in (os.path.basename(argv[0]), os.path.basename(os.path.dirname(argv[0]))):
+        args += argv[1:]  # the command line wins over GUNICORN_CMD_ARGS
+    workers = environ.get("WEB_CONCURRENCY") or "1"
+    for i, arg in enumerate(args):
+        if arg in ("-w", "--workers") and i + 1 < len(args):
+            workers = args[i + 1]
+        elif arg.startswith("--workers="):
+            workers = arg.split("=", 1)[1]
+        elif arg.startswith("-w") and arg[2:].isdigit():
+            workers = arg[2:]
+    try:
+        return max(1, int(workers))
+    except ValueError:
+        return 1
+
+
+WORKERS = configured_workers()
+STORE_SHARED = WORKERS > 1 if STORE_SHARED_SETTING == "auto" else STORE_SHARED_SETTING == "true"
+
+
+def enable_wal(conn, timeout_s=5.0):
+    """Switch conn to WAL, retrying while other workers are creating the same file.
+
+    Changing the journal mode skips SQLite's busy handler, so workers
+    opening a new store together would otherwise fail with "database is
+    locked".
+    """
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+def dump_record(record):
+    return json.dumps(record, ensure_ascii=False, default=to_json)
+
+
+def load_record(data):
+    """Parse a stored record; user records come back as compact UserRecords."""
+    return compact_record(json.loads(data))
+
+
+def flush_all():
+    for store in list(_open_stores):
+        try:
+            store.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush {getattr(store, 'path', store)} on shutdown: {e}")
+
+
+atexit.register(flush_all)
+
+
+def install_shutdown_flush():
+    """Flush queued writes on SIGTERM, then hand over to the previous handler (e.g. gunicorn's)."""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if getattr(previous, "felix_flush", False):
+        return
+
+    def on_sigterm(signum, frame):
+        logger.info("🛑 SIGTERM: flushing user memory")
+        flush_all()
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            raise SystemExit(0)  # runs the atexit hooks, e.g. the log writers
+
+    on_sigterm.felix_flush = True
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+class JsonFileStore:
+    """Legacy store: the whole dict lives in one JSON file.
+
+    Writes are write-behind: put() only marks the record dirty, and a
+    background thread rewrites the file every ``flush_interval_ms`` or as
+    soon as ``batch_size`` records are dirty, so many changes cost one
+    dump. The file is replaced via temp file + rename, so a crash mid-write
+    never leaves a half-written file. ``flush_interval_ms=0`` dumps on
+    every put.
+    """
+
+    def __init__(self, path, flush_interval_ms=JSON_FLUSH_INTERVAL_MS, batch_size=COMMIT_BATCH_SIZE):
+        self.path = path
+        self.meta_path = f"{path}.meta"
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self.data = {}
+        self.meta = {}
+        self.dirty = set()
+        self.meta_dirty = False
+        self.stats = {"flushes": 0, "records_flushed": 0, "failures": 0}
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self.data = {key: compact_record(record) for key, record in json.load(f).items()}
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    self.meta = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading {path}: {e}")
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        if self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="felix-json-flush", daemon=True)
+            self._thread.start()
+        _open_stores.add(self)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def put(self, key, record):
+        with self.lock:
+            self.data[key] = compact_record(record)
+            self.dirty.add(key)
+            self._schedule_flush()
+
+    def delete(self, key):
+        with self.lock:
+            if self.data.pop(key, None) is not None:
+                self.dirty.add(key)
+                self._schedule_flush()
+
+    def update(self, key, fn, default=None):
+        """Atomic read-modify-write: fn mutates the record in place."""
+        with self.lock:
+            record = self.data.get(key, default)
+            if record is None:
+                return None
+            fn(record)
+            self.put(key, record)
+            return record
+
+    def insert_if_absent(self, key, record):
+        with self.lock:
+            if key in self.data:
+                return False
+            self.put(key, record)
+            return True
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, record):
+        self.put(key, record)
+
+    def __len__(self):
+        return len(self.data)
+
+    def keys(self):
+        return list(self.data.keys())
+
+    def values(self):
+        return list(self.data.values())
+
+    def items(self):
+        return list(self.data.items())
+
+    def counter(self, name):
+        return self.meta.get(name)
+
+    def increment(self, name, initial=0):
+        """Bump a persisted counter and return the new value."""
+        with self.lock:
+            self.meta[name] = self.meta.get(name, initial) + 1
+            self.meta_dirty = True
+            self._schedule_flush()
+            return self.meta[name]
+
+    def flush(self):
+        """Write dirty state to disk now (snapshot under the lock, file I/O outside it)."""
+        with self.write_lock:
+            with self.lock:
+                if not self.dirty and not self.meta_dirty:
+                    return
+                count = len(self.dirty)
+                data_text = json.dumps(self.data, ensure_ascii=False, default=to_json) if self.dirty else None
+                meta_text = json.dumps(self.meta) if self.meta_dirty else None
+                self.dirty = set()
+                self.meta_dirty = False
+            ok = True
+            if meta_text is not None:
+                ok = self._write_text(self.meta_path, meta_text) and ok
+            if data_text is not None:
+                ok = self._write_text(self.path, data_text) and ok
+            if not ok:
+                with self.lock:
+                    # Retry next round; everything is dumped anyway, so one marker key is enough
+                    self.dirty.add(None)
+                    self.meta_dirty = self.meta_dirty or meta_text is not None
+                self.stats["failures"] += 1
+                return
+            self.stats["flushes"] += 1
+            self.stats["records_flushed"] += count
+
+    def compact(self, deadline=None):
+        self.flush()
+
+    def evict_idle(self, idle_s, deadline=None):
+        return 0  # the whole file is the cache; there is no disk copy to fall back on
+
+    def prewarm(self, limit, deadline=None):
+        return 0  # everything is loaded at startup
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _schedule_flush(self):
+        if self.flush_interval <= 0:
+            self.flush()
+        elif len(self.dirty) >= self.batch_size:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _write_text(self, path, text):
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save {path}: {e}")
+            return False
+
+
+class SQLiteStore:
+    """One row per user key, so a save only writes the record that changed.
+
+    Records are loaded lazily on first access. Writes are queued and committed
+    together by a background thread every ``commit_interval_ms`` (group
+    commit) or as soon as ``batch_size`` records are waiting. Set
+    ``commit_interval_ms=0`` to commit synchronously on every put.
+
+    With ``shared=True`` several processes can use the same file: reads
+    always go to the database instead of the in-process cache, and
+    update() does its read-modify-write inside ``BEGIN IMMEDIATE``, so two
+    workers changing the same user never lose each other's writes.
+
+    Cached records stay resident until evict_idle() drops the ones nobody
+    has touched for a while; they reload from disk on their next use.
+    """
+
+    def __init__(self, path, commit_interval_ms=COMMIT_INTERVAL_MS, batch_size=COMMIT_BATCH_SIZE,
+                 checkpoint_interval_s=CHECKPOINT_INTERVAL_S, shared=STORE_SHARED):
+        self.path = path
+        self.shared = shared
+        self.commit_interval = commit_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval_s
+        self.lock = threading.RLock()
+        self.cache = {}
+        self.last_seen = {}  # key -> time.monotonic() of the last get/put of a cached record
+        self.pending = {}  # key -> serialized record, or None for a delete
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes on a new file; see vacuum_file()
+        enable_wal(self.conn)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._wake = threading.Event()
+        self._closed = False
+        self._last_checkpoint = time.monotonic()
+        self._thread = None
+        if self.commit_interval > 0:
+            self._thread = threading.Thread(target=self._commit_loop, name="felix-store-commit", daemon=True)
+            self._thread.start()
+        _open_stores.add(self)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.cache:
+                self.last_seen[key] = time.monotonic()
+                return self.cache[key]
+            if key in self.pending:
+                # Our own queued write is newer than what the database has
+                data = self.pending[key]
+                return default if data is None else load_record(data)
+            row = self.conn.execute("SELECT data FROM records WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            record = load_record(row[0])
+            if not self.shared:
+                self.cache[key] = record
+                self.last_seen[key] = time.monotonic()
+            return record
+
+    def put(self, key, record):
+        with self.lock:
+            if not self.shared:
+                self.cache[key] = compact_record(record)
+                self.last_seen[key] = time.monotonic()
+            self.pending[key] = dump_record(record)
+            self._schedule_commit()
+
+    def update(self, key, fn, default=None):
+        """Atomic read-modify-write of one record: fn mutates the record in place.
+
+        Returns the updated record, or None when the key is missing and no
+        default was given.
+        """
+        with self.lock:
+            if not self.shared:
+                record = self.get(key, default)
+                if record is None:
+                    return None
+                fn(record)
+                self.put(key, record)
+                return record
+            self._commit()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT data FROM records WHERE key = ?", (key,)).fetchone()
+                record = load_record(row[0]) if row else default
+                if record is not None:
+                    fn(record)
+                    self.conn.execute("INSERT OR REPLACE INTO records (key, data) VALUES (?, ?)",
+                                      (key, dump_record(record)))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return record
+
+    def insert_if_absent(self, key, record):
+        """Create a record unless one exists (in any process); True if we created it."""
+        with self.lock:
+            if not self.shared:
+                # Only this process writes the file, so the lock is enough and the insert can be queued
+                if self.get(key) is not None:
+                    return False
+                self.put(key, record)
+                return True
+            self._commit()
+            cursor = self.conn.execute("INSERT OR IGNORE INTO records (key, data) VALUES (?, ?)",
+                                       (key, dump_record(record)))
+            return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self.lock:
+            self.cache.pop(key, None)
+            self.last_seen.pop(key, None)
+            self.pending[key] = None
+            self._schedule_commit()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __setitem__(self, key, record):
+        self.put(key, record)
+
+    def __len__(self):
+        with self.lock:
+            self._commit()
+            return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def values(self):
+        return [record for _, record in self.items()]
+
+    def items(self):
+        with self.lock:
+            self._commit()
+            rows = self.conn.execute("SELECT key, data FROM records").fetchall()
+            return [(key, self.cache.get(key) or load_record(data)) for key, data in rows]
+
+    def counter(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else None
+
+    def increment(self, name, initial=0):
+        """Atomically bump a persisted counter and return the new value."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+                value = (row[0] if row else initial) + 1
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return value
+
+    def import_once(self, name, load):
+        """Insert the ``{key: record}`` dict from ``load()`` into an empty store, once; True if this call did it.
+
+        The check, the import and the ``name`` marker in meta share one
+        ``BEGIN IMMEDIATE``, so workers opening a new file together import
+        it exactly once and the others wait until it is done. A store that
+        already has records is only marked, never imported into.
+        """
+        with self.lock:
+            self._commit()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = self.conn.execute("SELECT 1 FROM meta WHERE name = ?", (name,)).fetchone()
+                empty = self.conn.execute("SELECT 1 FROM records LIMIT 1").fetchone() is None
+                if not done and empty:
+                    self.conn.executemany("INSERT OR IGNORE INTO records (key, data) VALUES (?, ?)",
+                                          [(key, dump_record(record)) for key, record in load().items()])
+                self.conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES (?, 1)", (name,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return bool(not done and empty)
+
+    def flush(self):
+        with self.lock:
+            if not self._closed:
+                self._commit()
+
+    def compact(self, deadline=None, step_pages=VACUUM_STEP_PAGES):
+        """Checkpoint the WAL and give free pages back to the filesystem; returns pages freed.
+
+        Runs on its own connection and never takes ``self.lock``, so
+        requests carry on meanwhile. Pages are freed ``step_pages`` at a
+        time with incremental_vacuum until none are left or ``deadline``
+        (time.monotonic()) passes, so other workers wait one short step at
+        most. Files created before incremental auto-vacuum only get the
+        checkpoint; convert them once offline with vacuum_file().
+        """
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=5.0)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            freed = 0
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+                while deadline is None or time.monotonic() < deadline:
+                    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    if not free:
+                        break
+                    step = min(step_pages, free)
+                    conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+                    freed += step
+                if freed:
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            return freed
+        finally:
+            conn.close()
+
+    def evict_idle(self, idle_s, deadline=None):
+        """Drop cached records unused for ``idle_s`` seconds; returns how many.
+
+        The lock is taken one slice at a time so requests never wait long,
+        and the sweep stops at ``deadline`` (a time.monotonic() value).
+        Queued writes are untouched, so nothing is lost.
+        """
+        cutoff = time.monotonic() - idle_s
+        with self.lock:
+            idle = [key for key, seen in self.last_seen.items() if seen < cutoff]
+        evicted = 0
+        for start in range(0, len(idle), EVICT_SLICE):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            with self.lock:
+                for key in idle[start:start + EVICT_SLICE]:
+                    if self.last_seen.get(key, time.monotonic()) < cutoff:  # skip keys used since the scan
+                        self.cache.pop(key, None)
+                        del self.last_seen[key]
+                        evicted += 1
+        return evicted
+
+    def prewarm(self, limit, deadline=None):
+        """Load the ``limit`` most recently written records into the cache; returns how many.
+
+        A replaced row gets a new rowid, so the highest rowids are the users
+        who were active last. Does nothing in shared mode (no cache).
+        """
+        if self.shared or limit <= 0:
+            return 0
+        with self.lock:
+            self._commit()
+            rows = self.conn.execute("SELECT key, data FROM records ORDER BY rowid DESC LIMIT ?",
+                                     (limit,)).fetchall()
+        loaded = 0
+        for key, data in rows:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            record = load_record(data)
+            with self.lock:
+                if key not in self.cache and key not in self.pending:
+                    self.cache[key] = record
+                    self.last_seen[key] = time.monotonic()
+                    loaded += 1
+        return loaded
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self.lock:
+            self._commit()
+            self.conn.close()
+
+    def _schedule_commit(self):
+        if self.commit_interval <= 0:
+            self._commit()
+        elif len(self.pending) >= self.batch_size:
+            self._wake.set()
+
+    def _commit(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            self.conn.execute("BEGIN")
+            for key, data in batch.items():
+                if data is None:
+                    self.conn.execute("DELETE FROM records WHERE key = ?", (key,))
+                else:
+                    self.conn.execute("INSERT OR REPLACE INTO records (key, data) VALUES (?, ?)", (key, data))
+            self.conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"Failed to commit {len(batch)} records to {self.path}: {e}")
+            self.conn.execute("ROLLBACK")
+            # Keep newer writes that arrived meanwhile, retry the rest next round
+            batch.update(self.pending)
+            self.pending = batch
+
+    def _commit_loop(self):
+        while not self._closed:
+            self._wake.wait(self.commit_interval)
+            self._wake.clear()
+            with self.lock:
+                if self._closed:
+                    return
+                self._commit()
+                if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                    # Background compaction: keep the WAL from growing without bound
+                    try:
+                        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                    except Exception as e:
+                        logger.error(f"WAL checkpoint failed: {e}")
+                    self._last_checkpoint = time.monotonic()
+
+
+class RedisStore:
+    """The same store interface on a Redis-compatible server, for sharing users across hosts.
+
+    Each record is a JSON string under ``<prefix>:rec:<key>``. update() uses
+    WATCH/MULTI optimistic locking (compare-and-set) and retries on conflict.
+    Pass ``client`` to use any redis-py compatible client, e.g. a local
+    fakeredis stand-in for tests.
+    """
+
+    def __init__(self, url=REDIS_URL, prefix="felix", client=None, max_retries=10):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for FELIX_STORE=redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.max_retries = max_retries
+        self.keys_set = f"{prefix}:keys"
+
+    def _rec(self, key):
+        return f"{self.prefix}:rec:{key}"
+
+    def get(self, key, default=None):
+        data = self.client.get(self._rec(key))
+        return default if data is None else load_record(data)
+
+    def put(self, key, record):
+        pipe = self.client.pipeline()
+        pipe.set(self._rec(key), dump_record(record))
+        pipe.sadd(self.keys_set, key)
+        pipe.execute()
+
+    def delete(self, key):
+        pipe = self.client.pipeline()
+        pipe.delete(self._rec(key))
+        pipe.srem(self.keys_set, key)
+        pipe.execute()
+
+    def update(self, key, fn, default=None):
+        """Optimistic read-modify-write; retried if another writer touched the record."""
+        rec_key = self._rec(key)
+        for _ in range(self.max_retries):
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(rec_key)
+                    data = pipe.get(rec_key)
+                    record = load_record(data) if data is not None else default
+                    if record is None:
+                        pipe.unwatch()
+                        return None
+                    fn(record)
+                    pipe.multi()
+                    pipe.set(rec_key, dump_record(record))
+                    pipe.sadd(self.keys_set, key)
+                    pipe.execute()
+                    return record
+                except Exception as e:
+                    if type(e).__name__ != "WatchError":
+                        raise
+        raise RuntimeError(f"Too much contention updating {key}")
+
+    def insert_if_absent(self, key, record):
+        created = self.client.set(self._rec(key), dump_record(record), nx=True)
+        if created:
+            self.client.sadd(self.keys_set, key)
+        return bool(created)
+
+    def __contains__(self, key):
+        return bool(self.client.exists(self._rec(key)))
+
+    def __getitem__(self, key):
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __setitem__(self, key, record):
+        self.put(key, record)
+
+    def __len__(self):
+        return self.client.scard(self.keys_set)
+
+    def keys(self):
+        return [k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(self.keys_set)]
+
+    def values(self):
+        return [record for _, record in self.items()]
+
+    def items(self):
+        keys = self.keys()
+        if not keys:
+            return []
+        rows = self.client.mget([self._rec(key) for key in keys])
+        return [(key, load_record(data)) for key, data in zip(keys, rows) if data is not None]
+
+    def counter(self, name):
+        value = self.client.get(f"{self.prefix}:meta:{name}")
+        return None if value is None else int(value)
+
+    def increment(self, name, initial=0):
+        meta_key = f"{self.prefix}:meta:{name}"
+        if initial:
+            self.client.set(meta_key, initial, nx=True)
+        return int(self.client.incr(meta_key))
+
+    def flush(self):
+        pass
+
+    def compact(self, deadline=None):
+        pass
+
+    def evict_idle(self, idle_s, deadline=None):
+        return 0
+
+    def prewarm(self, limit, deadline=None):
+        return 0
+
+    def close(self):
+        self.client.close()
+
+
+def vacuum_file(path):
+    """Offline full VACUUM that also switches an older store file to incremental auto-vacuum."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def load_json_file(json_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def migrate_json(json_path, store):
+    """One-shot import of a legacy ``{key: record}`` JSON file into ``store``."""
+    data = load_json_file(json_path)
+    for key, record in data.items():
+        store.put(key, record)
+    store.flush()
+    logger.info(f"Migrated {len(data)} records from {json_path}")
+    return len(data)
+
+
+def open_store(path, legacy_json=None, backend=STORE_BACKEND):
+    """Open the configured store; the first SQLite open imports ``legacy_json``."""
+    install_shutdown_flush()
+    if backend == "json":
+        return JsonFileStore(legacy_json or path)
+    if backend == "redis":
+        return RedisStore()
+    if WORKERS > 1 and not STORE_SHARED:
+        logger.error(f"⚠️ {WORKERS} workers share {path} but FELIX_STORE_SHARED=false: "
+                     "each worker keeps its own copy of users and they will overwrite each other")
+    elif WORKERS > 1 and STORE_SHARED_SETTING == "auto":
+        logger.info(f"{WORKERS} workers configured, opening {path} in shared mode")
+    store = SQLiteStore(path)
+    if legacy_json and os.path.exists(legacy_json):
+        try:
+            if store.import_once("migrated_json", lambda: load_json_file(legacy_json)):
+                logger.info(f"Migrated {len(store)} records from {legacy_json}")
+        except Exception as e:
+            logger.error(f"Migration from {legacy_json} failed: {e}")
+    return store
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) == 3 and sys.argv[1] == "vacuum":
+        vacuum_file(sys.argv[2])
+        print(f"✅ Vacuumed {sys.argv[2]}")
+        sys.exit(0)
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        print("Usage: python felix_store.py migrate <memory.json> <store.db>")
+        print("       python felix_store.py vacuum <store.db>   # with the servers stopped")
+        sys.exit(1)
+    target = SQLiteStore(sys.argv[3], commit_interval_ms=0)
+    count = migrate_json(sys.argv[2], target)
+    target.close()
+    print(f"✅ Migrated {count} records into {sys.argv[3]}")
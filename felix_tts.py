@@ -0,0 +1,221 @@
+import os
+import re
+import queue
+import wave
+import hashlib
+import tempfile
+import threading
+import logging
+
+try:
+    import pyttsx3
+except ImportError:  # NullBackend still works
+    pyttsx3 = None
+
+try:
+    import winsound
+except ImportError:  # cached clips only play on Windows; elsewhere phrases are spoken live
+    winsound = None
+
+logger = logging.getLogger(__name__)
+
+# TTS settings (override with environment variables)
+TTS_BACKEND = os.getenv("FELIX_TTS", "pyttsx3").lower()  # pyttsx3 | null
+TTS_RATE = int(os.getenv("FELIX_TTS_RATE", "175"))
+TTS_CACHE_DIR = os.getenv("FELIX_TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "felix_tts"))
+
+
+def split_sentences(text):
+    """Split finished sentences off the front of text, return (sentences, rest)"""
+    parts = re.split(r'(?<=[.!?~])\s+', text)
+    return [p for p in parts[:-1] if p.strip()], parts[-1]
+
+
+class NullBackend:
+    """Speaks nothing; records what it was asked to say. For tests and benchmarks.
+
+    ``words_per_s`` makes say() take as long as real speech would.
+    """
+
+    can_play = False  # no audio files to play back, so cached phrases are just said
+
+    def __init__(self, words_per_s=0):
+        self.words_per_s = words_per_s
+        self.spoken = []
+        self._stop = threading.Event()
+
+    def say(self, text):
+        self._stop.clear()
+        self.spoken.append(text)
+        if self.words_per_s:
+            self._stop.wait(len(text.split()) / self.words_per_s)
+
+    def stop(self):
+        self._stop.set()
+
+    def render(self, text, path):
+        return False
+
+    def play(self, path, cancelled):
+        return False
+
+
+class Pyttsx3Backend:
+    """pyttsx3 speech. The engine is created lazily on the worker thread that uses it."""
+
+    def __init__(self, rate=TTS_RATE):
+        self.rate = rate
+        self.engine = None
+
+    @property
+    def can_play(self):
+        return winsound is not None
+
+    def _engine(self):
+        if self.engine is None:
+            self.engine = pyttsx3.init()
+            self.engine.setProperty('rate', self.rate)
+        return self.engine
+
+    def say(self, text):
+        engine = self._engine()
+        engine.say(text)
+        engine.runAndWait()
+
+    def stop(self):
+        if self.engine is not None:
+            self.engine.stop()
+        if winsound is not None:
+            winsound.PlaySound(None, 0)
+
+    def render(self, text, path):
+        """Save speech for text to a wav file; True if the file was written."""
+        engine = self._engine()
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    def play(self, path, cancelled):
+        """Play a cached wav, returning early if cancelled is set; False if we cannot play files."""
+        if winsound is None:
+            return False
+        with wave.open(path, "rb") as clip:
+            duration = clip.getnframes() / float(clip.getframerate() or 1)
+        winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+        if cancelled.wait(duration):
+            winsound.PlaySound(None, 0)
+        return True
+
+
+def create_backend(backend=TTS_BACKEND):
+    if backend == "null" or pyttsx3 is None:
+        return NullBackend()
+    return Pyttsx3Backend()
+
+
+class SpeechWorker:
+    """Speaks replies on a background thread so the chat loop never waits for audio.
+
+    speak() splits text into sentences and queues them; the first sentence
+    starts playing right away. cancel() is barge-in: it drops everything
+    queued and stops the current sentence. Phrases listed in
+    ``cached_phrases`` are rendered to wav once and replayed from disk.
+    """
+
+    def __init__(self, backend=None, cached_phrases=(), cache_dir=TTS_CACHE_DIR):
+        self.backend = backend or create_backend()
+        self.cached_phrases = {self._key(p) for p in cached_phrases}
+        self.cache_dir = cache_dir
+        self.queue = queue.Queue()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.cancelled = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.stats = {"sentences": 0, "cancelled": 0, "cache_hits": 0, "cache_misses": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="felix-tts", daemon=True)
+        self._thread.start()
+
+    def speak(self, text):
+        text = text.strip()
+        if not text:
+            return
+        if self._key(text) in self.cached_phrases:
+            parts = [text]
+        else:
+            sentences, rest = split_sentences(text)
+            parts = sentences + ([rest] if rest.strip() else [])
+        with self.lock:
+            self.pending += len(parts)
+            self.idle.clear()
+            for part in parts:
+                self.queue.put((self.generation, part))
+
+    def cancel(self):
+        """Barge-in: forget queued sentences and cut off the one being spoken."""
+        if self.idle.is_set():
+            return
+        with self.lock:
+            self.generation += 1
+            self.cancelled.set()
+            try:
+                while True:
+                    self.queue.get_nowait()
+                    self.stats["cancelled"] += 1
+                    self._done()
+            except queue.Empty:
+                pass
+        try:
+            self.backend.stop()
+        except Exception as e:
+            logger.debug(f"TTS stop failed: {e}")
+
+    def wait(self, timeout=None):
+        """Block until everything queued has been spoken (e.g. the goodbye before exit)."""
+        return self.idle.wait(timeout)
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join(timeout=2)
+
+    @staticmethod
+    def _key(text):
+        return " ".join(text.lower().split())
+
+    def _done(self):
+        self.pending -= 1
+        if self.pending <= 0:
+            self.pending = 0
+            self.idle.set()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            generation, text = item
+            if generation == self.generation:
+                self.cancelled.clear()
+                try:
+                    if self._key(text) not in self.cached_phrases or not self._play_cached(text):
+                        self.backend.say(text)
+                    self.stats["sentences"] += 1
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.debug(f"TTS failed: {e}")
+            with self.lock:
+                self._done()
+
+    def _play_cached(self, text):
+        if not self.backend.can_play:
+            return False  # rendering a clip we cannot play only adds a save and a second runAndWait
+        path = os.path.join(self.cache_dir, hashlib.sha1(self._key(text).encode()).hexdigest() + ".wav")
+        if not os.path.exists(path):
+            self.stats["cache_misses"] += 1
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if not self.backend.render(text, path):
+                return False
+        else:
+            self.stats["cache_hits"] += 1
+        return self.backend.play(path, self.cancelled)
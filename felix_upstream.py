@@ -0,0 +1,293 @@
+import os
+import sys
+import time
+import random
+import threading
+import logging
+from types import SimpleNamespace
+
+# openai/httpx are imported in create_upstream(): the SDK takes seconds to import,
+# and the fake backend does not need it at all
+
+logger = logging.getLogger(__name__)
+
+# Upstream settings (override with environment variables)
+UPSTREAM_BACKEND = os.getenv("FELIX_UPSTREAM", "openai").lower()  # openai | fake
+MAX_INFLIGHT = int(os.getenv("FELIX_UPSTREAM_MAX_INFLIGHT", "32"))
+PER_USER_INFLIGHT = int(os.getenv("FELIX_UPSTREAM_PER_USER", "2"))
+QUEUE_TIMEOUT_S = float(os.getenv("FELIX_UPSTREAM_QUEUE_TIMEOUT_S", "5"))
+REQUEST_TIMEOUT_S = float(os.getenv("FELIX_UPSTREAM_TIMEOUT_S", "20"))
+MAX_RETRIES = int(os.getenv("FELIX_UPSTREAM_RETRIES", "2"))
+BACKOFF_BASE_S = float(os.getenv("FELIX_UPSTREAM_BACKOFF_S", "0.5"))
+BACKOFF_MAX_S = float(os.getenv("FELIX_UPSTREAM_BACKOFF_MAX_S", "8"))
+BREAKER_FAILURES = int(os.getenv("FELIX_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("FELIX_BREAKER_COOLDOWN_S", "30"))
+FAKE_LATENCY_MS = float(os.getenv("FELIX_FAKE_LATENCY_MS", "300"))
+FAKE_TOKENS_PER_S = float(os.getenv("FELIX_FAKE_TOKENS_PER_S", "50"))
+FAKE_ERROR_RATE = float(os.getenv("FELIX_FAKE_ERROR_RATE", "0"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling the upstream: breaker open or too many calls in flight."""
+
+
+class UserInflightLimit(UpstreamUnavailable):
+    """This caller already has per_user_inflight calls running; other callers are unaffected."""
+
+
+class FakeUpstreamError(Exception):
+    def __init__(self, status_code=503, retry_after=None):
+        super().__init__(f"fake upstream error {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FakeBackend:
+    """Offline stand-in for the OpenAI client, for tests and load tests.
+
+    Waits ``latency_ms`` before the first token, then emits tokens at
+    ``tokens_per_s``. ``error_rate`` of calls fail with a retryable 503.
+    """
+
+    def __init__(self, latency_ms=FAKE_LATENCY_MS, tokens_per_s=FAKE_TOKENS_PER_S, error_rate=FAKE_ERROR_RATE,
+                 reply=None):
+        self.latency = latency_ms / 1000.0
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.reply = reply
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = SimpleNamespace(retrieve=lambda model: SimpleNamespace(id=model))
+
+    def create(self, model, messages, max_tokens=200, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeUpstreamError(503)
+        text = self.reply or f"Fake Felix here! You said: {messages[-1]['content']}"
+        words = text.split()[:max_tokens]
+        usage = SimpleNamespace(prompt_tokens=sum(len(m["content"].split()) for m in messages),
+                                completion_tokens=len(words))
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            return self._stream(words)
+        if self.tokens_per_s:
+            time.sleep(len(words) / self.tokens_per_s)
+        message = SimpleNamespace(content=" ".join(words))
+        return SimpleNamespace(model=model, usage=usage,
+                               choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+    def _stream(self, words):
+        for i, word in enumerate(words):
+            if self.tokens_per_s:
+                time.sleep(1 / self.tokens_per_s)
+            delta = SimpleNamespace(content=word if i == 0 else f" {word}")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive upstream failures.
+
+    While open every call fails fast. After ``cooldown_s`` one trial call
+    is let through (half-open); success closes the breaker again.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown_s=BREAKER_COOLDOWN_S):
+        self.max_failures = failures
+        self.cooldown = cooldown_s
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == "half_open" or self.failures >= self.max_failures:
+                if self.state != "open":
+                    logger.warning(f"Upstream circuit breaker opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Wraps a chat completion backend with concurrency caps, retries and a circuit breaker.
+
+    Use ``complete(user_key=..., **create_kwargs)`` in place of
+    ``client.chat.completions.create(**create_kwargs)``. With stream=True
+    the returned iterator holds its concurrency slot until it is exhausted.
+    """
+
+    def __init__(self, backend, max_inflight=MAX_INFLIGHT, per_user_inflight=PER_USER_INFLIGHT,
+                 queue_timeout_s=QUEUE_TIMEOUT_S, max_retries=MAX_RETRIES, breaker=None):
+        self.backend = backend
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.per_user_inflight = per_user_inflight
+        self.queue_timeout = queue_timeout_s
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.lock = threading.Lock()
+        self.user_inflight = {}
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "inflight": 0,
+                         "prompt_tokens": 0, "completion_tokens": 0}
+
+    def complete(self, user_key=None, **kwargs):
+        self._acquire(user_key)
+        stream = kwargs.get("stream", False)
+        try:
+            result = self._call_with_retries(kwargs)
+        except Exception:
+            self._release(user_key)
+            raise
+        if stream:
+            return self._hold_slot(result, user_key)
+        self._release(user_key)
+        usage = getattr(result, "usage", None)
+        if usage is not None:
+            with self.lock:
+                self.counters["prompt_tokens"] += usage.prompt_tokens or 0
+                self.counters["completion_tokens"] += usage.completion_tokens or 0
+        return result
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, breaker=self.breaker.state)
+
+    def ping(self, model):
+        """Check the backend is reachable and the key works, without spending tokens."""
+        models = getattr(self.backend, "models", None)
+        if models is not None:
+            models.retrieve(model)
+
+    def _call_with_retries(self, kwargs):
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                with self.lock:
+                    self.counters["rejected"] += 1
+                raise UpstreamUnavailable("Upstream circuit breaker is open")
+            with self.lock:
+                self.counters["calls"] += 1
+            try:
+                result = self.backend.chat.completions.create(**kwargs)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    # The request itself was bad; that says nothing about upstream health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                with self.lock:
+                    self.counters["failures"] += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, retry_after(e))
+                logger.warning(f"Upstream call failed ({e}), retrying in {delay:.2f}s")
+                with self.lock:
+                    self.counters["retries"] += 1
+                time.sleep(delay)
+
+    def _hold_slot(self, stream, user_key):
+        try:
+            for chunk in stream:
+                yield chunk
+        finally:
+            self._release(user_key)
+
+    def _acquire(self, user_key):
+        if user_key is not None:
+            with self.lock:
+                if self.user_inflight.get(user_key, 0) >= self.per_user_inflight:
+                    self.counters["rejected"] += 1
+                    raise UserInflightLimit(f"Too many requests in flight for {user_key}")
+                self.user_inflight[user_key] = self.user_inflight.get(user_key, 0) + 1
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            with self.lock:
+                self.counters["rejected"] += 1
+            self._release_user(user_key)
+            raise UpstreamUnavailable("Too many upstream calls in flight")
+        with self.lock:
+            self.counters["inflight"] += 1
+
+    def _release(self, user_key):
+        with self.lock:
+            self.counters["inflight"] -= 1
+        self.slots.release()
+        self._release_user(user_key)
+
+    def _release_user(self, user_key):
+        if user_key is None:
+            return
+        with self.lock:
+            remaining = self.user_inflight.get(user_key, 1) - 1
+            if remaining:
+                self.user_inflight[user_key] = remaining
+            else:
+                self.user_inflight.pop(user_key, None)
+
+
+def is_retryable(error):
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+def retry_after(error):
+    """Seconds from a 429/503 Retry-After header, if the error carries one."""
+    if getattr(error, "retry_after", None) is not None:
+        return float(error.retry_after)
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, retry_after_s=None):
+    """Full-jitter exponential backoff, but never sooner than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+    if retry_after_s is not None:
+        delay = max(delay, min(retry_after_s, BACKOFF_MAX_S))
+    return delay
+
+
+def create_upstream(api_key=None, backend=UPSTREAM_BACKEND):
+    """Build the shared Upstream for this process (pooled OpenAI client or fake backend)."""
+    if backend == "fake":
+        logger.info("Using fake upstream backend")
+        return Upstream(FakeBackend())
+    try:
+        import httpx
+        import openai
+    except ImportError:
+        raise RuntimeError("openai and httpx are required for the OpenAI upstream")
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=MAX_INFLIGHT, max_keepalive_connections=MAX_INFLIGHT),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_S, connect=5.0)
+    )
+    # Retries are ours (with breaker + Retry-After), so turn off the SDK's own
+    client = openai.OpenAI(api_key=api_key, http_client=http_client, max_retries=0, timeout=REQUEST_TIMEOUT_S)
+    return Upstream(client)
@@ -0,0 +1,60 @@
+import threading
+import logging
+
+from felix_records import UserRecord
+
+logger = logging.getLogger(__name__)
+
+ID_COUNTER = "user_id"
+
+
+class UserRegistry:
+    """The single source of user records, keyed by IP (or any user key).
+
+    Lookups are a hash hit in the store's in-memory cache, and new IDs
+    come from a persisted counter that only ever goes up, so an ID is never
+    handed out twice, even after a reset.
+
+    Records are created with the store's insert_if_absent() and changed
+    with update(), both atomic in the store, so this stays correct when
+    several worker processes share one store.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.id_seed = 0
+        if store.counter(ID_COUNTER) is None:
+            # First run on an existing store: start after the highest ID already used (one-time scan)
+            ids = [record.get("id", 0) for record in store.values() if isinstance(record, (dict, UserRecord))]
+            self.id_seed = max(ids, default=0)
+            if self.id_seed:
+                logger.info(f"Seeding user ID counter at {self.id_seed}")
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def get_or_create(self, key):
+        """Return (record, created); concurrent calls for one key create it once."""
+        record = self.store.get(key)
+        if record is not None:
+            return record, False
+        with self.lock:
+            record = self.store.get(key)
+            if record is not None:
+                return record, False
+            record = {"name": None, "id": self.allocate_id()}
+            if self.store.insert_if_absent(key, record):
+                return record, True
+            # Another worker created it first; its record wins (our ID is simply skipped)
+            return self.store.get(key), False
+
+    def allocate_id(self):
+        return self.store.increment(ID_COUNTER, initial=self.id_seed)
+
+    def update(self, key, fn):
+        """Apply fn(record) atomically and return the updated record."""
+        return self.store.update(key, fn)
+
+    def save(self, key, record):
+        self.store.put(key, record)
@@ -0,0 +1,90 @@
+import os
+import gzip
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # JSON (optionally gzipped) still works
+    msgpack = None
+
+# Wire settings (override with environment variables)
+GZIP_MIN_BYTES = int(os.getenv("FELIX_GZIP_MIN_BYTES", "1024"))  # smaller bodies are sent as is
+MAX_BODY_BYTES = int(os.getenv("FELIX_MAX_BODY_BYTES", str(4 * 1024 * 1024)))  # after decompression
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+MSGPACK_TYPES = {MSGPACK_TYPE, "application/x-msgpack"}
+
+
+class WireError(ValueError):
+    """A body we cannot read; ``status`` is the HTTP code to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def media_type(header):
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def accepts(header, wanted):
+    """True if an Accept / Accept-Encoding header lists ``wanted`` (q=0 means no)."""
+    for part in (header or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == wanted:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def gunzip(data, max_bytes=MAX_BODY_BYTES):
+    """Decompress a gzip body, refusing anything that inflates past max_bytes."""
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        out = inflater.decompress(data, max_bytes + 1)
+    except zlib.error as e:
+        raise WireError(f"Bad gzip body: {e}")
+    if len(out) > max_bytes or inflater.unconsumed_tail:
+        raise WireError(f"Body larger than {max_bytes} bytes", status=413)
+    return out
+
+
+def decode(data, content_type=None, content_encoding=None, max_bytes=MAX_BODY_BYTES):
+    """Parse a request or response body sent as JSON or msgpack, gzipped or not."""
+    if (content_encoding or "").strip().lower() == "gzip":
+        data = gunzip(data, max_bytes)
+    elif content_encoding and content_encoding.strip().lower() != "identity":
+        raise WireError(f"Unsupported Content-Encoding: {content_encoding}", status=415)
+    if len(data) > max_bytes:
+        raise WireError(f"Body larger than {max_bytes} bytes", status=413)
+    if media_type(content_type) in MSGPACK_TYPES:
+        if msgpack is None:
+            raise WireError("msgpack is not installed on this side", status=415)
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise WireError(f"Bad msgpack body: {e}")
+    try:
+        return json.loads(data or b"null")
+    except ValueError as e:
+        raise WireError(f"Bad JSON body: {e}")
+
+
+def encode(payload, accept=None, accept_encoding=None, gzip_min_bytes=GZIP_MIN_BYTES):
+    """Serialize payload in the best format the peer accepts; returns (body, headers).
+
+    msgpack when it is asked for (and installed), otherwise compact JSON.
+    The body is gzipped when the peer accepts gzip and it is at least
+    ``gzip_min_bytes`` long.
+    """
+    if msgpack is not None and any(accepts(accept, t) for t in MSGPACK_TYPES):
+        body, content_type = msgpack.packb(payload, use_bin_type=True), MSGPACK_TYPE
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        content_type = JSON_TYPE
+    headers = {"Content-Type": content_type, "Vary": "Accept, Accept-Encoding"}
+    if len(body) >= gzip_min_bytes and accepts(accept_encoding, "gzip"):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The servers read their settings at import time: offline upstream, scratch data dir, no throttling
+DATA_DIR = tempfile.mkdtemp(prefix="felix-tests-")
+os.environ.update({
+    "FELIX_UPSTREAM": "fake",
+    "FELIX_FAKE_LATENCY_MS": "1",
+    "FELIX_FAKE_TOKENS_PER_S": "0",
+    "FELIX_DATA_DIR": DATA_DIR,
+    "FELIX_MAINTENANCE": "false",
+    "FELIX_RATE_CMD_BURST": "100000",
+    "FELIX_RATE_LLM_BURST": "100000",
+})
+
+from felix_upstream import FakeBackend  # noqa: E402
+
+
+class EchoBackend(FakeBackend):
+    """Fake upstream that replies with the whole prompt, so a shared reply shows whose history it came from."""
+
+    def create(self, model, messages, **kwargs):
+        self.reply = " | ".join(m["content"] for m in messages[1:])
+        return super().create(model, messages, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def server():
+    import felix_brain_server2
+    return felix_brain_server2
+
+
+@pytest.fixture
+def backend(server):
+    """A fresh EchoBackend behind the server's upstream, with an empty reply cache and zeroed counters."""
+    upstream = server.client.get()
+    original = upstream.backend
+    upstream.backend = EchoBackend(latency_ms=1, tokens_per_s=0)
+    server.reply_cache.clear()
+    server.reply_cache.counters.update(dict.fromkeys(server.reply_cache.counters, 0))
+    yield upstream.backend
+    upstream.backend = original
+
+
+@pytest.fixture
+def chat(server):
+    """chat(user_ip, message) -> reply text from POST /chat."""
+    client = server.app.test_client()
+
+    def send(user_ip, message):
+        response = client.post("/chat", json={"message": message}, headers={"X-Forwarded-For": user_ip})
+        return response.get_json()["reply"]
+    return send
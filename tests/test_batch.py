@@ -0,0 +1,121 @@
+import gzip
+import json
+import time
+
+import pytest
+
+from felix_ratelimit import RateLimiter
+from felix_upstream import FakeBackend
+from felix_wire import MSGPACK_TYPE, WireError, decode, encode, gunzip, msgpack
+
+needs_msgpack = pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+
+
+def post_batch(server, body, headers=None, gateway="10.22.1.1"):
+    headers = dict({"X-Forwarded-For": gateway}, **(headers or {}))
+    return server.app.test_client().post("/chat/batch", data=body, headers=headers)
+
+
+def named_items(user, *messages):
+    return [{"user": user, "message": "my name is sam"}] + [{"user": user, "message": m} for m in messages]
+
+
+def test_encode_decode_round_trip():
+    payload = {"items": [{"user": "amy", "message": "héllo 👋"}] * 50}
+    body, headers = encode(payload, accept="application/json", accept_encoding="gzip")
+    assert headers["Content-Type"] == "application/json" and headers["Content-Encoding"] == "gzip"
+    assert decode(body, headers["Content-Type"], headers["Content-Encoding"]) == payload
+
+    small, headers = encode({"ok": True}, accept_encoding="gzip")
+    assert "Content-Encoding" not in headers and json.loads(small) == {"ok": True}
+
+
+@needs_msgpack
+def test_msgpack_is_used_only_when_accepted():
+    payload = {"results": [{"reply": "hi", "code": 200}]}
+    body, headers = encode(payload, accept=f"{MSGPACK_TYPE}, application/json;q=0.5")
+    assert headers["Content-Type"] == MSGPACK_TYPE and decode(body, MSGPACK_TYPE) == payload
+    _, headers = encode(payload, accept=f"{MSGPACK_TYPE};q=0")
+    assert headers["Content-Type"] == "application/json"
+
+
+def test_gunzip_refuses_bodies_that_inflate_past_the_limit():
+    bomb = gzip.compress(b"\0" * 100_000)
+    assert len(gunzip(bomb, max_bytes=100_000)) == 100_000
+    with pytest.raises(WireError) as error:
+        gunzip(bomb, max_bytes=99_999)
+    assert error.value.status == 413
+    with pytest.raises(WireError) as error:
+        decode(b"not gzip", "application/json", "gzip")
+    assert error.value.status == 400
+
+
+def test_batch_rejects_oversized_and_malformed_bodies(server):
+    assert post_batch(server, gzip.compress(b" " * (5 * 1024 * 1024)),
+                      {"Content-Type": "application/json", "Content-Encoding": "gzip"}).status_code == 413
+    assert post_batch(server, b"{}", {"Content-Type": "application/json"}).status_code == 400
+    assert post_batch(server, b"x", {"Content-Type": "application/json", "Content-Encoding": "br"}).status_code == 415
+
+
+def test_batch_json_gzip_round_trip(server, backend):
+    items = named_items("amy", "help", *[f"what is fact number {i}" for i in range(20)])
+    response = post_batch(server, gzip.compress(json.dumps({"items": items}).encode()),
+                          {"Content-Type": "application/json", "Content-Encoding": "gzip",
+                           "Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and response.headers["Content-Encoding"] == "gzip"
+    results = decode(response.data, response.content_type, "gzip")["results"]
+    assert [r["code"] for r in results] == [200] * len(items)
+    assert results[0]["reply"].startswith("Oh, nice to meet you, Sam")
+    assert "Help Menu" in results[1]["reply"]
+    assert all("what is fact number" in r["reply"] for r in results[2:])
+
+
+@needs_msgpack
+def test_batch_msgpack_round_trip(server, backend):
+    items = named_items("bob", "what is fact number 1") + [{"user": "", "message": ""}]
+    response = post_batch(server, msgpack.packb({"items": items}),
+                          {"Content-Type": MSGPACK_TYPE, "Accept": MSGPACK_TYPE})
+    assert response.status_code == 200 and response.content_type == MSGPACK_TYPE
+    results = msgpack.unpackb(response.data, raw=False)["results"]
+    assert [r["code"] for r in results] == [200, 200, 400]
+
+
+def test_batch_keeps_each_users_messages_in_order(server, backend):
+    items = []
+    for i in range(5):
+        items += named_items(f"user{i}", "first question", "and the second question after that")
+    results = post_batch(server, json.dumps({"items": items}), {"Content-Type": "application/json"}).get_json()
+    for i in range(5):
+        second = results["results"][i * 3 + 2]["reply"]
+        assert second.index("first question") < second.index("the second question")  # history came first
+
+
+def test_anonymous_batch_items_cost_one_command_token_each(server, monkeypatch):
+    monkeypatch.setattr(server, "command_limiter", RateLimiter("command", 0.001, 3))
+    items = [{"message": "my name is sam"}, {"message": "help"}, {"message": "tell me a joke"}]
+    response = post_batch(server, json.dumps({"items": items}), {"Content-Type": "application/json"},
+                          gateway="10.22.0.1")
+    assert response.status_code == 200
+    assert [result["code"] for result in response.get_json()["results"]] == [200, 200, 200]
+
+
+def test_batch_matches_single_chat_and_is_faster(server, chat, monkeypatch):
+    upstream = server.client.get()
+    monkeypatch.setattr(upstream, "backend", FakeBackend(latency_ms=20, tokens_per_s=0))
+    users = 16
+    for i in range(users):
+        chat(f"10.22.2.{i}", "my name is sam")
+    started = time.perf_counter()
+    single = [chat(f"10.22.2.{i}", f"what is single fact {i}") for i in range(users)]
+    single_s = time.perf_counter() - started
+
+    items = [{"user": f"u{i}", "message": "my name is sam"} for i in range(users)]
+    post_batch(server, json.dumps({"items": items}), {"Content-Type": "application/json"})
+    items = [{"user": f"u{i}", "message": f"what is single fact {i}"} for i in range(users)]
+    server.reply_cache.clear()  # the batch has to reach the backend too, not reuse the replies above
+    started = time.perf_counter()
+    response = post_batch(server, json.dumps({"items": items}), {"Content-Type": "application/json"})
+    batch_s = time.perf_counter() - started
+
+    assert [r["reply"] for r in response.get_json()["results"]] == single
+    assert batch_s < single_s / 2
@@ -0,0 +1,74 @@
+import threading
+
+from felix_context import ConversationContext, MESSAGE_OVERHEAD, estimate_tokens
+
+
+def turns(count):
+    """count one-token messages, alternating user and assistant: m0 .. m<count-1>."""
+    return [["u" if i % 2 == 0 else "a", f"m{i}"] for i in range(count)]
+
+
+def test_build_messages_keeps_the_newest_history_that_fits():
+    context = ConversationContext(token_budget=4 * (1 + MESSAGE_OVERHEAD), workers=1)
+    record = {"history": turns(6), "summary": "we met"}
+    messages, prompt_tokens = context.build_messages(record, "be nice", "hello")
+    assert [m["content"] for m in messages] == [
+        "be nice", "Earlier in this conversation: we met", "m2", "m3", "m4", "m5", "hello"]
+    assert [m["role"] for m in messages[2:]] == ["user", "assistant", "user", "assistant", "user"]
+    assert prompt_tokens == sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+    assert record["history"] == turns(6)  # building a prompt never changes the record
+    assert context.stats["max_prompt_tokens"] == prompt_tokens
+
+
+def test_build_messages_stops_at_a_message_that_does_not_fit():
+    context = ConversationContext(token_budget=10, workers=1)
+    record = {"history": [["u", "m0"], ["a", "a much longer reply than the budget allows"]]}
+    messages, _ = context.build_messages(record, "be nice", "hello")
+    assert [m["content"] for m in messages] == ["be nice", "hello"]
+
+
+def test_record_turn_folds_overflow_into_the_summary_in_the_background():
+    folded, saved = [], threading.Event()
+
+    def summarizer(summary, old_turns):
+        folded.append((summary, list(old_turns)))
+        return "summary of " + " ".join(text for _, text in old_turns)
+
+    context = ConversationContext(token_budget=4 * (1 + MESSAGE_OVERHEAD), summarizer=summarizer,
+                                  on_update=lambda key, record: saved.set(), workers=1)
+    record = {"history": turns(4), "summary": "old"}
+    context.record_turn("1.2.3.4", record, "m4", "m5")
+    assert record["history"] == turns(6)[2:]
+    assert saved.wait(2)
+    assert folded == [("old", turns(2))]
+    assert record["summary"] == "summary of m0 m1"
+    assert context.stats["folds"] == 1
+
+
+def test_record_turn_never_starts_the_window_on_a_reply():
+    context = ConversationContext(token_budget=3 * (1 + MESSAGE_OVERHEAD), workers=1)
+    record = {"history": turns(4)}
+    context.record_turn("1.2.3.4", record, "m4", "m5")
+    assert record["history"] == [["u", "m4"], ["a", "m5"]]
+
+
+def test_failed_summaries_fall_back_to_the_local_summary():
+    saved = threading.Event()
+
+    def summarizer(summary, old_turns):
+        raise RuntimeError("upstream down")
+
+    context = ConversationContext(token_budget=2 * (1 + MESSAGE_OVERHEAD), summary_tokens=50,
+                                  summarizer=summarizer, on_update=lambda key, record: saved.set(), workers=1)
+    record = {"history": turns(2)}
+    context.record_turn("1.2.3.4", record, "m2", "m3")
+    assert saved.wait(2)
+    assert record["summary"] == "User: m0 Felix: m1"
+    assert context.stats["fold_errors"] == 1
+
+
+def test_server1_history_is_converted():
+    context = ConversationContext(workers=1)
+    record = {"chat_history": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hey"}]}
+    assert context.history(record) == [["u", "hi"], ["a", "hey"]]
+    assert "chat_history" not in record
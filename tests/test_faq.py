@@ -0,0 +1,48 @@
+from felix_faq import FaqIndex
+
+ENTRIES = [
+    {"id": "name", "questions": ["what is your name", "who are you"], "answer": "I'm Felix!"},
+    {"id": "age", "questions": ["how old are you"], "answer": "Brand new!"},
+    {"id": "time", "questions": ["what time is it"], "answer": "It's {time}.", "offline": True},
+]
+
+
+def test_answers_at_or_above_the_threshold_only():
+    index = FaqIndex.build(ENTRIES)
+    entry, score = index.match("What's your name?")
+    assert entry["id"] == "name" and 0 < score < 1
+    assert index.answer("what is your name", threshold=0.8) == "I'm Felix!"
+    assert index.answer("what's your name", threshold=score) == "I'm Felix!"
+    assert index.answer("what's your name", threshold=score + 0.01) is None
+    assert index.stats == {"hits": 2, "misses": 1}
+
+
+def test_long_messages_containing_a_known_question_are_not_answered():
+    index = FaqIndex.build(ENTRIES)
+    message = "can you write me a long poem about the ocean and then tell me what is your name"
+    entry, score = index.match(message)
+    assert entry["id"] == "name" and score < 0.5
+    assert index.answer(message, threshold=0.8) is None
+
+
+def test_offline_entries_are_skipped_unless_asked_for():
+    index = FaqIndex.build(ENTRIES)
+    entry, score = index.match("what time is it")
+    assert entry["id"] == "name" and score < 0.5
+    assert index.match("what time is it", include_offline=True)[0]["id"] == "time"
+
+
+def test_saved_index_loads_without_the_corpus_changing_answers(tmp_path):
+    corpus, saved = tmp_path / "faq.json", tmp_path / "faq_index.json"
+    corpus.write_text('{"entries": []}', encoding="utf-8")
+    FaqIndex.build(ENTRIES).save(str(saved))
+    loaded = FaqIndex.load(str(corpus), str(saved))
+    assert loaded.answer("how old are you") == "Brand new!"
+
+
+def test_server_sends_long_messages_to_the_llm(server, backend, chat):
+    chat("10.14.0.1", "my name is sam")
+    assert chat("10.14.0.1", "what is your name") == server.faq.get().answer("what is your name")
+    assert backend.calls == 0
+    chat("10.14.0.1", "can you write me a long poem about the ocean and then tell me what is your name")
+    assert backend.calls == 1
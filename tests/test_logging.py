@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from felix_logging import BatchedFileWriter
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def read_lines(path):
+    return path.read_text(encoding="utf-8").splitlines() if path.exists() else []
+
+
+@pytest.fixture
+def stalled(tmp_path):
+    """stalled(policy) -> a writer whose thread holds line "a" and is stuck on the file lock, queue empty."""
+    writers = []
+
+    def make(policy):
+        writer = BatchedFileWriter(str(tmp_path / "log.txt"), max_queue=2, batch_size=1,
+                                   flush_interval_ms=10, max_bytes=0, drop_policy=policy)
+        writers.append(writer)
+        writer._file_lock.acquire()
+        writer.write("a")
+        wait_for(writer.queue.empty)
+        return writer
+    yield make
+    for writer in writers:
+        if writer._file_lock.locked():
+            writer._file_lock.release()
+        writer.close()
+
+
+def test_drop_oldest_makes_room_for_the_new_line(stalled, tmp_path):
+    writer = stalled("drop_oldest")
+    assert writer.write("b") and writer.write("c")
+    assert writer.write("d")
+    writer._file_lock.release()
+    writer.flush()
+    assert read_lines(tmp_path / "log.txt") == ["a", "c", "d"]
+    assert writer.stats["dropped"] == 1
+
+
+def test_drop_new_rejects_the_new_line(stalled, tmp_path):
+    writer = stalled("drop_new")
+    assert writer.write("b") and writer.write("c")
+    assert not writer.write("d")
+    writer._file_lock.release()
+    writer.flush()
+    assert read_lines(tmp_path / "log.txt") == ["a", "b", "c"]
+    assert writer.stats["dropped"] == 1
+
+
+def test_block_waits_for_room(stalled, tmp_path):
+    writer = stalled("block")
+    assert writer.write("b") and writer.write("c")
+    results = []
+    blocked = threading.Thread(target=lambda: results.append(writer.write("d")))
+    blocked.start()
+    time.sleep(0.1)
+    assert blocked.is_alive()
+    writer._file_lock.release()
+    blocked.join(2)
+    writer.flush()
+    assert results == [True]
+    assert read_lines(tmp_path / "log.txt") == ["a", "b", "c", "d"]
+    assert writer.stats["dropped"] == 0
+
+
+def test_partial_batches_flush_on_the_interval(tmp_path):
+    path = tmp_path / "log.txt"
+    writer = BatchedFileWriter(str(path), header="=== Log ===", batch_size=100, flush_interval_ms=20, max_bytes=0)
+    for line in ("one", "two", "three"):
+        writer.write(line)
+    wait_for(lambda: len(read_lines(path)) == 4)
+    assert read_lines(path) == ["=== Log ===", "one", "two", "three"]
+    writer.close()
+
+
+def test_full_batches_flush_without_waiting_for_the_interval(tmp_path):
+    path = tmp_path / "log.txt"
+    writer = BatchedFileWriter(str(path), batch_size=3, flush_interval_ms=500, max_bytes=0)
+    for line in ("one", "two", "three"):
+        writer.write(line)
+    wait_for(lambda: len(read_lines(path)) == 3, timeout=0.25)
+    writer.close()
+
+
+def test_rotates_by_size_and_keeps_the_newest_backups(tmp_path):
+    path = tmp_path / "log.txt"
+    writer = BatchedFileWriter(str(path), batch_size=1, flush_interval_ms=10, max_bytes=10, backups=2)
+    for line in ("a" * 10, "b", "c" * 10, "d", "e" * 10, "f"):
+        writer.write(line)
+        writer.flush()
+    assert read_lines(path) == ["f"]
+    assert read_lines(tmp_path / "log.txt.1") == ["d", "e" * 10]
+    assert read_lines(tmp_path / "log.txt.2") == ["b", "c" * 10]
+    assert not (tmp_path / "log.txt.3").exists()
+    assert writer.stats["rotations"] == 3
+    assert not writer.rotate(min_bytes=10)
+    assert writer.rotate() and read_lines(tmp_path / "log.txt.1") == ["f"]
+    writer.close()
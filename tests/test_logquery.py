@@ -0,0 +1,95 @@
+from felix_logging import BatchedFileWriter
+from felix_logquery import LogIndex, parse_line, ts_key, window
+
+LOG = """\
+[2024-05-01 10:00:00] 📝 <1.2.3.4> set name to: Amy (ID #1)
+[2024-05-01 10:00:05] 📨 <Amy #1> said: hello
+[2024-05-01 10:00:06] 🤖 Felix replied to #1: hi Amy
+and a second line
+[2024-05-01 10:30:00] 📨 <Bob #2> said: what is python
+[2024-05-01 10:30:01] 🤖 Felix replied: a language
+[2024-05-01 11:15:00] 📨 <Amy #1> said: tell me a joke
+[2024-05-01 11:15:01] ❌ Error: upstream timed out
+"""
+
+
+def write(path, text, mode="w"):
+    with open(path, mode, encoding="utf-8", newline="") as f:
+        f.write(text)
+
+
+def test_parse_line_and_windows():
+    assert parse_line("[2024-05-01 10:00:05] 📨 <Amy #1> said: hello\n".encode())[:3] == \
+        ("2024-05-01 10:00:05", "said", 1)
+    assert parse_line("[2024-05-01 10:00:06] 🤖 Felix replied (cached): hi".encode())[1:3] == ("replied", None)
+    assert parse_line("1.2.3.4 | ID 7 | Amy".encode()) is None
+    assert parse_line("[2024-05-01 10:00:00] 1.2.3.4 | ID 7 | Amy".encode())[1:5] == \
+        ("registered", 7, "Amy", "1.2.3.4")
+    assert ts_key("2024-05-01 10:30:00") == 20240501103000
+    assert window("2024-05-01 10", "2024-05-01") == ("2024-05-01 10:00:00", "2024-05-01 23:59:59")
+
+
+def test_index_queries_and_incremental_append(tmp_path):
+    log = str(tmp_path / "server_log.txt")
+    write(log, LOG)
+    index = LogIndex(log)
+    assert index.update() == 7 and index.update() == 0
+
+    amy = list(index.events(uid=1))
+    assert [kind for _, kind, _, _ in amy] == ["set_name", "said", "replied", "said"]
+    assert amy[2][3] == "[2024-05-01 10:00:06] 🤖 Felix replied to #1: hi Amy\nand a second line"
+    assert [uid for _, _, uid, _ in index.events(kinds=["replied"])] == [1, 2]  # legacy reply follows Bob
+    assert len(list(index.events(since="2024-05-01 11"))) == 2
+
+    assert index.user(1)["said"] == 2 and index.user(1)["name"] == "Amy" and index.user(1)["ip"] == "1.2.3.4"
+    assert [user["uid"] for user in index.users(order="said")] == [1, 2]
+    hours = index.hours()
+    assert [(h["hour"], h["said"], h["errors"], h["users"]) for h in hours] == \
+        [("2024-05-01 10", 2, 0, 2), ("2024-05-01 11", 1, 1, 1)]
+
+    write(log, "[2024-05-01 12:00:00] 📨 <Bob #2> said: bye\n", mode="a")
+    assert index.update() == 1 and index.user(2)["said"] == 2
+    index.close()
+
+
+def test_rewritten_log_is_indexed_again(tmp_path):
+    log = str(tmp_path / "server_log.txt")
+    write(log, LOG)
+    index = LogIndex(log)
+    index.update()
+    write(log, "".join(f"[2024-06-01 09:00:0{i}] 📨 <Cat #3> said: a fresh log, longer than the old one\n"
+                       for i in range(8)))
+    assert index.update() == 8
+    assert index.user(1) is None and index.user(3)["said"] == 8
+    index.close()
+
+
+def test_queries_reach_across_rotations(tmp_path):
+    log = str(tmp_path / "server_log.txt")
+    writer = BatchedFileWriter(log, max_bytes=0, backups=2, flush_interval_ms=10)
+
+    def day(date, *lines):
+        for line in lines:
+            writer.write(f"[{date}] {line}")
+        writer.flush()
+
+    day("2024-05-01 10:00:00", "📨 <Amy #1> said: day one", "🤖 Felix replied to #1: hello")
+    index = LogIndex(log)
+    assert index.update() == 2
+    day("2024-05-01 23:59:00", "📨 <Amy #1> said: last words of day one")  # not indexed before the rotation
+    assert writer.rotate(min_bytes=10**6) is False and writer.rotate()
+    day("2024-05-02 09:00:00", "📨 <Amy #1> said: day two")
+
+    assert index.update() == 2
+    said = [line.split("said: ")[1] for _, _, _, line in index.events(1, "2024-05-01", "2024-05-02", ["said"])]
+    assert said == ["day one", "last words of day one", "day two"]
+    assert index.user(1)["said"] == 3 and [h["hour"] for h in index.hours()][-1] == "2024-05-02 09"
+
+    for date in ("2024-05-03 09:00:00", "2024-05-04 09:00:00"):
+        writer.rotate()
+        day(date, "📨 <Amy #1> said: later")
+    assert index.update() == 2
+    assert [ts // 1000000 for ts, _, _, _ in index.events(1, kinds=["said"])] == [20240502, 20240503, 20240504]
+    assert index.user(1)["said"] == 5  # totals still count the backup that was deleted
+    writer.close()
+    index.close()
@@ -0,0 +1,62 @@
+import time
+
+from felix_maintenance import MaintenanceScheduler
+
+
+def add_jobs(scheduler, ran):
+    shared = scheduler.add("compact", lambda deadline: ran.append("compact") or "compacted", shared=True)
+    local = scheduler.add("evict", lambda deadline: ran.append("evict"))
+    return shared, local
+
+
+def test_only_the_lock_holder_runs_shared_jobs(tmp_path):
+    lock_path = str(tmp_path / "maintenance.lock")
+    first, second = MaintenanceScheduler(lock_path, enabled=False), MaintenanceScheduler(lock_path, enabled=False)
+    first_ran, second_ran = [], []
+    first_shared, first_local = add_jobs(first, first_ran)
+    second_shared, second_local = add_jobs(second, second_ran)
+
+    assert first.run_job(first_shared) == "compacted"
+    assert second.run_job(second_shared) is None
+    first.run_job(first_local)
+    second.run_job(second_local)
+    assert first_ran == ["compact", "evict"] and second_ran == ["evict"]
+    assert (first_shared.runs, first_shared.skipped) == (1, 0)
+    assert (second_shared.runs, second_shared.skipped) == (0, 1)
+    assert first.status()["leader"] and not second.status()["leader"]
+
+    first.leader.release()  # e.g. the leading worker exited
+    assert second.run_job(second_shared) == "compacted"
+    assert first.run_job(first_shared) is None
+    assert second.status()["leader"] and not first.status()["leader"]
+    second.leader.release()
+
+
+def test_jobs_past_their_budget_count_as_overruns(tmp_path):
+    scheduler = MaintenanceScheduler(str(tmp_path / "maintenance.lock"), enabled=False)
+    deadlines = []
+
+    def slow(deadline):
+        deadlines.append(deadline - time.monotonic())
+        time.sleep(0.05)
+        return "done"
+
+    slow_job = scheduler.add("slow", slow, budget_s=0.01)
+    quick_job = scheduler.add("quick", lambda deadline: "done", budget_s=1)
+    assert scheduler.run_job(slow_job) == "done"
+    scheduler.run_job(quick_job)
+    assert 0 < deadlines[0] <= 0.01
+    assert (slow_job.runs, slow_job.overruns) == (1, 1)
+    assert (quick_job.runs, quick_job.overruns) == (1, 0)
+    assert scheduler.status()["jobs"]["slow"]["last_duration_ms"] >= 50
+
+
+def test_failed_jobs_are_recorded(tmp_path):
+    scheduler = MaintenanceScheduler(str(tmp_path / "maintenance.lock"), enabled=False)
+
+    def broken(deadline):
+        raise OSError("disk full")
+
+    job = scheduler.add("broken", broken)
+    assert scheduler.run_job(job) is None
+    assert (job.runs, job.failures, job.last_error) == (1, 1, "OSError: disk full")
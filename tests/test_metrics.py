@@ -0,0 +1,63 @@
+import re
+import time
+
+from felix_metrics import Registry
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]+="([^"\\]|\\.)*",?)*\})? -?[0-9.e+-]+$')
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = Registry()
+    counter = registry.counter("felix_things_total", "Things")
+    counter.inc(type='say "hi"\n')
+    counter.inc(2, type='say "hi"\n')
+    registry.gauge("felix_depth", "Depth", fn=lambda: 7)
+    histogram = registry.histogram("felix_seconds", "Seconds", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage="upstream")
+
+    assert registry.render().splitlines() == [
+        "# HELP felix_things_total Things",
+        "# TYPE felix_things_total counter",
+        'felix_things_total{type="say \\"hi\\"\\n"} 3',
+        "# HELP felix_depth Depth",
+        "# TYPE felix_depth gauge",
+        "felix_depth 7",
+        "# HELP felix_seconds Seconds",
+        "# TYPE felix_seconds histogram",
+        'felix_seconds_bucket{stage="upstream",le="0.1"} 1',
+        'felix_seconds_bucket{stage="upstream",le="1.0"} 2',
+        'felix_seconds_bucket{stage="upstream",le="+Inf"} 3',
+        'felix_seconds_sum{stage="upstream"} 5.55',
+        'felix_seconds_count{stage="upstream"} 3',
+    ]
+
+
+def test_metrics_endpoint(server, backend, chat):
+    chat("10.11.0.1", "my name is sam")
+    chat("10.11.0.1", "tell me about my cat")
+    response = server.app.test_client().get("/metrics")
+    assert response.status_code == 200 and response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+    lines = response.get_data(as_text=True).splitlines()
+    assert all(line.startswith("# ") or SAMPLE.match(line) for line in lines), \
+        [line for line in lines if not line.startswith("# ") and not SAMPLE.match(line)]
+    assert "# TYPE felix_upstream_seconds histogram" in lines
+    assert any(line.startswith('felix_chat_stage_seconds_count{stage="upstream"}') for line in lines)
+
+
+def test_profile_needs_the_admin_token(server, monkeypatch):
+    client = server.app.test_client()
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+    assert client.get("/debug/profile", headers={"X-Admin-Token": ""}).status_code == 403
+
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/debug/profile").status_code == 403
+    assert client.post("/debug/profile", json={"enabled": True}, headers={"X-Admin-Token": "nope"}).status_code == 403
+    assert not server.profiler.running
+
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.post("/debug/profile", json={"enabled": True}, headers=admin).get_json()["profiling"] is True
+    time.sleep(0.05)
+    report = client.get("/debug/profile", headers=admin)
+    assert report.status_code == 200 and report.mimetype == "text/plain" and ":" in report.get_data(as_text=True)
+    assert client.post("/debug/profile", json={"enabled": False}, headers=admin).get_json()["profiling"] is False
@@ -0,0 +1,26 @@
+import pytest
+
+from felix_ratelimit import RateLimiter, SharedRateLimiter
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp_path: RateLimiter("test", 1.0, 3),
+    lambda tmp_path: SharedRateLimiter("test", 1.0, 3, str(tmp_path / "buckets.db")),
+])
+def test_gcra_allows_a_burst_then_one_per_interval(tmp_path, make):
+    limiter = make(tmp_path)
+    assert [limiter.allow("amy", now=100.0)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = limiter.allow("amy", now=100.0)
+    assert not allowed and retry_after == pytest.approx(1.0)
+    assert limiter.allow("bob", now=100.0)[0]  # buckets are per key
+    assert limiter.allow("amy", now=101.0) == (True, 0.0)
+    assert not limiter.allow("amy", now=101.5)[0]
+    assert [limiter.allow("amy", now=110.0)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_idle_keys_are_evicted_past_max_keys():
+    limiter = RateLimiter("test", 1.0, 1, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.allow(key, now=0.0)
+    assert list(limiter.tats) == ["b", "c"] and limiter.stats["evicted"] == 1
+    assert RateLimiter("off", 0, 1).allow("a") == (True, 0.0)
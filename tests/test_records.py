@@ -0,0 +1,31 @@
+import json
+
+from felix_records import TURN_SEP, UserRecord, compact, pack_history, to_json, unpack_history
+
+
+def test_history_packs_and_unpacks():
+    history = [["u", "hi"], ["a", "hello!"], ["u", ""], ["a", f"odd {TURN_SEP} separator"]]
+    assert unpack_history(pack_history(history)) == history[:3] + [["a", "odd   separator"]]
+    assert unpack_history("") == []
+
+
+def test_user_record_behaves_like_the_dict_it_replaces():
+    data = {"name": "Amy", "id": 7, "summary": "likes maps", "history": [["u", "hi"], ["a", "hey"]], "mood": "ok"}
+    record = compact(data)
+    assert isinstance(record, UserRecord) and record == data
+    assert record["name"] == "Amy" and record.get("missing", 1) == 1 and "mood" in record
+
+    history = record["history"]
+    history.append(["u", "more"])
+    assert len(record["history"]) == 2  # a copy: changes must be assigned back
+    record["history"] = history
+    record.update(name="Bob", extra_field=True)
+    assert record.pop("summary") == "likes maps" and "summary" not in record
+    assert json.loads(json.dumps(record, default=to_json)) == {
+        "name": "Bob", "id": 7, "history": history, "mood": "ok", "extra_field": True}
+
+
+def test_compact_leaves_other_values_alone():
+    assert compact({"no": "name"}) == {"no": "name"} and type(compact({"no": "name"})) is dict
+    assert type(compact({"name": "Amy"}, enabled=False)) is dict
+    assert compact(5) == 5
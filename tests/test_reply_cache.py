@@ -0,0 +1,106 @@
+import time
+
+from felix_cache import ReplyCache, is_self_contained
+from felix_upstream import FakeBackend
+
+
+def test_personal_and_follow_up_messages_are_not_self_contained():
+    assert is_self_contained("what is the capital of france")
+    assert not is_self_contained("what is my secret password")
+    assert not is_self_contained("remind me what we talked about")
+    assert not is_self_contained("tell me more about it")
+
+
+def test_users_with_different_histories_never_share_a_reply(server, backend, chat):
+    for user_ip, secret in (("10.6.0.1", "hunter2"), ("10.6.0.2", "swordfish")):
+        chat(user_ip, "my name is sam")
+        chat(user_ip, f"my secret password is {secret}")
+
+    first = chat("10.6.0.1", "what is my secret password")
+    second = chat("10.6.0.2", "what is my secret password")
+    assert "hunter2" in first and "swordfish" not in first
+    assert "swordfish" in second and "hunter2" not in second
+
+    # Self-contained questions are asked without history, so the shared reply holds neither secret
+    first = chat("10.6.0.1", "what is the capital of france")
+    second = chat("10.6.0.2", "what is the capital of france")
+    assert first == second and "hunter2" not in first and "swordfish" not in first
+    assert backend.calls == 5
+    assert server.reply_cache.stats()["hits"] == 1
+
+
+def test_users_with_history_still_share_self_contained_replies(server, backend, chat):
+    for user_ip in ("10.6.1.1", "10.6.1.2"):
+        chat(user_ip, "my name is sam")
+        chat(user_ip, "what do dragons eat")
+        chat(user_ip, "tell me more about it")
+        chat(user_ip, "what is the capital of france")
+    assert backend.calls == 4
+    assert server.reply_cache.stats()["hits"] == 2
+    follow_up = chat("10.6.1.1", "and why is that")
+    assert "tell me more about it" in follow_up  # follow-ups keep the full history
+
+
+def test_changing_a_tier_config_does_not_serve_old_replies(server, backend, chat, monkeypatch):
+    question = "what is the capital of france"
+    tier = server.model_router.route(question).tier
+    chat("10.19.0.1", "my name is sam")
+    chat("10.19.0.1", question)
+    monkeypatch.setitem(server.model_router.tiers, tier, dict(server.model_router.tiers[tier], max_tokens=77))
+    chat("10.19.0.2", "my name is sam")
+    chat("10.19.0.2", question)
+    assert backend.calls == 2
+    assert server.reply_cache.stats()["hits"] == 0
+
+
+def test_lru_ttl_and_size_limit():
+    cache = ReplyCache(max_entries=2, ttl_s=60)
+    key = ReplyCache.make_key("gpt", "prompt {name}", "What is Python?!")
+    assert key == ReplyCache.make_key("gpt", "prompt {name}", "what is python")
+    assert key != ReplyCache.make_key("gpt", "prompt {name}", "what is python", "detailed", 400)
+
+    cache.put(key, "A list is a collection. A tuple is fixed.")
+    assert cache.get(key) == "A list is a collection. A tuple is fixed."
+    cache.put("b", "two")
+    cache.get(key)
+    cache.put("c", "three")  # evicts "b", the least recently used
+    assert cache.get("b") is None and cache.get("c") == "three"
+    assert cache.stats()["evictions"] == 1
+
+    cache.entries["c"] = (time.time() - 1, "three")
+    assert cache.get("c") is None and cache.stats()["expired"] == 1
+    cache.put("big", "x" * (cache.max_entry_bytes + 1))
+    assert cache.get("big") is None and cache.stats()["too_large"] == 1
+
+
+def test_disk_tier_purge_and_prewarm(tmp_path):
+    path = str(tmp_path / "replies.db")
+    cache = ReplyCache(disk_path=path)
+    cache.put("fresh", "still good")
+    cache.put("stale", "too old")
+    cache.entries["stale"] = (time.time() - 1, "too old")
+    cache.disk.execute("UPDATE replies SET expires = ? WHERE key = 'stale'", (time.time() - 1,))
+    cache.disk.commit()
+    assert cache.purge_expired() == 1
+    assert list(cache.entries) == ["fresh"]
+
+    restarted = ReplyCache(disk_path=path)
+    assert restarted.prewarm() == 1
+    assert restarted.get("fresh") == "still good" and restarted.stats()["disk_hits"] == 0
+
+
+def test_shared_replies_are_stored_verbatim_and_prompted_without_the_name(server, backend, chat, monkeypatch):
+    prompts = []
+
+    class RecordingBackend(FakeBackend):
+        def create(self, model, messages, **kwargs):
+            prompts.append(messages)
+            return super().create(model, messages, **kwargs)
+
+    reply = "A list is a collection. A tuple is fixed."
+    monkeypatch.setattr(server.client.get(), "backend", RecordingBackend(latency_ms=1, tokens_per_s=0, reply=reply))
+    assert chat("10.3.0.1", "i'm a student").startswith("Oh, nice to meet you, A")
+    chat("10.3.0.2", "my name is zed")
+    assert chat("10.3.0.1", "what is a list and a tuple") == f"{reply} 💬"
+    assert chat("10.3.0.2", "what is a list and a tuple") == f"{reply} 💬"
+    assert len(prompts) == 1 and prompts[0][0]["content"] == server.SHARED_PROMPT
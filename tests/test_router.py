@@ -0,0 +1,34 @@
+import felix_brain_server2 as server
+from felix_router import CommandRouter
+
+
+def route(text):
+    return server.commands.route(server.commands.scan(text), {"name": "Sam"})
+
+
+def test_triggers_match_whole_words_longest_first():
+    router = CommandRouter()
+    router.add("help", "help")
+    router.add("games", ["what games", "what games can you play"])
+    assert router.scan("this is helpful") == {}
+    assert router.scan("HELP me") == {"help": ["help"]}
+    assert router.scan("what  games can you play?") == {"games": ["what games can you play"]}
+
+
+def test_capture_and_anchored_triggers():
+    router = CommandRouter()
+    router.add("name", "my name is", capture=r"\s+([A-Za-z]+)")
+    router.add("start", "play", anchored=True)
+    assert router.scan("hi, my name is amy") == {"name": ["amy"]}
+    assert router.scan("my name is") == {}
+    assert router.scan("  play tag") == {"start": ["play"]}
+    assert router.scan("let's play tag") == {}
+
+
+def test_play_only_answers_game_requests():
+    assert route("play adopt me")[1]["reply"].startswith("🕹️ Launching Adopt Me")
+    assert route("let's play adopt me")[1]["reply"].startswith("🕹️ Launching Adopt Me")
+    assert "don't know that game" in route("play tag")[1]["reply"]
+    assert route("let's play") == (None, None)
+    assert route("let's play tag") == (None, None)
+    assert route("what games can you play")[0] == "game_list"
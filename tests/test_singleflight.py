@@ -0,0 +1,76 @@
+import os
+import time
+import fcntl
+import threading
+
+from felix_singleflight import FileCoordinator, SingleFlight
+from felix_upstream import UpstreamUnavailable, UserInflightLimit
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_sweep_removes_stale_files_but_not_held_locks(tmp_path):
+    coordinator = FileCoordinator(str(tmp_path))
+    for key in ("old", "fresh", "busy"):
+        assert coordinator.run(key, lambda: "reply", timeout_s=1) == ("reply", False)
+    for name in ("old.lock", "old.json", "busy.lock", "busy.json"):
+        age(tmp_path / name, 120)
+
+    with open(tmp_path / "busy.lock", "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert coordinator.sweep(60) == 3
+    assert sorted(os.listdir(tmp_path)) == ["busy.lock", "fresh.json", "fresh.lock"]
+
+
+def test_single_flight_sweep_uses_twice_the_timeout(tmp_path):
+    flight = SingleFlight(timeout_s=30, coordinator_dir=str(tmp_path))
+    assert flight.do("key", lambda: "reply") == "reply"
+    age(tmp_path / "key.json", 45)
+    assert flight.sweep() == 0
+    age(tmp_path / "key.json", 61)
+    assert flight.sweep() == 1
+    assert SingleFlight(coordinator_dir="").sweep() == 0
+
+
+def follow_a_failing_leader(flight, leader_error):
+    """Leader raises leader_error once a follower is waiting; returns (leader outcome, follower outcome)."""
+    follower_waiting = threading.Event()
+    outcomes = {}
+
+    def leader():
+        follower_waiting.wait(5)
+        time.sleep(0.05)  # let the follower block on the call
+        raise leader_error
+
+    def run(name, fn):
+        try:
+            outcomes[name] = flight.do("key", fn)
+        except Exception as e:
+            outcomes[name] = e
+
+    first = threading.Thread(target=run, args=("leader", leader))
+    first.start()
+    while not flight.calls:
+        time.sleep(0.001)
+    follower_waiting.set()
+    run("follower", lambda: "reply")
+    first.join()
+    return outcomes["leader"], outcomes["follower"]
+
+
+def test_followers_retry_after_the_leaders_own_limit():
+    flight = SingleFlight(coordinator_dir="", local_errors=(UserInflightLimit,))
+    leader, follower = follow_a_failing_leader(flight, UserInflightLimit("too many for 10.0.0.1"))
+    assert isinstance(leader, UserInflightLimit) and follower == "reply"
+    assert flight.stats["retried"] == 1
+
+
+def test_followers_share_global_failures():
+    flight = SingleFlight(coordinator_dir="", local_errors=(UserInflightLimit,))
+    error = UpstreamUnavailable("Upstream circuit breaker is open")
+    leader, follower = follow_a_failing_leader(flight, error)
+    assert leader is error and follower is error
+    assert flight.stats["retried"] == 0
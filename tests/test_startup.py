@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from felix_startup import Lazy, ReadinessProbe
+
+
+def wait_for(predicate, timeout_s=2):
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_probe_retries_until_ready_and_gives_up_on_fatal_errors():
+    outcomes = [ConnectionError("down"), ConnectionError("still down"), None]
+
+    def check():
+        outcome = outcomes.pop(0)
+        if outcome:
+            raise outcome
+
+    probe = ReadinessProbe(check, "test", retryable=lambda e: isinstance(e, ConnectionError), interval_s=0.01)
+    assert probe.state == "pending" and not probe.ready
+    probe.start()
+    wait_for(lambda: probe.ready)
+    assert probe.attempts == 3 and probe.last_error is None
+
+    def bad_key():
+        raise PermissionError("invalid api key")
+
+    probe = ReadinessProbe(bad_key, "test", retryable=lambda e: isinstance(e, ConnectionError), interval_s=0.01)
+    probe.start()
+    wait_for(lambda: probe.state != "pending")
+    assert probe.failed and probe.attempts == 1 and "invalid api key" in probe.status()["last_error"]
+
+
+def test_lazy_builds_once_on_first_use():
+    built = []
+    start = threading.Barrier(4)
+    resource = Lazy(lambda: built.append(time.sleep(0.02)) or {"ok": True}, "test")
+    assert not resource.loaded
+
+    def use():
+        start.wait()
+        resource.get()
+
+    threads = [threading.Thread(target=use) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1 and resource.loaded and resource.get() == {"ok": True}
+    assert resource.keys() is not None  # attribute access goes to the built value
+
+
+@pytest.fixture
+def probe(server):
+    """The server's upstream probe, finished, so a test can set its state without the thread overwriting it."""
+    server.upstream_probe.start()
+    wait_for(lambda: server.upstream_probe.state in ("ready", "failed"))
+    return server.upstream_probe
+
+
+@pytest.mark.parametrize("state", ["pending", "retrying", "failed"])
+def test_livez_and_readyz_before_upstream_is_ready(server, probe, monkeypatch, state):
+    monkeypatch.setattr(probe, "state", state)
+    client = server.app.test_client()
+    assert client.get("/livez").status_code == 200
+
+    response = client.get("/readyz")
+    assert response.status_code == 200 and response.get_json() == {"ready": True, "storage": "ok", "upstream": state}
+    response = client.get("/readyz?upstream=1")
+    assert response.status_code == 503 and response.get_json()["ready"] is False
+
+
+def test_readyz_with_upstream_ready(server, probe, monkeypatch):
+    monkeypatch.setattr(probe, "state", "ready")
+    response = server.app.test_client().get("/readyz?upstream=1")
+    assert response.status_code == 200 and response.get_json()["upstream"] == "ready"
+
+
+def test_chat_reports_a_failed_probe_instead_of_calling_upstream(server, probe, backend, chat, monkeypatch):
+    chat("10.13.0.1", "my name is sam")
+    monkeypatch.setattr(probe, "state", "failed")
+    assert "trouble connecting" in chat("10.13.0.1", "tell me about my cat")
+    assert backend.calls == 0
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import subprocess
+import time
+import threading
+
+from felix_store import JsonFileStore, SQLiteStore, configured_workers, open_store
+
+
+def test_compact_frees_pages_without_blocking_requests(tmp_path):
+    store = SQLiteStore(str(tmp_path / "users.db"), commit_interval_ms=0)
+    for i in range(2000):
+        store.put(f"user{i}", {"name": "x" * 500, "id": i})
+    for i in range(1500):
+        store.delete(f"user{i}")
+    size_before = os.path.getsize(store.path)
+
+    result = []
+    with store.lock:  # a request holding the store lock must not stall compaction
+        worker = threading.Thread(target=lambda: result.append(store.compact()))
+        worker.start()
+        worker.join(timeout=10)
+    assert result and result[0] > 0
+    assert os.path.getsize(store.path) < size_before
+    assert store.get("user1999")["id"] == 1999
+    assert store.get("user0") is None
+    store.close()
+
+
+def test_first_sqlite_open_migrates_the_legacy_json_file(tmp_path):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps({
+        "1.2.3.4": {"name": "Amy", "id": 1, "history": [["u", "hi"], ["a", "hey"]]},
+        "5.6.7.8": {"name": "Bob", "id": 2},
+    }), encoding="utf-8")
+    path = str(tmp_path / "memory.db")
+    store = open_store(path, legacy_json=str(legacy), backend="sqlite")
+    assert len(store) == 2 and store["1.2.3.4"]["history"] == [["u", "hi"], ["a", "hey"]]
+    store.put("5.6.7.8", {"name": "Bobby", "id": 2})
+    store.close()
+
+    legacy.write_text("{}", encoding="utf-8")  # an existing store is never migrated again
+    reopened = open_store(path, legacy_json=str(legacy), backend="sqlite")
+    assert reopened.get("5.6.7.8")["name"] == "Bobby" and len(reopened) == 2
+    reopened.close()
+
+
+def test_idle_records_leave_memory_and_prewarm_brings_them_back(tmp_path):
+    path = str(tmp_path / "users.db")
+    store = SQLiteStore(path, commit_interval_ms=0)
+    for i in range(5):
+        store.put(f"user{i}", {"name": "Amy", "id": i})
+    store.last_seen["user4"] = time.monotonic() + 60  # still active
+    assert store.evict_idle(0) == 4 and list(store.cache) == ["user4"]
+    assert store.get("user1")["id"] == 1  # reloaded from disk
+    store.close()
+
+    restarted = SQLiteStore(path, commit_interval_ms=0)
+    assert restarted.prewarm(3) == 3 and sorted(restarted.cache) == ["user2", "user3", "user4"]
+    restarted.close()
+
+
+def test_worker_count_turns_on_shared_mode():
+    assert configured_workers(["pytest"], {}) == 1
+    assert configured_workers(["/venv/bin/gunicorn", "-w", "4", "app:app"], {}) == 4
+    assert configured_workers(["gunicorn", "--workers=3", "app:app"], {"WEB_CONCURRENCY": "8"}) == 3
+    assert configured_workers(["/venv/lib/gunicorn/__main__.py", "-w", "5", "app:app"], {}) == 5
+    assert configured_workers(["gunicorn", "-w2", "app:app"], {"GUNICORN_CMD_ARGS": "--workers 6"}) == 2
+    assert configured_workers(["gunicorn", "app:app"], {"GUNICORN_CMD_ARGS": "-k gevent --workers 6"}) == 6
+    assert configured_workers(["python", "felix_brain_server2.py"], {"WEB_CONCURRENCY": "4"}) == 4
+    assert configured_workers(["gunicorn", "app:app"], {"WEB_CONCURRENCY": "lots"}) == 1
+
+
+def test_workers_opening_a_new_store_together_migrate_once(tmp_path, caplog):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps({f"10.0.0.{i}": {"name": "Amy", "id": i} for i in range(200)}), encoding="utf-8")
+    path = str(tmp_path / "memory.db")
+    start = threading.Barrier(6)
+    stores = []
+
+    def worker():
+        start.wait()
+        store = open_store(path, legacy_json=str(legacy), backend="sqlite")
+        store.put("10.0.0.1", {"name": "Amy", "id": 1, "history": [["u", "hi"], ["a", "hey"]]})
+        store.flush()
+        stores.append(store)
+
+    with caplog.at_level("INFO", logger="felix_store"):
+        workers = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    assert len([r for r in caplog.records if r.getMessage().startswith("Migrated")]) == 1
+    assert len(stores) == 6 and len(stores[0]) == 200
+    assert stores[0].get("10.0.0.1")["history"] == [["u", "hi"], ["a", "hey"]]  # not overwritten by a late import
+    for store in stores:
+        store.close()
+
+
+def test_shared_stores_never_lose_concurrent_updates(tmp_path):
+    path = str(tmp_path / "memory.db")
+    stores = [SQLiteStore(path, shared=True) for _ in range(4)]
+    stores[0].insert_if_absent("10.0.0.1", {"name": "Amy", "id": 1, "count": 0})
+    start = threading.Barrier(8)
+
+    def worker(store):
+        start.wait()
+        for _ in range(50):
+            store.update("10.0.0.1", lambda record: record.__setitem__("count", record["count"] + 1))
+
+    workers = [threading.Thread(target=worker, args=(stores[i % 4],)) for i in range(8)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    assert [store.get("10.0.0.1")["count"] for store in stores] == [400] * 4
+    stores[1].update("10.0.0.1", lambda record: record.__setitem__("name", "Bo"))
+    assert stores[2].get("10.0.0.1")["name"] == "Bo"  # no stale per-process cache
+    for store in stores:
+        store.close()
+
+
+def test_json_store_flushes_as_soon_as_a_batch_is_dirty(tmp_path):
+    path = tmp_path / "memory.json"
+    store = JsonFileStore(str(path), flush_interval_ms=60_000, batch_size=3)
+    store.put("10.0.0.1", {"name": "Amy", "id": 1})
+    store.put("10.0.0.2", {"name": "Bo", "id": 2})
+    time.sleep(0.05)
+    assert not path.exists()
+    store.put("10.0.0.3", {"name": "Cy", "id": 3})
+    deadline = time.monotonic() + 2
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert sorted(json.loads(path.read_text(encoding="utf-8"))) == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert store.stats["records_flushed"] == 3
+    store.close()
+
+
+def run_json_writer(path, ending):
+    """Put one record into a JsonFileStore with a long flush interval in a fresh interpreter, then end it."""
+    script = "\n".join([
+        "import os, signal, felix_store",
+        "felix_store.install_shutdown_flush()",
+        f"store = felix_store.JsonFileStore({str(path)!r}, flush_interval_ms=60_000, batch_size=100)",
+        "store.put('10.0.0.1', {'name': 'Amy', 'id': 1})",
+        ending,
+    ])
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.run([sys.executable, "-c", script], cwd=root, timeout=30)
+
+
+def test_json_store_flushes_on_exit(tmp_path):
+    path = tmp_path / "memory.json"
+    assert run_json_writer(path, "pass").returncode == 0
+    assert json.loads(path.read_text(encoding="utf-8"))["10.0.0.1"]["name"] == "Amy"
+
+
+def test_json_store_flushes_on_sigterm(tmp_path):
+    path = tmp_path / "memory.json"
+    result = run_json_writer(path, "os.kill(os.getpid(), signal.SIGTERM); signal.pause()")
+    assert result.returncode == 0
+    assert json.loads(path.read_text(encoding="utf-8"))["10.0.0.1"]["name"] == "Amy"
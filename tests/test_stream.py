@@ -0,0 +1,49 @@
+import json
+
+from felix_upstream import UpstreamUnavailable
+
+
+def stream(server, user_ip, message):
+    """POST /chat/stream; returns (response, [(event, data), ...]) from the SSE body."""
+    response = server.app.test_client().post("/chat/stream", json={"message": message},
+                                             headers={"X-Forwarded-For": user_ip})
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n\n")
+    events = []
+    for block in body[:-2].split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        assert set(fields) <= {"event", "data"}
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return response, events
+
+
+def test_stream_sends_deltas_then_one_done_event(server, backend):
+    response, events = stream(server, "10.2.0.1", "my name is sam")
+    assert events == [("done", {"reply": events[0][1]["reply"], "status": "success"})]
+
+    response, events = stream(server, "10.2.0.1", "tell me about my cat")
+    assert response.mimetype == "text/event-stream" and response.headers["Cache-Control"] == "no-cache"
+    *deltas, (last, done) = events
+    assert last == "done" and {name for name, _ in deltas} == {"message"} and len(deltas) > 1
+    reply = "".join(data["delta"] for _, data in deltas)
+    assert done == {"reply": f"{reply} 💬", "status": "success"}
+    assert reply.endswith("tell me about my cat")
+
+
+def test_cached_replies_arrive_as_one_delta(server, backend):
+    for user_ip in ("10.2.1.1", "10.2.1.2"):
+        stream(server, user_ip, "my name is sam")
+    _, first = stream(server, "10.2.1.1", "what is the tallest mountain")
+    _, second = stream(server, "10.2.1.2", "what is the tallest mountain")
+    assert backend.calls == 1 and len(second) == 2
+    assert second[0] == ("message", {"delta": "what is the tallest mountain"}) and second[1] == first[-1]
+
+
+def test_stream_ends_with_done_when_upstream_is_unavailable(server, backend, monkeypatch):
+    def unavailable(**kwargs):
+        raise UpstreamUnavailable("Upstream circuit breaker is open")
+
+    stream(server, "10.2.2.1", "my name is sam")
+    monkeypatch.setattr(server.client.get(), "complete", unavailable)
+    _, events = stream(server, "10.2.2.1", "tell me about my cat")
+    assert events == [("done", {"reply": server.BUSY_REPLY, "status": "error"})]
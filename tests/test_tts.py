@@ -0,0 +1,36 @@
+from felix_tts import NullBackend, SpeechWorker
+
+
+class RecordingBackend(NullBackend):
+    def __init__(self, can_play):
+        super().__init__()
+        self.can_play = can_play
+        self.rendered = []
+        self.played = []
+
+    def render(self, text, path):
+        self.rendered.append(text)
+        open(path, "wb").close()
+        return True
+
+    def play(self, path, cancelled):
+        self.played.append(path)
+        return True
+
+
+def test_cached_phrases_are_not_rendered_when_the_backend_cannot_play(tmp_path):
+    backend = RecordingBackend(can_play=False)
+    worker = SpeechWorker(backend, cached_phrases=["Bye bye!"], cache_dir=str(tmp_path))
+    worker.speak("Bye bye!")
+    assert worker.wait(5)
+    assert backend.rendered == [] and backend.spoken == ["Bye bye!"]
+
+
+def test_cached_phrases_render_once_and_replay(tmp_path):
+    backend = RecordingBackend(can_play=True)
+    worker = SpeechWorker(backend, cached_phrases=["Bye bye!"], cache_dir=str(tmp_path))
+    worker.speak("Bye bye!")
+    worker.speak("Bye bye!")
+    assert worker.wait(5)
+    assert backend.rendered == ["Bye bye!"] and len(backend.played) == 2 and backend.spoken == []
+    assert worker.stats["cache_hits"] == 1 and worker.stats["cache_misses"] == 1
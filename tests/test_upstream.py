@@ -0,0 +1,67 @@
+import pytest
+
+import felix_upstream
+from felix_upstream import (CircuitBreaker, FakeBackend, FakeUpstreamError, Upstream, UpstreamUnavailable,
+                            backoff_delay, retry_after)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_breaker_opens_after_failures_and_half_opens_after_cooldown(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(felix_upstream.time, "monotonic", clock.monotonic)
+    breaker = CircuitBreaker(failures=2, cooldown_s=30)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # one trial call at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_backoff_is_jittered_capped_and_respects_retry_after(monkeypatch):
+    monkeypatch.setattr(felix_upstream.random, "uniform", lambda low, high: high)
+    assert backoff_delay(0) == pytest.approx(felix_upstream.BACKOFF_BASE_S)
+    assert backoff_delay(2) == pytest.approx(felix_upstream.BACKOFF_BASE_S * 4)
+    assert backoff_delay(50) == felix_upstream.BACKOFF_MAX_S
+    monkeypatch.setattr(felix_upstream.random, "uniform", lambda low, high: low)
+    assert backoff_delay(0, retry_after_s=3) == 3
+    assert backoff_delay(0, retry_after_s=600) == felix_upstream.BACKOFF_MAX_S
+    assert retry_after(FakeUpstreamError(429, retry_after=2)) == 2.0
+
+
+def test_upstream_retries_then_fails_fast_once_the_breaker_opens(monkeypatch):
+    monkeypatch.setattr(felix_upstream.time, "sleep", lambda seconds: None)
+    backend = FakeBackend(latency_ms=0, tokens_per_s=0, error_rate=1.0)
+    upstream = Upstream(backend, max_retries=2, breaker=CircuitBreaker(failures=3, cooldown_s=60))
+    with pytest.raises(FakeUpstreamError):
+        upstream.complete(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert backend.calls == 3 and upstream.stats()["retries"] == 2
+    with pytest.raises(UpstreamUnavailable):
+        upstream.complete(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert backend.calls == 3 and upstream.stats()["breaker"] == "open"
+
+
+def test_per_user_inflight_cap():
+    upstream = Upstream(FakeBackend(latency_ms=0, tokens_per_s=0), per_user_inflight=1)
+    stream = upstream.complete(user_key="amy", model="m", messages=[{"role": "user", "content": "hi there"}],
+                               stream=True)
+    next(stream)  # holds amy's slot until the stream is drained
+    with pytest.raises(UpstreamUnavailable):
+        upstream.complete(user_key="amy", model="m", messages=[{"role": "user", "content": "hi"}])
+    list(stream)
+    assert upstream.complete(user_key="amy", model="m", messages=[{"role": "user", "content": "hi"}])
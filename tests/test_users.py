@@ -0,0 +1,50 @@
+import threading
+
+from felix_store import SQLiteStore
+from felix_users import UserRegistry
+
+
+def test_counter_is_seeded_from_the_highest_existing_id(tmp_path):
+    store = SQLiteStore(str(tmp_path / "users.db"), commit_interval_ms=0)
+    store.put("10.0.0.1", {"name": "Amy", "id": 3})
+    store.put("10.0.0.2", {"name": "Bob", "id": 9})
+    store.put("10.0.0.3", {"name": "Cat"})
+    registry = UserRegistry(store)
+    record, created = registry.get_or_create("10.0.0.4")
+    assert created and record["id"] == 10
+    assert registry.get_or_create("10.0.0.4") == (record, False)
+    store.close()
+
+
+def test_ids_are_never_reused_after_a_reset_or_restart(tmp_path):
+    path = str(tmp_path / "users.db")
+    store = SQLiteStore(path, commit_interval_ms=0)
+    registry = UserRegistry(store)
+    assert [registry.get_or_create(f"10.0.1.{i}")[0]["id"] for i in range(3)] == [1, 2, 3]
+    store.delete("10.0.1.2")  # the highest ID is gone, but never handed out again
+    assert registry.get_or_create("10.0.1.2")[0]["id"] == 4
+    store.close()
+
+    store = SQLiteStore(path, commit_interval_ms=0)
+    assert UserRegistry(store).get_or_create("10.0.1.9")[0]["id"] == 5
+    store.close()
+
+
+def test_concurrent_first_messages_create_one_user(tmp_path):
+    store = SQLiteStore(str(tmp_path / "users.db"), commit_interval_ms=0)
+    registry = UserRegistry(store)
+    start = threading.Barrier(8)
+    results = []
+
+    def first_message():
+        start.wait()
+        results.append(registry.get_or_create("10.0.2.1"))
+
+    threads = [threading.Thread(target=first_message) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [created for _, created in results].count(True) == 1
+    assert {record["id"] for record, _ in results} == {1}
+    store.close()